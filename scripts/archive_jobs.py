@@ -0,0 +1,143 @@
+# scripts/archive_jobs.py
+"""
+Moves long-inactive ads out of job_ads into job_ads_archive (see the 20261019_job_ads_archive
+migration) and reports table sizes and a few hot-path query timings before and after.
+
+  python scripts/archive_jobs.py                      # archive ads inactive > ARCHIVE_INACTIVE_DAYS
+  python scripts/archive_jobs.py --days 60 --max-rows 20000
+  python scripts/archive_jobs.py --report             # sizes + timings only
+  python scripts/archive_jobs.py --restore ID [ID ...]
+"""
+import argparse
+import os
+import time
+
+from dotenv import load_dotenv
+from supabase import Client, create_client
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+ARCHIVE_INACTIVE_DAYS = int(os.getenv("ARCHIVE_INACTIVE_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "2000"))
+ARCHIVE_MAX_ROWS = int(os.getenv("ARCHIVE_MAX_ROWS", "100000"))
+TIMING_REPEATS = 3
+
+if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+    raise SystemExit("❌ Missing SUPABASE_URL or SUPABASE_SERVICE_KEY")
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+
+def format_bytes(value: int | None) -> str:
+    size = float(value or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def size_report() -> list[dict]:
+    return supabase.rpc("job_table_size_report", {}).execute().data or []
+
+
+# Same shape as the scans the pipeline runs against job_ads every day.
+TIMING_QUERIES = {
+    "enrich_missing_embedding": lambda: (
+        supabase.table("job_ads").select("id").is_("embedding", "null").limit(200).execute()
+    ),
+    "geocode_missing_coords": lambda: (
+        supabase.table("job_ads").select("id").is_("location_lat", "null").neq("city", "null").limit(20).execute()
+    ),
+    "active_count": lambda: (
+        supabase.table("job_ads").select("id", count="exact").eq("is_active", True).limit(1).execute()
+    ),
+    "inactive_count": lambda: (
+        supabase.table("job_ads").select("id", count="exact").eq("is_active", False).limit(1).execute()
+    ),
+}
+
+
+def query_timings() -> dict[str, float]:
+    timings: dict[str, float] = {}
+    for name, run in TIMING_QUERIES.items():
+        best = float("inf")
+        for _ in range(TIMING_REPEATS):
+            started = time.perf_counter()
+            try:
+                run()
+            except Exception as e:
+                print(f"   ⚠️ Timing query {name} failed: {e}")
+                best = float("nan")
+                break
+            best = min(best, time.perf_counter() - started)
+        timings[name] = round(best * 1000, 1)
+    return timings
+
+
+def print_report(label: str, sizes: list[dict], timings: dict[str, float]) -> None:
+    print(f"📊 {label}")
+    for row in sizes:
+        print(
+            f"   {row['table_name']:<24} rows≈{row['row_estimate']:<9} total={format_bytes(row['total_bytes']):<9} "
+            f"heap={format_bytes(row['heap_bytes']):<9} toast={format_bytes(row['toast_bytes']):<9} "
+            f"index={format_bytes(row['index_bytes'])}"
+        )
+    print("   " + "  ".join(f"{name}={ms}ms" for name, ms in timings.items()))
+
+
+def archive_inactive_jobs(inactive_days: int, batch_size: int, max_rows: int) -> dict:
+    totals = {"archived": 0, "match_rows_removed": 0, "batches": 0}
+    while totals["archived"] < max_rows:
+        limit = min(batch_size, max_rows - totals["archived"])
+        result = (
+            supabase.rpc("archive_inactive_jobs", {"p_inactive_days": inactive_days, "p_limit": limit}).execute().data
+            or [{}]
+        )[0]
+        archived = int(result.get("archived") or 0)
+        if archived == 0:
+            break
+        totals["archived"] += archived
+        totals["match_rows_removed"] += int(result.get("match_rows_removed") or 0)
+        totals["batches"] += 1
+        print(f"   🧊 Archived {archived} ads ({totals['archived']} so far)")
+    return totals
+
+
+def restore_jobs(job_ids: list[str]) -> int:
+    return int(supabase.rpc("restore_archived_jobs", {"p_job_ids": job_ids}).execute().data or 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive long-inactive job_ads rows and report table sizes.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_INACTIVE_DAYS, help="Archive ads inactive longer than this")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-rows", type=int, default=ARCHIVE_MAX_ROWS)
+    parser.add_argument("--report", action="store_true", help="Only print sizes and query timings")
+    parser.add_argument("--restore", nargs="+", metavar="JOB_ID", help="Move these ads back into job_ads")
+    args = parser.parse_args()
+
+    if args.restore:
+        restored = restore_jobs(args.restore)
+        print(f"✅ Restored {restored}/{len(args.restore)} ads into job_ads (inactive, embedding pending).")
+        return
+
+    before_sizes, before_timings = size_report(), query_timings()
+    print_report("Before", before_sizes, before_timings)
+    if args.report:
+        return
+
+    print(f"🧊 Archiving ads inactive for more than {args.days} days...")
+    started = time.perf_counter()
+    totals = archive_inactive_jobs(args.days, args.batch_size, args.max_rows)
+    print(f"✅ {totals} in {time.perf_counter() - started:.1f}s")
+
+    # Sizes only shrink on disk after (auto)vacuum reclaims the dead tuples; row estimates move first.
+    print_report("After", size_report(), query_timings())
+
+
+if __name__ == "__main__":
+    main()
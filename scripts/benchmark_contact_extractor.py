@@ -0,0 +1,192 @@
+# scripts/benchmark_contact_extractor.py
+"""
+Benchmarks extract_job_contact_data against the previous multi-pass implementation on a
+corpus of stored ads, and checks that both produce identical results.
+
+Corpus sources:
+  --corpus ads.jsonl        one {"description_text", "webpage_url", "source_snapshot"} per line
+  --from-db 2000            read the most recent N ads from job_ads (needs Supabase env vars)
+  --save-corpus ads.jsonl   write the ads that were read from the DB for later offline runs
+
+HTML fetching is disabled for both sides; only the in-ad scan is measured.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    from scripts import job_contact_extractor as extractor
+except ModuleNotFoundError:
+    import job_contact_extractor as extractor
+
+
+# --- Previous implementation, kept here as the reference for the identical-output check ---
+
+def reference_pick_application_url(webpage_url: Optional[str], source_snapshot: Optional[dict]):
+    candidates: list[tuple[int, str, str]] = []
+    direct_url = (webpage_url or "").strip()
+    if direct_url.startswith(("http://", "https://", "mailto:")):
+        candidates.append((extractor.score_application_url(direct_url, "webpage_url"), direct_url, "webpage_url"))
+    if isinstance(source_snapshot, dict):
+        for candidate_url, source_path in extractor.collect_urls(source_snapshot):
+            candidates.append((extractor.score_application_url(candidate_url, source_path), candidate_url, source_path))
+    if not candidates:
+        return None, None
+    candidates.sort(key=lambda item: item[0], reverse=True)
+    _, best_url, best_source = candidates[0]
+    return best_url, best_source
+
+
+def reference_pick_best_email(sources: list[tuple[str, str]]):
+    ranked: list[tuple[int, str, str, str]] = []
+    for source_text, source_path in sources:
+        text = source_text or ""
+        for email in extractor.extract_email_candidates(text):
+            match = re.search(re.escape(email), text, re.IGNORECASE)
+            if match:
+                context = text[max(0, match.start() - 180):min(len(text), match.end() + 180)]
+            else:
+                context = text[:360]
+            ranked.append((extractor.score_email_candidate(email, context, source_path), email, context, source_path))
+    if not ranked:
+        return None, None, None
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    _, email, context, source_path = ranked[0]
+    return email, context, source_path
+
+
+def reference_extract(description_text: Optional[str], webpage_url: Optional[str], source_snapshot: Optional[dict]) -> dict:
+    description = description_text or ""
+    sources: list[tuple[str, str]] = []
+    if description:
+        sources.append((description, "description_text"))
+    if isinstance(source_snapshot, dict):
+        sources.extend(extractor.collect_texts(source_snapshot))
+        try:
+            sources.append((json.dumps(source_snapshot, ensure_ascii=False), "source_snapshot.json"))
+        except Exception:
+            pass
+
+    application_url, application_url_source = reference_pick_application_url(webpage_url, source_snapshot)
+    if application_url and application_url.lower().startswith("mailto:"):
+        email = extractor.normalize_email(application_url)
+        context = application_url
+        email_source = application_url_source or "application_url"
+    else:
+        email, context, email_source = reference_pick_best_email(sources)
+
+    application_channel, reason = extractor.classify_application_channel(application_url, email)
+    return {
+        "contact_email": email,
+        "has_contact_email": bool(email),
+        "contact_email_source": email_source,
+        "application_url": application_url,
+        "application_url_source": application_url_source,
+        "application_channel": application_channel,
+        "application_channel_reason": reason,
+        "contact_email_context": context,
+        "contact_html_pending": bool(not email and webpage_url),
+    }
+
+
+# --- Corpus loading ---
+
+def load_corpus_file(path: Path) -> list[dict]:
+    rows = []
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                rows.append(json.loads(line))
+    return rows
+
+
+def load_corpus_db(limit: int) -> list[dict]:
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_KEY")
+    if not url or not key:
+        raise SystemExit("❌ Missing SUPABASE_URL or SUPABASE_SERVICE_KEY")
+    supabase = create_client(url, key)
+
+    rows: list[dict] = []
+    page_size = 200
+    while len(rows) < limit:
+        page = (
+            supabase.table("job_ads")
+            .select("description_text, webpage_url, source_snapshot")
+            .order("published_date", desc=True)
+            .range(len(rows), len(rows) + min(page_size, limit - len(rows)) - 1)
+            .execute()
+        ).data or []
+        if not page:
+            break
+        rows.extend(page)
+    return rows
+
+
+def run_benchmark(corpus: list[dict], repeats: int) -> dict:
+    def timed(fn) -> tuple[float, list[dict]]:
+        best = float("inf")
+        results: list[dict] = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            results = [
+                fn(row.get("description_text"), row.get("webpage_url"), row.get("source_snapshot"))
+                for row in corpus
+            ]
+            best = min(best, time.perf_counter() - started)
+        return best, results
+
+    reference_s, reference_results = timed(reference_extract)
+    current_s, current_results = timed(
+        lambda description, url, snapshot: extractor.extract_job_contact_data(description, url, snapshot, fetch_html=False)
+    )
+
+    mismatches = [i for i, (a, b) in enumerate(zip(reference_results, current_results)) if a != b]
+    return {
+        "ads": len(corpus),
+        "reference_ms_per_ad": round(reference_s / max(1, len(corpus)) * 1000, 3),
+        "single_pass_ms_per_ad": round(current_s / max(1, len(corpus)) * 1000, 3),
+        "speedup": round(reference_s / current_s, 2) if current_s > 0 else None,
+        "mismatches": len(mismatches),
+        "first_mismatch_index": mismatches[0] if mismatches else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the single-pass contact extractor against the previous version.")
+    parser.add_argument("--corpus", type=Path, help="JSONL file of stored ads")
+    parser.add_argument("--from-db", type=int, default=0, help="Read the N most recent ads from job_ads")
+    parser.add_argument("--save-corpus", type=Path, help="Write the DB corpus to this JSONL file")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus_file(args.corpus)
+    elif args.from_db:
+        corpus = load_corpus_db(args.from_db)
+        if args.save_corpus:
+            with args.save_corpus.open("w", encoding="utf-8") as handle:
+                for row in corpus:
+                    handle.write(json.dumps(row, ensure_ascii=False) + "\n")
+            print(f"💾 Saved {len(corpus)} ads to {args.save_corpus}")
+    else:
+        parser.error("pass --corpus or --from-db")
+
+    summary = run_benchmark(corpus, max(1, args.repeats))
+    print(f"📊 {summary}")
+    if summary["mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+from supabase import Client, create_client
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+load_dotenv(REPO_ROOT / ".env")
+
+SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+    raise SystemExit("Missing SUPABASE_URL/NEXT_PUBLIC_SUPABASE_URL or service key env vars")
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+DIMS = int(os.getenv("DIMS", "768"))
+PROFILE_PAGE_SIZE = int(os.getenv("CANDIDATE_INDEX_PAGE_SIZE", "500"))
+# Below this many candidates an exact matrix product is already sub-millisecond; IVF only pays off above it.
+EXACT_SEARCH_MAX_ROWS = int(os.getenv("CANDIDATE_INDEX_EXACT_MAX_ROWS", "5000"))
+DEFAULT_NPROBE = int(os.getenv("CANDIDATE_INDEX_NPROBE", "8"))
+KMEANS_ITERATIONS = int(os.getenv("CANDIDATE_INDEX_KMEANS_ITERATIONS", "8"))
+# Rebuild the coarse lists once this share of rows was added/changed since the last build.
+REBUILD_CHURN_RATIO = float(os.getenv("CANDIDATE_INDEX_REBUILD_CHURN", "0.25"))
+
+PROFILE_COLUMNS = "user_id,profile_vector,location_lat,location_lon,commute_radius_km,category_tags"
+
+
+def parse_vector(value) -> np.ndarray | None:
+    if isinstance(value, str):
+        stripped = value.strip()
+        if not stripped or stripped == "[]":
+            return None
+        try:
+            value = json.loads(stripped)
+        except ValueError:
+            return None
+    if not isinstance(value, list) or len(value) != DIMS:
+        return None
+    vector = np.asarray(value, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    if not math.isfinite(norm) or norm == 0:
+        return None
+    return vector / norm
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    phi1 = np.radians(lat)
+    phi2 = np.radians(lats)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(lons - lon)
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 6371.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def to_float(value) -> float:
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return float(value)
+    return float("nan")
+
+
+class CandidateIndex:
+    """
+    In-memory cosine index over candidate_profiles.profile_vector.
+
+    Exact search for small populations; an IVF layout (k-means coarse lists, probe the
+    nearest few) once the candidate count grows. Single profiles are upserted in place
+    so /webhook/update-profile does not need a rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.user_ids: list[str] = []
+        self.positions: dict[str, int] = {}
+        self.vectors = np.zeros((0, DIMS), dtype=np.float32)
+        self.lats = np.zeros(0, dtype=np.float64)
+        self.lons = np.zeros(0, dtype=np.float64)
+        self.radii = np.zeros(0, dtype=np.float64)
+        self.tags: list[set[str]] = []
+        self.active = np.zeros(0, dtype=bool)
+        self.centroids: np.ndarray | None = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.churn = 0
+        self.loaded_at: datetime | None = None
+        self.stats = {
+            "rows": 0,
+            "lists": 0,
+            "warmup_ms": None,
+            "build_ms": None,
+            "refresh_count": 0,
+            "last_refresh_ms": None,
+            "upserts": 0,
+            "evictions": 0,
+            "queries": 0,
+            "last_query_ms": None,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at is not None
+
+    # ---------------- Loading ----------------
+    def _fetch_profiles(self, since: str | None = None) -> list[dict]:
+        rows: list[dict] = []
+        last_user_id = None
+        while True:
+            query = (
+                supabase.table("candidate_profiles")
+                .select(PROFILE_COLUMNS)
+                .not_.is_("profile_vector", "null")
+                .order("user_id")
+                .limit(PROFILE_PAGE_SIZE)
+            )
+            if since:
+                query = query.gt("vector_generation_completed_at", since)
+            if last_user_id:
+                query = query.gt("user_id", last_user_id)
+            page = query.execute().data or []
+            if not page:
+                break
+            rows.extend(page)
+            last_user_id = page[-1]["user_id"]
+        return rows
+
+    def _fetch_vector_user_ids(self) -> set[str]:
+        """user_ids that currently have a profile_vector (ids only, for eviction)."""
+        user_ids: set[str] = set()
+        last_user_id = None
+        while True:
+            query = (
+                supabase.table("candidate_profiles")
+                .select("user_id")
+                .not_.is_("profile_vector", "null")
+                .order("user_id")
+                .limit(PROFILE_PAGE_SIZE)
+            )
+            if last_user_id:
+                query = query.gt("user_id", last_user_id)
+            page = query.execute().data or []
+            if not page:
+                break
+            user_ids.update(str(row["user_id"]) for row in page)
+            last_user_id = page[-1]["user_id"]
+        return user_ids
+
+    def warm_up(self) -> None:
+        started = time.perf_counter()
+        loaded_at = datetime.now(timezone.utc)
+        profiles = self._fetch_profiles()
+
+        user_ids: list[str] = []
+        vectors: list[np.ndarray] = []
+        lats: list[float] = []
+        lons: list[float] = []
+        radii: list[float] = []
+        tags: list[set[str]] = []
+        for profile in profiles:
+            vector = parse_vector(profile.get("profile_vector"))
+            if vector is None:
+                continue
+            user_ids.append(str(profile["user_id"]))
+            vectors.append(vector)
+            lats.append(to_float(profile.get("location_lat")))
+            lons.append(to_float(profile.get("location_lon")))
+            radii.append(to_float(profile.get("commute_radius_km")))
+            tags.append({str(tag).strip().lower() for tag in (profile.get("category_tags") or []) if str(tag).strip()})
+
+        with self._lock:
+            self.user_ids = user_ids
+            self.positions = {user_id: i for i, user_id in enumerate(user_ids)}
+            self.vectors = np.vstack(vectors) if vectors else np.zeros((0, DIMS), dtype=np.float32)
+            self.lats = np.asarray(lats, dtype=np.float64)
+            self.lons = np.asarray(lons, dtype=np.float64)
+            self.radii = np.asarray(radii, dtype=np.float64)
+            self.tags = tags
+            self.active = np.ones(len(user_ids), dtype=bool)
+            self._build_lists()
+            self.loaded_at = loaded_at
+            self.stats["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        print(
+            f"🧭 [CANDIDATE INDEX] warm-up rows={self.stats['rows']} lists={self.stats['lists']} "
+            f"warmup_ms={self.stats['warmup_ms']} build_ms={self.stats['build_ms']}",
+            flush=True,
+        )
+
+    def refresh(self) -> int:
+        """
+        Pick up profiles whose vectors were written outside the webhook (batch scripts set
+        vector_generation_completed_at too) and evict profiles that were deleted or whose
+        vector was cleared.
+        """
+        if not self.ready:
+            self.warm_up()
+            return self.stats["rows"]
+        started = time.perf_counter()
+        since = self.loaded_at.isoformat()
+        loaded_at = datetime.now(timezone.utc)
+        profiles = self._fetch_profiles(since=since)
+        for profile in profiles:
+            self.upsert_profile(profile)
+        current = self._fetch_vector_user_ids()
+        with self._lock:
+            stale = [user_id for user_id, pos in self.positions.items() if self.active[pos] and user_id not in current]
+        for user_id in stale:
+            self.remove(user_id)
+        with self._lock:
+            self.loaded_at = loaded_at
+            self.stats["refresh_count"] += 1
+            self.stats["last_refresh_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return len(profiles) + len(stale)
+
+    # ---------------- Index structure ----------------
+    def _build_lists(self) -> None:
+        started = time.perf_counter()
+        count = len(self.user_ids)
+        self.churn = 0
+        if count <= EXACT_SEARCH_MAX_ROWS:
+            self.centroids = None
+            self.assignments = np.zeros(count, dtype=np.int32)
+        else:
+            nlist = max(1, int(math.sqrt(count)))
+            rng = np.random.default_rng(42)
+            sample = self.vectors[rng.choice(count, size=min(count, nlist * 40), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(KMEANS_ITERATIONS):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for list_id in range(nlist):
+                    members = sample[labels == list_id]
+                    if len(members):
+                        centroid = members.mean(axis=0)
+                        norm = np.linalg.norm(centroid)
+                        centroids[list_id] = centroid / norm if norm > 0 else centroid
+            self.centroids = centroids.astype(np.float32)
+            self.assignments = np.argmax(self.vectors @ self.centroids.T, axis=1).astype(np.int32)
+        self.stats["rows"] = int(self.active.sum())
+        self.stats["lists"] = 0 if self.centroids is None else len(self.centroids)
+        self.stats["build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def upsert_profile(self, profile: dict) -> bool:
+        user_id = str(profile.get("user_id") or "")
+        vector = parse_vector(profile.get("profile_vector"))
+        if not user_id or vector is None:
+            return False
+
+        tags = {str(tag).strip().lower() for tag in (profile.get("category_tags") or []) if str(tag).strip()}
+        lat = to_float(profile.get("location_lat"))
+        lon = to_float(profile.get("location_lon"))
+        radius = to_float(profile.get("commute_radius_km"))
+        with self._lock:
+            position = self.positions.get(user_id)
+            if position is None:
+                position = len(self.user_ids)
+                self.user_ids.append(user_id)
+                self.positions[user_id] = position
+                self.vectors = np.vstack([self.vectors, vector[None, :]])
+                self.lats = np.append(self.lats, lat)
+                self.lons = np.append(self.lons, lon)
+                self.radii = np.append(self.radii, radius)
+                self.tags.append(tags)
+                self.active = np.append(self.active, True)
+                self.assignments = np.append(self.assignments, 0).astype(np.int32)
+            else:
+                self.vectors[position] = vector
+                self.lats[position] = lat
+                self.lons[position] = lon
+                self.radii[position] = radius
+                self.tags[position] = tags
+                self.active[position] = True
+
+            if self.centroids is not None:
+                self.assignments[position] = int(np.argmax(self.centroids @ vector))
+            self.churn += 1
+            self.stats["upserts"] += 1
+            self.stats["rows"] = int(self.active.sum())
+
+            if len(self.user_ids) > EXACT_SEARCH_MAX_ROWS and (
+                self.centroids is None or self.churn > REBUILD_CHURN_RATIO * len(self.user_ids)
+            ):
+                self._build_lists()
+        return True
+
+    def remove(self, user_id: str) -> None:
+        with self._lock:
+            position = self.positions.get(str(user_id))
+            if position is not None and self.active[position]:
+                self.active[position] = False
+                self.stats["evictions"] += 1
+                self.stats["rows"] = int(self.active.sum())
+
+    # ---------------- Query ----------------
+    def query(
+        self,
+        job_vector: np.ndarray,
+        limit: int = 20,
+        job_lat: float | None = None,
+        job_lon: float | None = None,
+        radius_km: float | None = None,
+        occupation_group: str | None = None,
+        nprobe: int = DEFAULT_NPROBE,
+    ) -> list[dict]:
+        started = time.perf_counter()
+        group = (occupation_group or "").strip().lower()
+        with self._lock:
+            if not len(self.user_ids):
+                return []
+
+            probes = nprobe
+            while True:
+                if self.centroids is None:
+                    rows = np.flatnonzero(self.active)
+                else:
+                    list_scores = self.centroids @ job_vector
+                    probe_lists = np.argsort(-list_scores)[: min(probes, len(self.centroids))]
+                    rows = np.flatnonzero(self.active & np.isin(self.assignments, probe_lists))
+
+                distances = None
+                if job_lat is not None and job_lon is not None:
+                    distances = haversine_km(job_lat, job_lon, self.lats[rows], self.lons[rows])
+                    keep = np.ones(len(rows), dtype=bool)
+                    if radius_km is not None:
+                        keep &= np.isfinite(distances) & (distances <= radius_km)
+                    # The candidate's own commute radius, where both it and their location are known
+                    radii = self.radii[rows]
+                    keep &= ~(np.isfinite(radii) & (radii > 0) & np.isfinite(distances) & (distances > radii))
+                    rows, distances = rows[keep], distances[keep]
+                if group:
+                    keep = np.fromiter((group in self.tags[i] for i in rows), dtype=bool, count=len(rows))
+                    rows = rows[keep]
+                    if distances is not None:
+                        distances = distances[keep]
+
+                # Filters can empty the probed lists; widen the probe before giving up on recall.
+                if len(rows) >= limit or self.centroids is None or probes >= len(self.centroids):
+                    break
+                probes *= 2
+
+            scores = self.vectors[rows] @ job_vector
+            top = np.argsort(-scores)[:limit]
+            results = [
+                {
+                    "user_id": self.user_ids[rows[i]],
+                    "similarity": round(float(scores[i]), 4),
+                    "distance_km": (
+                        round(float(distances[i]), 1)
+                        if distances is not None and math.isfinite(distances[i])
+                        else None
+                    ),
+                }
+                for i in top
+            ]
+            self.stats["queries"] += 1
+            self.stats["last_query_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return results
+
+
+candidate_index = CandidateIndex()
+
+
+def fetch_job_for_index(job_id: str) -> dict | None:
+    response = (
+        supabase.table("job_ads")
+        .select("id,headline,embedding,location_lat,location_lon,lat,lon,occupation_group_label")
+        .eq("id", str(job_id))
+        .limit(1)
+        .execute()
+    )
+    rows = response.data or []
+    return rows[0] if rows else None
+
+
+def find_candidates_for_job(
+    job_id: str,
+    limit: int = 20,
+    radius_km: float | None = None,
+    match_taxonomy: bool = False,
+) -> dict | None:
+    if not candidate_index.ready:
+        candidate_index.warm_up()
+
+    job = fetch_job_for_index(job_id)
+    if not job:
+        return None
+    job_vector = parse_vector(job.get("embedding"))
+    if job_vector is None:
+        return {"job_id": str(job_id), "candidates": [], "reason": "job has no embedding"}
+
+    job_lat = job.get("location_lat") if job.get("location_lat") is not None else job.get("lat")
+    job_lon = job.get("location_lon") if job.get("location_lon") is not None else job.get("lon")
+    candidates = candidate_index.query(
+        job_vector,
+        limit=limit,
+        job_lat=job_lat,
+        job_lon=job_lon,
+        radius_km=radius_km,
+        occupation_group=job.get("occupation_group_label") if match_taxonomy else None,
+    )
+    return {
+        "job_id": str(job_id),
+        "headline": job.get("headline"),
+        "candidates": candidates,
+        "query_ms": candidate_index.stats["last_query_ms"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Warm the in-memory candidate index and rank candidates for a job.")
+    parser.add_argument("--job-id", type=str, required=True)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--radius-km", type=float, default=None)
+    parser.add_argument("--taxonomy", action="store_true", help="Only candidates tagged with the job's occupation group")
+    args = parser.parse_args()
+
+    result = find_candidates_for_job(args.job_id, limit=args.limit, radius_km=args.radius_km, match_taxonomy=args.taxonomy)
+    if result is None:
+        raise SystemExit(f"Job {args.job_id} not found")
+    for row in result["candidates"]:
+        print(f"{row['similarity']:.4f}  {row['user_id']}  distance_km={row['distance_km']}")
+    print(f"📊 [CANDIDATE INDEX] {json.dumps(candidate_index.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+# scripts/contact_page_crawler.py
+"""
+Async crawl stage for employer contact pages.
+
+Ingest (job_ingest.build_job_row) only looks for an email in the ad itself. Ads without one
+that link to an employer page are marked contact_html_status = 'pending'; this stage works
+through them:
+
+- Pending ads are grouped by URL, so a careers page linked from 40 ads is fetched once.
+- contact_page_cache holds the extracted result per URL for CONTACT_CRAWL_CACHE_TTL_HOURS.
+  Expired entries are revalidated with If-None-Match / If-Modified-Since; a 304 reuses the
+  cached result.
+- A global semaphore bounds open requests and a per-host semaphore plus minimum spacing
+  (or the host's robots.txt Crawl-delay, if larger) keeps load on any one employer low.
+  A 429/503 backs that host off for Retry-After and leaves its ads pending for the next run.
+- robots.txt is fetched once per host per run; disallowed URLs are marked 'blocked'.
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from dotenv import load_dotenv
+from supabase import Client, create_client
+
+try:
+    from scripts.job_contact_extractor import CRAWLER_USER_AGENT, HTML_FETCH_HEADERS, pick_best_email_from_sources
+except ModuleNotFoundError:
+    from job_contact_extractor import CRAWLER_USER_AGENT, HTML_FETCH_HEADERS, pick_best_email_from_sources
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+CRAWL_BATCH_SIZE = int(os.getenv("CONTACT_CRAWL_BATCH_SIZE", "500"))
+CRAWL_CONCURRENCY = int(os.getenv("CONTACT_CRAWL_CONCURRENCY", "16"))
+CRAWL_PER_HOST = int(os.getenv("CONTACT_CRAWL_PER_HOST", "2"))
+CRAWL_HOST_DELAY_SECONDS = float(os.getenv("CONTACT_CRAWL_HOST_DELAY_SECONDS", "1.0"))
+CRAWL_TIMEOUT_SECONDS = float(os.getenv("CONTACT_CRAWL_TIMEOUT_SECONDS", "8"))
+CRAWL_MAX_BYTES = int(os.getenv("CONTACT_CRAWL_MAX_BYTES", str(2 * 1024 * 1024)))
+CACHE_TTL_HOURS = int(os.getenv("CONTACT_CRAWL_CACHE_TTL_HOURS", "72"))
+# Failures are cached briefly so a dead site is not hit again by every pending ad in the next run.
+ERROR_CACHE_TTL_HOURS = int(os.getenv("CONTACT_CRAWL_ERROR_CACHE_TTL_HOURS", "6"))
+HOST_BACKOFF_SECONDS = float(os.getenv("CONTACT_CRAWL_HOST_BACKOFF_SECONDS", "60"))
+DB_BATCH_SIZE = 200
+
+if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+    raise SystemExit("❌ Missing SUPABASE_URL or SUPABASE_SERVICE_KEY")
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+_crawl_lock = threading.Lock()
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def parse_ts(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+class HostThrottle:
+    """Per-host concurrency, minimum spacing between requests and 429/503 back-off."""
+
+    def __init__(self, per_host: int = CRAWL_PER_HOST, min_interval: float = CRAWL_HOST_DELAY_SECONDS):
+        self.per_host = max(1, per_host)
+        self.min_interval = min_interval
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._next_at: dict[str, float] = defaultdict(float)
+        self._intervals: dict[str, float] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def set_interval(self, host: str, seconds: float) -> None:
+        self._intervals[host] = max(self.min_interval, seconds)
+
+    def back_off(self, host: str, seconds: float) -> None:
+        self._next_at[host] = max(self._next_at[host], time.monotonic() + seconds)
+
+    def backed_off(self, host: str) -> bool:
+        return self._next_at[host] - time.monotonic() > CRAWL_TIMEOUT_SECONDS
+
+    def semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self._semaphores[host]
+
+    async def wait_turn(self, host: str) -> None:
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            slot = max(now, self._next_at[host])
+            self._next_at[host] = slot + self._intervals.get(host, self.min_interval)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class ContactPageCrawler:
+    def __init__(self, client: httpx.AsyncClient, concurrency: int = CRAWL_CONCURRENCY, per_host: int = CRAWL_PER_HOST):
+        self.client = client
+        self.global_limit = asyncio.Semaphore(max(1, concurrency))
+        self.hosts = HostThrottle(per_host=per_host)
+        self._robots: dict[str, RobotFileParser | None] = {}
+        self._robots_locks: dict[str, asyncio.Lock] = {}
+        self.stats = {
+            "urls": 0, "cache_hits": 0, "revalidated": 0, "fetched": 0,
+            "blocked": 0, "errors": 0, "deferred": 0,
+        }
+
+    async def robots_for(self, url: str) -> RobotFileParser | None:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        lock = self._robots_locks.setdefault(origin, asyncio.Lock())
+        async with lock:
+            if origin in self._robots:
+                return self._robots[origin]
+            parser: RobotFileParser | None = None
+            try:
+                async with self.global_limit:
+                    response = await self.client.get(f"{origin}/robots.txt", timeout=CRAWL_TIMEOUT_SECONDS)
+                if response.status_code < 400:
+                    parser = RobotFileParser()
+                    parser.parse(response.text.splitlines())
+                elif response.status_code in (401, 403):
+                    # Same reading as the robots spec: an access-denied robots.txt means stay out.
+                    parser = RobotFileParser()
+                    parser.disallow_all = True
+            except httpx.HTTPError:
+                parser = None
+            self._robots[origin] = parser
+            if parser is not None:
+                delay = parser.crawl_delay(CRAWLER_USER_AGENT)
+                if delay:
+                    self.hosts.set_interval(host_of(url), float(delay))
+            return parser
+
+    async def crawl(self, url: str, cached: dict | None) -> dict | None:
+        """
+        Returns a contact_page_cache row for url, or None when the host asked us to back off
+        (the ads stay pending and are retried next run).
+        """
+        host = host_of(url)
+        now = utc_now()
+        base = {"url": url, "host": host, "fetched_at": now.isoformat()}
+
+        robots = await self.robots_for(url)
+        if robots is not None and not robots.can_fetch(CRAWLER_USER_AGENT, url):
+            self.stats["blocked"] += 1
+            return {**base, "status_code": None, "error": "robots_disallowed",
+                    "expires_at": (now + timedelta(hours=CACHE_TTL_HOURS)).isoformat()}
+
+        headers = dict(HTML_FETCH_HEADERS)
+        if cached and not cached.get("error"):
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self.global_limit, self.hosts.semaphore(host):
+            # Checked after queueing too: the host may have sent a 429 while we waited.
+            if self.hosts.backed_off(host):
+                self.stats["deferred"] += 1
+                return None
+            await self.hosts.wait_turn(host)
+            try:
+                async with self.client.stream("GET", url, headers=headers, timeout=CRAWL_TIMEOUT_SECONDS) as response:
+                    if response.status_code in (429, 503):
+                        retry_after = response.headers.get("Retry-After", "")
+                        self.hosts.back_off(host, float(retry_after) if retry_after.isdigit() else HOST_BACKOFF_SECONDS)
+                        self.stats["deferred"] += 1
+                        return None
+                    if response.status_code == 304 and cached:
+                        self.stats["revalidated"] += 1
+                        return {**cached, "fetched_at": now.isoformat(),
+                                "expires_at": (now + timedelta(hours=CACHE_TTL_HOURS)).isoformat()}
+                    if response.status_code >= 400:
+                        self.stats["errors"] += 1
+                        return {**base, "status_code": response.status_code, "error": f"http_{response.status_code}",
+                                "expires_at": (now + timedelta(hours=ERROR_CACHE_TTL_HOURS)).isoformat()}
+
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        body.extend(chunk)
+                        if len(body) >= CRAWL_MAX_BYTES:
+                            break
+                    html = body.decode(response.encoding or "utf-8", errors="replace")
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+                    status_code = response.status_code
+            except httpx.HTTPError as e:
+                self.stats["errors"] += 1
+                return {**base, "status_code": None, "error": e.__class__.__name__,
+                        "expires_at": (now + timedelta(hours=ERROR_CACHE_TTL_HOURS)).isoformat()}
+
+        self.stats["fetched"] += 1
+        email, context, _ = pick_best_email_from_sources([(html, "webpage_html")])
+        return {
+            **base,
+            "status_code": status_code,
+            "etag": etag,
+            "last_modified": last_modified,
+            "contact_email": email,
+            "contact_email_context": context,
+            "error": None,
+            "expires_at": (now + timedelta(hours=CACHE_TTL_HOURS)).isoformat(),
+        }
+
+    async def resolve(self, url: str, cached: dict | None) -> dict | None:
+        self.stats["urls"] += 1
+        expires_at = parse_ts((cached or {}).get("expires_at"))
+        if cached and expires_at and expires_at > utc_now():
+            self.stats["cache_hits"] += 1
+            return cached
+        return await self.crawl(url, cached)
+
+
+def fetch_pending_jobs(limit: int) -> list[dict]:
+    response = (
+        supabase.table("job_ads")
+        .select("id, webpage_url")
+        .eq("contact_html_status", "pending")
+        .eq("is_active", True)
+        .limit(limit)
+        .execute()
+    )
+    return response.data or []
+
+
+def load_cache(urls: list[str]) -> dict[str, dict]:
+    cache: dict[str, dict] = {}
+    for i in range(0, len(urls), DB_BATCH_SIZE):
+        rows = (
+            supabase.table("contact_page_cache")
+            .select("*")
+            .in_("url", urls[i:i + DB_BATCH_SIZE])
+            .execute()
+        ).data or []
+        cache.update({row["url"]: row for row in rows})
+    return cache
+
+
+CACHE_COLUMNS = (
+    "url", "host", "status_code", "etag", "last_modified",
+    "contact_email", "contact_email_context", "error", "fetched_at", "expires_at",
+)
+
+
+def save_cache(rows: list[dict]) -> None:
+    # Bulk upserts need every row to carry the same keys.
+    rows = [{column: row.get(column) for column in CACHE_COLUMNS} for row in rows]
+    for i in range(0, len(rows), DB_BATCH_SIZE):
+        supabase.table("contact_page_cache").upsert(rows[i:i + DB_BATCH_SIZE], on_conflict="url").execute()
+
+
+def apply_results(job_ids_by_url: dict[str, list[str]], results: dict[str, dict]) -> dict:
+    checked_at = utc_now().isoformat()
+    counts = {"emails": 0, "done": 0, "blocked": 0, "failed": 0}
+    for url, result in results.items():
+        job_ids = job_ids_by_url.get(url) or []
+        if not job_ids:
+            continue
+        if result.get("contact_email"):
+            payload = {
+                "contact_email": result["contact_email"],
+                "has_contact_email": True,
+                "contact_email_source": "webpage_html",
+                "application_channel": "direct_email",
+                "application_channel_reason": "email_found",
+                "contact_html_status": "done",
+                "contact_html_checked_at": checked_at,
+            }
+            counts["emails"] += len(job_ids)
+        elif result.get("error") == "robots_disallowed":
+            payload = {"contact_html_status": "blocked", "contact_html_checked_at": checked_at}
+            counts["blocked"] += len(job_ids)
+        elif result.get("error"):
+            payload = {"contact_html_status": "failed", "contact_html_checked_at": checked_at}
+            counts["failed"] += len(job_ids)
+        else:
+            payload = {"contact_html_status": "done", "contact_html_checked_at": checked_at}
+            counts["done"] += len(job_ids)
+
+        for i in range(0, len(job_ids), DB_BATCH_SIZE):
+            supabase.table("job_ads").update(payload).in_("id", job_ids[i:i + DB_BATCH_SIZE]).execute()
+    return counts
+
+
+async def run_contact_crawl(limit: int = CRAWL_BATCH_SIZE) -> dict:
+    started = time.perf_counter()
+    jobs = fetch_pending_jobs(limit)
+    if not jobs:
+        print("✅ [CONTACT CRAWL] No ads pending a contact-page lookup.")
+        return {"jobs": 0}
+
+    job_ids_by_url: dict[str, list[str]] = defaultdict(list)
+    for job in jobs:
+        url = (job.get("webpage_url") or "").strip()
+        if url.startswith(("http://", "https://")):
+            job_ids_by_url[url].append(str(job["id"]))
+    no_url_ids = [str(job["id"]) for job in jobs if not (job.get("webpage_url") or "").strip().startswith(("http://", "https://"))]
+    if no_url_ids:
+        supabase.table("job_ads").update({"contact_html_status": None}).in_("id", no_url_ids).execute()
+
+    urls = list(job_ids_by_url)
+    cache = load_cache(urls)
+    print(f"🕷️ [CONTACT CRAWL] {len(jobs)} pending ads -> {len(urls)} unique URLs on {len({host_of(u) for u in urls})} hosts")
+
+    limits = httpx.Limits(max_connections=CRAWL_CONCURRENCY, max_keepalive_connections=CRAWL_CONCURRENCY)
+    async with httpx.AsyncClient(
+        follow_redirects=True, limits=limits, headers={"User-Agent": CRAWLER_USER_AGENT}
+    ) as client:
+        crawler = ContactPageCrawler(client)
+        resolved = await asyncio.gather(*(crawler.resolve(url, cache.get(url)) for url in urls))
+
+    results = {url: row for url, row in zip(urls, resolved) if row is not None}
+    fresh_rows = [row for url, row in results.items() if row is not cache.get(url)]
+    save_cache(fresh_rows)
+    counts = apply_results(job_ids_by_url, results)
+
+    summary = {
+        "jobs": len(jobs),
+        **crawler.stats,
+        **counts,
+        "elapsed_seconds": round(time.perf_counter() - started, 1),
+    }
+    print(f"✅ [CONTACT CRAWL] {summary}")
+    return summary
+
+
+def run_contact_crawl_job() -> dict | None:
+    """Entry point for the scheduler; overlapping runs are skipped, not queued."""
+    if not _crawl_lock.acquire(blocking=False):
+        print("ℹ️ [CONTACT CRAWL] Previous crawl still running; skipping.")
+        return None
+    try:
+        return asyncio.run(run_contact_crawl())
+    except Exception as e:
+        print(f"❌ [CONTACT CRAWL] Crawl failed: {e}")
+        return None
+    finally:
+        _crawl_lock.release()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Look up contact emails on employer pages for pending ads.")
+    parser.add_argument("--limit", type=int, default=CRAWL_BATCH_SIZE, help="Max pending ads to process")
+    args = parser.parse_args()
+    asyncio.run(run_contact_crawl(args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# scripts/embed_controller.py
+"""
+Adaptive concurrency + chunks-per-request for /api/embed enrichment runs.
+
+Instead of hand-tuned JOB_CPU_BATCH_LIMIT / --batch values, EmbedController watches the
+latency and errors of every embed request and adjusts two knobs once per window of
+EMBED_AIMD_WINDOW requests:
+
+- any error/timeout, or p90 latency above EMBED_AIMD_TARGET_SECONDS: multiplicative
+  decrease of both knobs (x EMBED_AIMD_BACKOFF)
+- otherwise additive increase of one knob at a time (concurrency +1, or chunks per
+  request +EMBED_AIMD_CHUNK_STEP), alternating
+- if the window after an increase did not move at least EMBED_AIMD_TOLERANCE more chunks
+  per busy second than the one before, that step is undone and the knob is held for a few
+  windows (throughput has plateaued there; more would only add queueing latency)
+
+embed_groups() runs a page of jobs through it: chunks of whole jobs are packed into
+requests of up to chunks_per_request inputs, at most `concurrency` requests in flight, and
+jobs of a failed request are retried once, after the controller has decided (and backed off
+on) the window the failure fell in, or once nothing else is left to send.
+
+Behind the embedding scheduler (EMBEDDING_SCHEDULER_ENABLED) the CPU pass caps concurrency at
+the scheduler's slots and a request at one job, so the slot count (EMBEDDING_SCHEDULER_SLOTS,
+by default OLLAMA_NUM_PARALLEL per instance) is the tuning limit there. With one slot both
+knobs are pinned and enrich_jobs says so once at start.
+
+Every decision is appended to EMBED_CONTROLLER_LOG (JSONL) with the run id, host and
+settings, so runs on different machines can be compared:
+    jq -c 'select(.event=="summary")' logs/embed_controller.jsonl
+"""
+import asyncio
+import json
+import math
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+EMBED_ADAPTIVE_ENABLED = os.getenv("EMBED_ADAPTIVE_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+EMBED_AIMD_WINDOW = int(os.getenv("EMBED_AIMD_WINDOW", "8"))
+EMBED_AIMD_TARGET_SECONDS = float(os.getenv("EMBED_AIMD_TARGET_SECONDS", "30"))
+EMBED_AIMD_BACKOFF = float(os.getenv("EMBED_AIMD_BACKOFF", "0.5"))
+EMBED_AIMD_CHUNK_STEP = int(os.getenv("EMBED_AIMD_CHUNK_STEP", "4"))
+EMBED_AIMD_MAX_CONCURRENCY = int(os.getenv("EMBED_AIMD_MAX_CONCURRENCY", "8"))
+EMBED_AIMD_MAX_CHUNKS_PER_REQUEST = int(os.getenv("EMBED_AIMD_MAX_CHUNKS_PER_REQUEST", "64"))
+# Windows a knob stays put after its increase lowered throughput
+EMBED_AIMD_HOLD_WINDOWS = int(os.getenv("EMBED_AIMD_HOLD_WINDOWS", "4"))
+# Throughput gain (fraction) an increase has to show to be kept
+EMBED_AIMD_TOLERANCE = float(os.getenv("EMBED_AIMD_TOLERANCE", "0.05"))
+EMBED_CONTROLLER_LOG = os.getenv("EMBED_CONTROLLER_LOG", str(SCRIPT_DIR.parent / "logs" / "embed_controller.jsonl"))
+
+CONCURRENCY = "concurrency"
+CHUNKS = "chunks_per_request"
+
+
+class EmbedController:
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        chunks_per_request: int,
+        adaptive: bool = EMBED_ADAPTIVE_ENABLED,
+        max_concurrency: int = EMBED_AIMD_MAX_CONCURRENCY,
+        max_chunks_per_request: int = EMBED_AIMD_MAX_CHUNKS_PER_REQUEST,
+        min_chunks_per_request: int = 1,
+        target_seconds: float = EMBED_AIMD_TARGET_SECONDS,
+        window: int = EMBED_AIMD_WINDOW,
+        log_path: Optional[str] = EMBED_CONTROLLER_LOG,
+        context: Optional[Dict] = None,
+    ):
+        self.name = name
+        self.adaptive = adaptive
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_chunks_per_request = max(1, max_chunks_per_request)
+        self.min_chunks_per_request = max(1, min(min_chunks_per_request, self.max_chunks_per_request))
+        self.concurrency = min(max(1, concurrency), self.max_concurrency)
+        self.chunks_per_request = min(max(self.min_chunks_per_request, chunks_per_request), self.max_chunks_per_request)
+        self.target_seconds = target_seconds
+        self.window = max(1, window)
+        self.log_path = Path(log_path) if log_path else None
+        self.context = context or {}
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+        self._latencies: List[float] = []
+        self._window_chunks = 0
+        self._window_errors = 0
+        # Busy time (>= 1 request in flight) so page drains and DB writes don't count
+        self._in_flight = 0
+        self._busy_since: Optional[float] = None
+        self._busy_seconds = 0.0
+        self._windows = 0
+        self._last_throughput: Optional[float] = None
+        self._last_step: Optional[str] = None
+        self._next_knob = CONCURRENCY
+        self._held: Dict[str, int] = {CONCURRENCY: 0, CHUNKS: 0}
+
+        self.total_requests = 0
+        self.total_chunks = 0
+        self.total_errors = 0
+        self.started = time.monotonic()
+        self.best: Dict = {}
+
+        self._log({"event": "start", "adaptive": self.adaptive, **self.settings(), "target_seconds": target_seconds,
+                   "window": self.window, "max_concurrency": self.max_concurrency,
+                   "max_chunks_per_request": self.max_chunks_per_request})
+
+    def settings(self) -> Dict:
+        return {CONCURRENCY: self.concurrency, CHUNKS: self.chunks_per_request}
+
+    @property
+    def windows(self) -> int:
+        """Windows closed (and decided) so far."""
+        return self._windows
+
+    def pinned(self) -> bool:
+        """Neither knob has room to move, so adapting cannot change anything."""
+        return self.max_concurrency == 1 and self.min_chunks_per_request == self.max_chunks_per_request
+
+    def jobs_per_page(self, chunks_per_job: int, minimum: int = 1) -> int:
+        """Enough jobs for two windows at the current knobs."""
+        requests = 2 * max(self.window, self.concurrency)
+        return max(minimum, math.ceil(requests * self.chunks_per_request / max(1, chunks_per_job)))
+
+    def request_started(self) -> None:
+        if self._in_flight == 0:
+            self._busy_since = time.monotonic()
+        self._in_flight += 1
+
+    def observe(self, chunks: int, seconds: float, error: Optional[BaseException] = None) -> None:
+        now = time.monotonic()
+        self._in_flight = max(0, self._in_flight - 1)
+        if self._in_flight == 0 and self._busy_since is not None:
+            self._busy_seconds += now - self._busy_since
+            self._busy_since = None
+        self.total_requests += 1
+        self._latencies.append(seconds)
+        if error is None:
+            self._window_chunks += chunks
+            self.total_chunks += chunks
+        else:
+            self._window_errors += 1
+            self.total_errors += 1
+        if len(self._latencies) >= self.window:
+            self._end_window(now)
+
+    def _end_window(self, now: float) -> None:
+        busy = self._busy_seconds + (now - self._busy_since if self._busy_since is not None else 0.0)
+        elapsed = max(busy, 1e-6)
+        latencies = sorted(self._latencies)
+        throughput = self._window_chunks / elapsed
+        p90 = latencies[min(len(latencies) - 1, int(0.9 * len(latencies)))]
+        before = self.settings()
+        decision = self._decide(throughput, p90) if self.adaptive else "static"
+
+        self._windows += 1
+        row = {
+            "event": "window",
+            "window": self._windows,
+            "requests": len(latencies),
+            "errors": self._window_errors,
+            "chunks": self._window_chunks,
+            "chunks_per_sec": round(throughput, 2),
+            "p50_seconds": round(latencies[len(latencies) // 2], 3),
+            "p90_seconds": round(p90, 3),
+            "settings": before,
+            "decision": decision,
+            "next": self.settings(),
+        }
+        if self._window_errors == 0 and (not self.best or throughput > self.best["chunks_per_sec"]):
+            self.best = {"chunks_per_sec": round(throughput, 2), **before}
+        self._log(row)
+
+        self._latencies = []
+        self._window_chunks = 0
+        self._window_errors = 0
+        self._busy_seconds = 0.0
+        if self._busy_since is not None:
+            self._busy_since = now
+
+    def _decide(self, throughput: float, p90: float) -> str:
+        for knob in self._held:
+            self._held[knob] = max(0, self._held[knob] - 1)
+
+        if self._window_errors or p90 > self.target_seconds:
+            self.concurrency = max(1, math.floor(self.concurrency * EMBED_AIMD_BACKOFF))
+            self.chunks_per_request = max(
+                self.min_chunks_per_request, math.floor(self.chunks_per_request * EMBED_AIMD_BACKOFF)
+            )
+            self._last_step = None
+            self._last_throughput = None
+            return "decrease_errors" if self._window_errors else "decrease_latency"
+
+        last = self._last_throughput
+        self._last_throughput = throughput
+        if self._last_step and last is not None and throughput < last * (1 + EMBED_AIMD_TOLERANCE):
+            undone = self._last_step
+            self._step(undone, -1)
+            self._held[undone] = EMBED_AIMD_HOLD_WINDOWS
+            self._last_step = None
+            self._last_throughput = last
+            return f"revert_{undone}"
+
+        for _ in range(2):
+            knob = self._next_knob
+            self._next_knob = CHUNKS if knob == CONCURRENCY else CONCURRENCY
+            if not self._held[knob] and self._step(knob, +1):
+                self._last_step = knob
+                return f"increase_{knob}"
+        self._last_step = None
+        return "hold"
+
+    def _step(self, knob: str, direction: int) -> bool:
+        if knob == CONCURRENCY:
+            new = min(self.max_concurrency, max(1, self.concurrency + direction))
+            changed, self.concurrency = new != self.concurrency, new
+        else:
+            new = self.chunks_per_request + direction * EMBED_AIMD_CHUNK_STEP
+            new = min(self.max_chunks_per_request, max(self.min_chunks_per_request, new))
+            changed, self.chunks_per_request = new != self.chunks_per_request, new
+        return changed
+
+    def summary(self) -> Dict:
+        elapsed = time.monotonic() - self.started
+        row = {
+            "event": "summary",
+            "requests": self.total_requests,
+            "chunks": self.total_chunks,
+            "errors": self.total_errors,
+            "seconds": round(elapsed, 1),
+            "chunks_per_sec": round(self.total_chunks / elapsed, 2) if elapsed > 0 else None,
+            "final": self.settings(),
+            "best": self.best,
+        }
+        self._log(row)
+        return row
+
+    def _log(self, row: Dict) -> None:
+        if not self.log_path:
+            return
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "run_id": self.run_id,
+            "name": self.name,
+            "host": socket.gethostname(),
+            "cpus": os.cpu_count(),
+            **self.context,
+            **row,
+        }
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.log_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not write controller log {self.log_path}: {e}")
+            self.log_path = None
+
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+TimedEmbedFn = Callable[[List[str]], Awaitable[Tuple[List[List[float]], float]]]
+
+
+async def embed_groups(
+    embed: Union[EmbedFn, TimedEmbedFn],
+    groups: Dict[str, List[str]],
+    controller: EmbedController,
+    retries: int = 1,
+    timed: bool = False,
+) -> Dict[str, Union[List[List[float]], Exception]]:
+    """
+    Embeds {job_id: chunk inputs} with the controller's current knobs; returns
+    {job_id: chunk vectors} or {job_id: exception} for jobs that failed every attempt.
+
+    timed=True: embed returns (vectors, seconds), e.g. EmbeddingBackend.embed_timed, and the
+    controller sees those seconds instead of wall time. Behind the embedding scheduler that
+    is the time a slot was held, not the time spent queueing behind interactive calls.
+    """
+    queue = deque(groups.keys())
+    # (window the failure fell in, job key): held until the controller has decided that window
+    held: List[Tuple[int, str]] = []
+    attempts: Dict[str, int] = {key: 0 for key in groups}
+    results: Dict[str, Union[List[List[float]], Exception]] = {}
+
+    def next_request() -> List[str]:
+        keys: List[str] = []
+        size = 0
+        while queue:
+            n = len(groups[queue[0]])
+            if keys and size + n > controller.chunks_per_request:
+                break
+            keys.append(queue.popleft())
+            size += n
+        return keys
+
+    async def run(keys: List[str]) -> None:
+        inputs = [text for key in keys for text in groups[key]]
+        controller.request_started()
+        started = time.monotonic()
+        try:
+            if timed:
+                vectors, seconds = await embed(inputs)
+            else:
+                vectors = await embed(inputs)
+                seconds = time.monotonic() - started
+            if len(vectors) != len(inputs):
+                raise ValueError(f"Expected {len(inputs)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            window = controller.windows
+            controller.observe(len(inputs), time.monotonic() - started, e)
+            for key in keys:
+                attempts[key] += 1
+                if attempts[key] > retries:
+                    results[key] = e
+                else:
+                    held.append((window, key))
+            return
+        controller.observe(len(inputs), seconds)
+        offset = 0
+        for key in keys:
+            n = len(groups[key])
+            results[key] = vectors[offset:offset + n]
+            offset += n
+
+    in_flight: set = set()
+    while queue or in_flight or held:
+        # Release held retries once their window is decided, or when nothing else would close it
+        ready = [item for item in held if item[0] < controller.windows or not (queue or in_flight)]
+        for item in ready:
+            held.remove(item)
+            queue.append(item[1])
+        while queue and len(in_flight) < controller.concurrency:
+            in_flight.add(asyncio.ensure_future(run(next_request())))
+        done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    return results
@@ -0,0 +1,778 @@
+# scripts/embedding_backends.py
+"""
+Pluggable embedding backends for job, candidate and /embed vectors.
+
+    EMBEDDING_BACKEND=ollama  (default) Ollama /api/embed over HTTP
+    EMBEDDING_BACKEND=onnx    nomic-embed-text in-process via ONNX Runtime on CPU
+    EMBEDDING_BACKEND=pool    EmbeddingRouter over EMBEDDING_POOL, e.g.
+                              "http://ollama:11434/api/embed,http://ollama-2:11434/api/embed,onnx"
+
+The pool sends each call to the healthy member with the fewest requests in flight, retries
+on another member when one fails (failed members sit out a growing cooldown), and for
+user-facing calls can hedge: if the first member has not answered within its
+EMBEDDING_HEDGE_PERCENTILE latency, the same request goes to a second member too and the
+first answer wins.
+
+Every backend from get_embedding_backend() is also gated by the process-wide
+EmbeddingScheduler: at most EMBEDDING_SCHEDULER_SLOTS calls in flight (default: what the
+backend runs in parallel, i.e. OLLAMA_NUM_PARALLEL per Ollama instance, 1 for ONNX, summed
+over pool members), handed out by
+weighted fair queuing over the priority classes interactive (/embed), profile (profile
+webhooks) and batch (enrichment). Batch never takes a free slot while an interactive call
+is waiting, so the nightly run yields after its current job. Queue time per class is
+exported on the service's /metrics.
+
+Both return one L2-normalized DIMS-long vector per input, so callers keep their own
+chunking + mean pooling and the stored vectors stay comparable across backends.
+
+ONNX setup (optional deps: pip install onnxruntime tokenizers):
+    EMBEDDING_ONNX_MODEL_DIR holds model.onnx + tokenizer.json, e.g. the onnx/ export of
+    nomic-ai/nomic-embed-text-v1.5. Inputs keep their "search_document:" prefixes, which is
+    what Ollama's nomic-embed-text sees as well.
+
+Check + benchmark:
+    python scripts/embedding_backends.py --compare            # cosine between backends
+    python scripts/embedding_backends.py --bench --texts 256  # inputs/sec and per core
+"""
+import argparse
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama").strip().lower()
+OLLAMA_EMBED_URL = os.getenv("OLLAMA_EMBED_URL", "http://ollama:11434/api/embed")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+DIMS = int(os.getenv("DIMS", "768"))
+OLLAMA_EMBED_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_EMBED_TIMEOUT_SECONDS", "120"))
+
+EMBEDDING_ONNX_MODEL_DIR = os.getenv("EMBEDDING_ONNX_MODEL_DIR", "/app/models/nomic-embed-text-v1.5")
+# intra-op threads per session; keep at or below the cores this worker is allowed to use
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", str(min(4, os.cpu_count() or 1))))
+EMBEDDING_ONNX_BATCH_SIZE = int(os.getenv("EMBEDDING_ONNX_BATCH_SIZE", "16"))
+EMBEDDING_ONNX_MAX_TOKENS = int(os.getenv("EMBEDDING_ONNX_MAX_TOKENS", "2048"))
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_PROFILE = "profile"
+PRIORITY_BATCH = "batch"
+# Priorities whose calls the pool may hedge
+HEDGED_PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_PROFILE)
+
+EMBEDDING_SCHEDULER_ENABLED = os.getenv("EMBEDDING_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+# Requests each Ollama instance runs in parallel; set it on the API/worker too, not only on
+# the ollama container
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+# Unset: what the backend runs in parallel (backend.parallel(), the sum over pool members)
+EMBEDDING_SCHEDULER_SLOTS = int(os.getenv("EMBEDDING_SCHEDULER_SLOTS")) if os.getenv("EMBEDDING_SCHEDULER_SLOTS") else None
+EMBEDDING_SCHEDULER_WEIGHTS = {
+    PRIORITY_INTERACTIVE: float(os.getenv("EMBEDDING_WEIGHT_INTERACTIVE", "8")),
+    PRIORITY_PROFILE: float(os.getenv("EMBEDDING_WEIGHT_PROFILE", "4")),
+    PRIORITY_BATCH: float(os.getenv("EMBEDDING_WEIGHT_BATCH", "1")),
+}
+
+EMBEDDING_POOL = os.getenv("EMBEDDING_POOL", "")
+EMBEDDING_POOL_COOLDOWN_SECONDS = float(os.getenv("EMBEDDING_POOL_COOLDOWN_SECONDS", "5"))
+EMBEDDING_POOL_MAX_COOLDOWN_SECONDS = float(os.getenv("EMBEDDING_POOL_MAX_COOLDOWN_SECONDS", "120"))
+EMBEDDING_HEDGE_ENABLED = os.getenv("EMBEDDING_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+EMBEDDING_HEDGE_PERCENTILE = float(os.getenv("EMBEDDING_HEDGE_PERCENTILE", "0.95"))
+# Hedge delay until a member has enough latency samples for a percentile
+EMBEDDING_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("EMBEDDING_HEDGE_DEFAULT_DELAY_SECONDS", "1.0"))
+EMBEDDING_HEDGE_MIN_SAMPLES = 20
+
+# Cosine floor for --compare: GGUF (Ollama) vs fp32 ONNX of the same weights
+EMBEDDING_MATCH_MIN_COSINE = float(os.getenv("EMBEDDING_MATCH_MIN_COSINE", "0.99"))
+
+
+def check_dims(vectors: List[List[float]], dims: int = DIMS) -> List[List[float]]:
+    for v in vectors:
+        if not v or len(v) != dims:
+            got = len(v) if v else 0
+            raise ValueError(f"Invalid embedding dims. Expected {dims}, got {got}")
+    return vectors
+
+
+class EmbeddingBackend:
+    """embed(inputs) -> one normalized vector per input, in input order."""
+
+    name = "base"
+
+    def __init__(self, model: str = EMBEDDING_MODEL, dims: int = DIMS):
+        self.model = model
+        self.dims = dims
+
+    async def embed(self, inputs: List[str], priority: str = PRIORITY_BATCH) -> List[List[float]]:
+        """priority is one of the PRIORITY_* classes (used by the scheduler and the pool)."""
+        raise NotImplementedError
+
+    async def embed_timed(self, inputs: List[str], priority: str = PRIORITY_BATCH) -> Tuple[List[List[float]], float]:
+        """embed() plus the seconds the backend spent on it (for the adaptive embed controller)."""
+        started = time.monotonic()
+        vectors = await self.embed(inputs, priority=priority)
+        return vectors, time.monotonic() - started
+
+    async def close(self) -> None:
+        return None
+
+    def stats(self) -> Dict:
+        return {}
+
+    def cores(self) -> int:
+        """CPU cores the backend computes on (for per-core throughput)."""
+        return os.cpu_count() or 1
+
+    def parallel(self) -> int:
+        """Requests the backend serves at once (the embedding scheduler's default slot count)."""
+        return 1
+
+
+class OllamaEmbeddingBackend(EmbeddingBackend):
+    name = "ollama"
+
+    def __init__(self, url: str = OLLAMA_EMBED_URL, model: str = EMBEDDING_MODEL, dims: int = DIMS):
+        super().__init__(model, dims)
+        self.url = url
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        # Scripts call asyncio.run() per pass while the service keeps one loop; an
+        # AsyncClient must not outlive the loop that opened it.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(timeout=OLLAMA_EMBED_TIMEOUT_SECONDS)
+            self._loop = loop
+        return self._client
+
+    async def embed(self, inputs: List[str], priority: str = PRIORITY_BATCH) -> List[List[float]]:
+        """
+        Ollama /api/embed batch. Vectors are normalized per input.
+        """
+        if not inputs:
+            return []
+
+        resp = await self._ensure_client().post(self.url, json={"model": self.model, "input": inputs})
+        resp.raise_for_status()
+        data = resp.json()
+
+        embs = data.get("embeddings")
+        if embs is None:
+            single = data.get("embedding")
+            if single is not None:
+                embs = [single]
+            else:
+                raise ValueError(f"Unexpected /api/embed response keys: {list(data.keys())}")
+        return check_dims(embs, self.dims)
+
+    async def close(self) -> None:
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+    def cores(self) -> int:
+        # Ollama runs in its own container; OLLAMA_NUM_THREADS is what it is given there
+        return int(os.getenv("OLLAMA_NUM_THREADS", str(os.cpu_count() or 1)))
+
+    def parallel(self) -> int:
+        return max(1, OLLAMA_NUM_PARALLEL)
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    nomic-embed-text on ONNX Runtime (CPU): real tensor batches, masked mean pooling over
+    last_hidden_state, L2 normalization - the same pooling nomic-embed-text uses in Ollama.
+    """
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        model_dir: str = EMBEDDING_ONNX_MODEL_DIR,
+        threads: int = EMBEDDING_ONNX_THREADS,
+        batch_size: int = EMBEDDING_ONNX_BATCH_SIZE,
+        max_tokens: int = EMBEDDING_ONNX_MAX_TOKENS,
+        model: str = EMBEDDING_MODEL,
+        dims: int = DIMS,
+    ):
+        super().__init__(model, dims)
+        self.model_dir = Path(model_dir)
+        self.threads = max(1, threads)
+        self.batch_size = max(1, batch_size)
+        self.max_tokens = max_tokens
+        self._session = None
+        self._tokenizer = None
+        self._input_names: List[str] = []
+        # One run at a time: each run already uses `threads` cores, overlapping runs only
+        # oversubscribe them.
+        self._run_lock = threading.Lock()
+
+    def _load(self) -> None:
+        with self._run_lock:
+            if self._session is None:
+                self._load_session()
+
+    def _load_session(self) -> None:
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise RuntimeError("EMBEDDING_BACKEND=onnx needs onnxruntime and tokenizers (pip install onnxruntime tokenizers)")
+
+        model_path = self.model_dir / "model.onnx"
+        if not model_path.exists():
+            model_path = self.model_dir / "onnx" / "model.onnx"
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = [i.name for i in self._session.get_inputs()]
+
+        tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.max_tokens)
+        tokenizer.no_padding()
+        self._tokenizer = tokenizer
+        print(f"🧠 ONNX embedding model loaded: {model_path} (threads={self.threads}, batch={self.batch_size})")
+
+    def _run_batch(self, texts: List[str]):
+        import numpy as np
+
+        encodings = self._tokenizer.encode_batch(texts)
+        width = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(texts), width), dtype=np.int64)
+        attention = np.zeros((len(texts), width), dtype=np.int64)
+        for row, enc in enumerate(encodings):
+            input_ids[row, :len(enc.ids)] = enc.ids
+            attention[row, :len(enc.ids)] = 1
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        with self._run_lock:
+            hidden = self._session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+
+        mask = attention[:, :, None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled = pooled[:, :self.dims]
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+    def embed_sync(self, inputs: List[str]) -> List[List[float]]:
+        if not inputs:
+            return []
+        self._load()
+        # Length-sorted batches keep padding (wasted FLOPs) low; results go back in input order.
+        order = sorted(range(len(inputs)), key=lambda i: len(inputs[i]))
+        out: List[Optional[List[float]]] = [None] * len(inputs)
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            vectors = self._run_batch([inputs[i] for i in idx])
+            for i, vec in zip(idx, vectors):
+                out[i] = vec.tolist()
+        return check_dims(out, self.dims)
+
+    async def embed(self, inputs: List[str], priority: str = PRIORITY_BATCH) -> List[List[float]]:
+        # CPU-bound: keep the event loop (service endpoints, scheduler) responsive
+        return await asyncio.to_thread(self.embed_sync, inputs)
+
+    def cores(self) -> int:
+        return self.threads
+
+
+class PoolMember:
+    def __init__(self, backend: EmbeddingBackend, label: str):
+        self.backend = backend
+        self.label = label
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.latencies: deque = deque(maxlen=200)
+        self.requests = 0
+        self.failures = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < EMBEDDING_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def mark_success(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def mark_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        cooldown = EMBEDDING_POOL_COOLDOWN_SECONDS * 2 ** (self.consecutive_failures - 1)
+        self.unhealthy_until = time.monotonic() + min(cooldown, EMBEDDING_POOL_MAX_COOLDOWN_SECONDS)
+
+    def stats(self) -> Dict:
+        p50 = sorted(self.latencies)[len(self.latencies) // 2] if self.latencies else None
+        return {
+            "backend": self.label,
+            "healthy": self.healthy(time.monotonic()),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+        }
+
+
+class EmbeddingRouter(EmbeddingBackend):
+    """
+    Least-loaded routing over several backends with failover and optional hedging.
+    A member that fails sits out a cooldown (doubling per consecutive failure); once it
+    expires the next request doubles as the health probe. If every member is cooling
+    down, the one that recovers first is tried anyway rather than failing outright.
+    """
+
+    name = "pool"
+
+    def __init__(
+        self,
+        backends: List[EmbeddingBackend],
+        labels: Optional[List[str]] = None,
+        hedge: bool = EMBEDDING_HEDGE_ENABLED,
+        hedge_percentile: float = EMBEDDING_HEDGE_PERCENTILE,
+        default_hedge_delay: float = EMBEDDING_HEDGE_DEFAULT_DELAY_SECONDS,
+    ):
+        if not backends:
+            raise ValueError("EmbeddingRouter needs at least one backend")
+        super().__init__(backends[0].model, backends[0].dims)
+        labels = labels or [getattr(b, "url", b.name) for b in backends]
+        self.members = [PoolMember(b, label) for b, label in zip(backends, labels)]
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+
+    def _pick(self, exclude: List[PoolMember]) -> Optional[PoolMember]:
+        candidates = [m for m in self.members if m not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        healthy = [m for m in candidates if m.healthy(now)]
+        if not healthy:
+            return min(candidates, key=lambda m: m.unhealthy_until)
+        return min(healthy, key=lambda m: (m.in_flight, m.latency_percentile(0.5) or 0.0))
+
+    async def _call(self, member: PoolMember, inputs: List[str]) -> List[List[float]]:
+        member.in_flight += 1
+        member.requests += 1
+        started = time.monotonic()
+        try:
+            result = await member.backend.embed(inputs)
+        except Exception:
+            member.mark_failure()
+            raise
+        finally:
+            member.in_flight -= 1
+        member.mark_success(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, first: PoolMember, inputs: List[str], tried: List[PoolMember]) -> List[List[float]]:
+        """Run on `first`; past its latency percentile, also race a second member."""
+        delay = first.latency_percentile(self.hedge_percentile) or self.default_hedge_delay
+        primary = asyncio.ensure_future(self._call(first, inputs))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            second = None if done else self._pick(tried)
+            if second is None:
+                return await primary
+            tried.append(second)
+            self.hedged_requests += 1
+            backup = asyncio.ensure_future(self._call(second, inputs))
+            tasks.add(backup)
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser keeps its slot until cancelled; don't leave it running
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def embed(self, inputs: List[str], priority: str = PRIORITY_BATCH) -> List[List[float]]:
+        if not inputs:
+            return []
+        tried: List[PoolMember] = []
+        last_error: Optional[Exception] = None
+        while True:
+            member = self._pick(tried)
+            if member is None:
+                break
+            tried.append(member)
+            try:
+                if priority in HEDGED_PRIORITIES and self.hedge and len(self.members) > 1:
+                    return await self._hedged(member, inputs, tried)
+                return await self._call(member, inputs)
+            except Exception as e:
+                last_error = e
+                print(f"⚠️ Embedding backend {member.label} failed, trying another: {e}")
+        raise last_error
+
+    async def close(self) -> None:
+        for member in self.members:
+            await member.backend.close()
+
+    def cores(self) -> int:
+        return sum(m.backend.cores() for m in self.members)
+
+    def parallel(self) -> int:
+        # Least-loaded routing only spreads calls if the scheduler lets this many through
+        return sum(m.backend.parallel() for m in self.members)
+
+    async def health_check(self) -> Dict:
+        """Probe every member with a one-word embed; updates health and returns stats()."""
+        async def probe(member: PoolMember) -> None:
+            try:
+                await self._call(member, ["search_query: ping"])
+            except Exception as e:
+                print(f"⚠️ Embedding backend {member.label} unhealthy: {e}")
+
+        await asyncio.gather(*(probe(m) for m in self.members))
+        return self.stats()
+
+    def stats(self) -> Dict:
+        return {
+            "members": [m.stats() for m in self.members],
+            "hedged_requests": self.hedged_requests,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "priority", "enqueued_at", "granted")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, priority: str):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class EmbeddingScheduler:
+    """
+    Slot scheduler shared by every event loop in the process (the service loop and the
+    asyncio.run() loops of scheduled enrichment threads), hence threading locks and
+    call_soon_threadsafe instead of asyncio primitives.
+
+    Weighted fair queuing with unit cost per call: each class has a virtual finish time that
+    advances by 1/weight per dispatched call, and the waiting class with the smallest
+    virtual start goes next. On top of that batch is held back while interactive calls wait.
+    """
+
+    def __init__(self, slots: Optional[int] = EMBEDDING_SCHEDULER_SLOTS, weights: Optional[Dict[str, float]] = None):
+        self.slots = max(1, slots if slots is not None else OLLAMA_NUM_PARALLEL)
+        self.weights = dict(weights or EMBEDDING_SCHEDULER_WEIGHTS)
+        self._lock = threading.Lock()
+        self._queues: Dict[str, deque] = {p: deque() for p in self.weights}
+        self._finish: Dict[str, float] = {p: 0.0 for p in self.weights}
+        self._virtual_time = 0.0
+        self._in_use = 0
+        self._waits: Dict[str, deque] = {p: deque(maxlen=1000) for p in self.weights}
+        self._wait_sum: Dict[str, float] = {p: 0.0 for p in self.weights}
+        self._wait_count: Dict[str, int] = {p: 0 for p in self.weights}
+
+    def _next_priority(self) -> Optional[str]:
+        waiting = [p for p, q in self._queues.items() if q]
+        if PRIORITY_INTERACTIVE in waiting and PRIORITY_BATCH in waiting:
+            waiting.remove(PRIORITY_BATCH)
+        if not waiting:
+            return None
+        return min(waiting, key=lambda p: max(self._virtual_time, self._finish[p]))
+
+    def _grant_locked(self, waiter: _Waiter) -> None:
+        start = max(self._virtual_time, self._finish[waiter.priority])
+        self._virtual_time = start
+        self._finish[waiter.priority] = start + 1.0 / self.weights[waiter.priority]
+        waited = time.monotonic() - waiter.enqueued_at
+        self._waits[waiter.priority].append(waited)
+        self._wait_sum[waiter.priority] += waited
+        self._wait_count[waiter.priority] += 1
+        self._in_use += 1
+        waiter.granted = True
+
+    def _dispatch_locked(self) -> None:
+        while self._in_use < self.slots:
+            priority = self._next_priority()
+            if priority is None:
+                return
+            waiter = self._queues[priority].popleft()
+            self._grant_locked(waiter)
+            waiter.loop.call_soon_threadsafe(self._deliver, waiter)
+
+    def _deliver(self, waiter: _Waiter) -> None:
+        if waiter.future.cancelled():
+            self.release()
+        else:
+            waiter.future.set_result(None)
+
+    async def acquire(self, priority: str = PRIORITY_BATCH) -> None:
+        if priority not in self._queues:
+            raise ValueError(f"Unknown embedding priority: {priority!r}")
+        waiter = _Waiter(asyncio.get_running_loop(), priority)
+        with self._lock:
+            self._queues[priority].append(waiter)
+            self._dispatch_locked()
+        if waiter.future.done():
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    self._queues[priority].remove(waiter)
+                    return_slot = False
+                else:
+                    # Granted but the result landed just before the cancel: give it back
+                    return_slot = waiter.future.done() and not waiter.future.cancelled()
+            if return_slot:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_use -= 1
+            self._dispatch_locked()
+
+    def resize(self, slots: int) -> None:
+        with self._lock:
+            self.slots = max(1, slots)
+            self._dispatch_locked()
+
+    @asynccontextmanager
+    async def slot(self, priority: str = PRIORITY_BATCH):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = {"slots": self.slots, "in_use": self._in_use, "classes": {}}
+            for p in self.weights:
+                waits = sorted(self._waits[p])
+                out["classes"][p] = {
+                    "weight": self.weights[p],
+                    "queued": len(self._queues[p]),
+                    "count": self._wait_count[p],
+                    "wait_sum_seconds": round(self._wait_sum[p], 4),
+                    "wait_p50_seconds": round(waits[len(waits) // 2], 4) if waits else None,
+                    "wait_p95_seconds": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 4) if waits else None,
+                }
+            return out
+
+    def metrics_text(self) -> str:
+        """Prometheus text exposition of queue time, depth and slot use per class."""
+        stats = self.stats()
+        lines = [
+            "# HELP embedding_queue_wait_seconds Time embedding calls waited for a slot, by priority class.",
+            "# TYPE embedding_queue_wait_seconds summary",
+        ]
+        for p, c in stats["classes"].items():
+            for q, key in (("0.5", "wait_p50_seconds"), ("0.95", "wait_p95_seconds")):
+                if c[key] is not None:
+                    lines.append(f'embedding_queue_wait_seconds{{priority="{p}",quantile="{q}"}} {c[key]}')
+            lines.append(f'embedding_queue_wait_seconds_sum{{priority="{p}"}} {c["wait_sum_seconds"]}')
+            lines.append(f'embedding_queue_wait_seconds_count{{priority="{p}"}} {c["count"]}')
+        lines += ["# HELP embedding_queue_depth Embedding calls waiting for a slot.", "# TYPE embedding_queue_depth gauge"]
+        lines += [f'embedding_queue_depth{{priority="{p}"}} {c["queued"]}' for p, c in stats["classes"].items()]
+        lines += [
+            "# HELP embedding_slots_in_use Embedding calls currently running.",
+            "# TYPE embedding_slots_in_use gauge",
+            f"embedding_slots_in_use {stats['in_use']}",
+            "# HELP embedding_slots Embedding calls allowed in flight.",
+            "# TYPE embedding_slots gauge",
+            f"embedding_slots {stats['slots']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+embedding_scheduler = EmbeddingScheduler()
+
+
+class ScheduledBackend(EmbeddingBackend):
+    """Runs every call of `inner` inside an embedding_scheduler slot of its priority."""
+
+    def __init__(self, inner: EmbeddingBackend, scheduler: EmbeddingScheduler = embedding_scheduler):
+        super().__init__(inner.model, inner.dims)
+        self.inner = inner
+        self.scheduler = scheduler
+        self.name = inner.name
+
+    async def embed(self, inputs: List[str], priority: str = PRIORITY_BATCH) -> List[List[float]]:
+        if not inputs:
+            return []
+        async with self.scheduler.slot(priority):
+            return await self.inner.embed(inputs, priority=priority)
+
+    async def embed_timed(self, inputs: List[str], priority: str = PRIORITY_BATCH) -> Tuple[List[List[float]], float]:
+        """Times only the part that holds a slot, so queueing behind other classes is not latency."""
+        if not inputs:
+            return [], 0.0
+        async with self.scheduler.slot(priority):
+            started = time.monotonic()
+            vectors = await self.inner.embed(inputs, priority=priority)
+            return vectors, time.monotonic() - started
+
+    async def close(self) -> None:
+        await self.inner.close()
+
+    def cores(self) -> int:
+        return self.inner.cores()
+
+    def parallel(self) -> int:
+        return self.scheduler.slots
+
+    def stats(self) -> Dict:
+        return self.inner.stats()
+
+
+def build_pool(spec: str = EMBEDDING_POOL) -> EmbeddingRouter:
+    """EMBEDDING_POOL: comma-separated Ollama /api/embed URLs and/or the word "onnx"."""
+    entries = [e.strip() for e in spec.split(",") if e.strip()] or [OLLAMA_EMBED_URL]
+    backends: List[EmbeddingBackend] = []
+    for entry in entries:
+        backends.append(OnnxEmbeddingBackend() if entry == "onnx" else OllamaEmbeddingBackend(url=entry))
+    return EmbeddingRouter(backends, labels=entries)
+
+
+def get_embedding_backend(name: str = EMBEDDING_BACKEND) -> EmbeddingBackend:
+    if name == "ollama":
+        backend: EmbeddingBackend = OllamaEmbeddingBackend()
+    elif name == "onnx":
+        backend = OnnxEmbeddingBackend()
+    elif name == "pool":
+        backend = build_pool()
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {name!r} (expected 'ollama', 'onnx' or 'pool')")
+    if not EMBEDDING_SCHEDULER_ENABLED:
+        return backend
+    if EMBEDDING_SCHEDULER_SLOTS is None:
+        embedding_scheduler.resize(backend.parallel())
+    elif EMBEDDING_SCHEDULER_SLOTS < backend.parallel():
+        print(
+            f"⚠️ EMBEDDING_SCHEDULER_SLOTS={EMBEDDING_SCHEDULER_SLOTS} is below what {backend.name} "
+            f"runs in parallel ({backend.parallel()}); calls will queue in the scheduler"
+        )
+    return ScheduledBackend(backend)
+
+
+# ---------------- Compare + benchmark ----------------
+SAMPLE_TEXTS = [
+    "search_document: Jobb: Lagerarbetare\nPlats: Göteborg\nKrav: B-körkort, truckkort A+B. Erfarenhet av plock och pack.",
+    "search_document: Jobb: Backend-utvecklare\nKompetens:\nKrav: Python, PostgreSQL, Docker. Meriterande: Kubernetes, AWS.",
+    "search_document: Jobb: Undersköterska\nOmråde: Hälso- och sjukvård\nKrav: Undersköterskeexamen, svenska i tal och skrift.",
+    "search_document: Jobb: Elektriker\nKrav: ECY-certifikat, ESA-utbildning. Vi erbjuder kollektivavtal och tjänstebil.",
+    "search_document: Jobb: Ekonomiassistent\nArbetsuppgifter: Leverantörsreskontra, fakturering och bokslut i Visma.",
+    "search_query: Jag söker jobb som truckförare i Malmö med B-körkort.",
+]
+
+
+def cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+def bench_texts(n: int) -> List[str]:
+    # Roughly one CHUNK_CHARS-sized job chunk per input
+    texts = []
+    for i in range(n):
+        base = SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]
+        texts.append(f"{base}\nChunk {i % 4 + 1}/4:\n" + (base[len("search_document: "):] + " ") * 5)
+    return [t[:900] for t in texts]
+
+
+async def compare_backends(texts: List[str]) -> dict:
+    ollama, onnx = OllamaEmbeddingBackend(), OnnxEmbeddingBackend()
+    try:
+        a = await ollama.embed(texts)
+        b = await onnx.embed(texts)
+    finally:
+        await ollama.close()
+        await onnx.close()
+    sims = [cosine(x, y) for x, y in zip(a, b)]
+    max_abs = max(max(abs(x - y) for x, y in zip(va, vb)) for va, vb in zip(a, b))
+    report = {
+        "inputs": len(texts),
+        "min_cosine": round(min(sims), 5),
+        "mean_cosine": round(sum(sims) / len(sims), 5),
+        "max_abs_diff": round(max_abs, 5),
+        "match": min(sims) >= EMBEDDING_MATCH_MIN_COSINE,
+    }
+    print(f"📊 ollama vs onnx: {report}")
+    return report
+
+
+async def bench_backend(backend: EmbeddingBackend, texts: List[str], request_size: int) -> dict:
+    try:
+        await backend.embed(texts[:2])  # load model / warm connection
+        started = time.perf_counter()
+        for i in range(0, len(texts), request_size):
+            await backend.embed(texts[i:i + request_size])
+        elapsed = time.perf_counter() - started
+    finally:
+        await backend.close()
+    per_sec = len(texts) / elapsed if elapsed > 0 else 0.0
+    report = {
+        "backend": backend.name,
+        "inputs": len(texts),
+        "seconds": round(elapsed, 2),
+        "inputs_per_sec": round(per_sec, 1),
+        "cores": backend.cores(),
+        "inputs_per_sec_per_core": round(per_sec / backend.cores(), 2),
+    }
+    print(f"⏱️ {report}")
+    return report
+
+
+async def main_async(args) -> None:
+    if args.compare:
+        await compare_backends(SAMPLE_TEXTS + bench_texts(10))
+    if args.bench:
+        texts = bench_texts(args.texts)
+        for name in args.backends.split(","):
+            await bench_backend(get_embedding_backend(name.strip()), texts, args.request_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backend check and benchmark")
+    parser.add_argument("--compare", action="store_true", help="Cosine similarity between Ollama and ONNX vectors")
+    parser.add_argument("--bench", action="store_true", help="Throughput per backend")
+    parser.add_argument("--backends", default="ollama,onnx", help="Comma-separated backends to benchmark")
+    parser.add_argument("--texts", type=int, default=128, help="Inputs per benchmark run")
+    parser.add_argument("--request-size", type=int, default=4, help="Inputs per embed() call (one job ~ MAX_CHUNKS)")
+    args = parser.parse_args()
+    if not (args.compare or args.bench):
+        parser.error("pass --compare and/or --bench")
+    asyncio.run(main_async(args))
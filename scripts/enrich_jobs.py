@@ -4,14 +4,23 @@ import sys
 import json
 import math
 import time
-import re
 import asyncio
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Tuple
 
-import httpx
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+try:
+    from scripts.job_neighbors import refresh_job_neighbors
+    from scripts.job_text import clean_text_preserve_newlines, sectionize_text
+    from scripts.embedding_backends import ScheduledBackend, get_embedding_backend
+    from scripts.embed_controller import EMBED_AIMD_MAX_CHUNKS_PER_REQUEST, EMBED_AIMD_MAX_CONCURRENCY, EmbedController, embed_groups
+except ModuleNotFoundError:
+    from job_neighbors import refresh_job_neighbors
+    from job_text import clean_text_preserve_newlines, sectionize_text
+    from embedding_backends import ScheduledBackend, get_embedding_backend
+    from embed_controller import EMBED_AIMD_MAX_CHUNKS_PER_REQUEST, EMBED_AIMD_MAX_CONCURRENCY, EmbedController, embed_groups
+
 if sys.platform == "win32":
     try:
         sys.stdout.reconfigure(encoding="utf-8")
@@ -23,12 +32,13 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
-# ✅ Prefer /api/embed (batch + normalized vectors)
-OLLAMA_EMBED_URL = os.getenv("OLLAMA_EMBED_URL", "http://ollama:11434/api/embed")
+# Embeddings come from embedding_backends (EMBEDDING_BACKEND=ollama|onnx)
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
 DIMS = int(os.getenv("DIMS", "768"))
 
 # --- CPU-safe controls ---
+# Minimum jobs per DB page; the embed controller (embed_controller.py) sizes pages to
+# its current concurrency x chunks per request
 BATCH_LIMIT = int(os.getenv("JOB_CPU_BATCH_LIMIT", "8"))
 MAX_RETRIES = int(os.getenv("JOB_CPU_MAX_RETRIES", "3"))
 
@@ -44,6 +54,9 @@ MAX_CHUNKS = int(os.getenv("JOB_CPU_MAX_CHUNKS", "4"))
 # Optional: process only rows that are missing embedding or not yet gpu_final
 PROCESS_NON_GPU_FINAL = os.getenv("JOB_PROCESS_NON_GPU_FINAL", "true").lower() in ("1", "true", "yes", "y", "on")
 
+# Keep the job-to-job neighbour graph in step with new embeddings
+JOB_NEIGHBORS_ENABLED = os.getenv("JOB_NEIGHBORS_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 
@@ -68,38 +81,6 @@ def mean_pool(vectors: List[List[float]], dims: int) -> List[float]:
     return [x / n for x in out]
 
 
-async def ollama_embed_batch(client: httpx.AsyncClient, inputs: List[str]) -> List[List[float]]:
-    """
-    Ollama /api/embed batch. Vectors are normalized per input; we re-normalize after pooling.
-    """
-    if not inputs:
-        return []
-
-    resp = await client.post(
-        OLLAMA_EMBED_URL,
-        json={"model": EMBEDDING_MODEL, "input": inputs},
-    )
-    resp.raise_for_status()
-    data = resp.json()
-
-    embs = data.get("embeddings")
-    if embs is None:
-        single = data.get("embedding")
-        if single is not None:
-            embs = [single]
-        else:
-            raise ValueError(f"Unexpected /api/embed response keys: {list(data.keys())}")
-
-    out: List[List[float]] = []
-    for e in embs:
-        if not e or len(e) != DIMS:
-            got = len(e) if e else 0
-            raise ValueError(f"Invalid embedding dims. Expected {DIMS}, got {got}")
-        out.append(e)
-
-    return out
-
-
 # ---------------- Text extraction / cleaning ----------------
 def safe_json_loads(maybe_json: Any) -> dict:
     if isinstance(maybe_json, dict):
@@ -139,131 +120,6 @@ def extract_skills_from_snapshot(snap: dict) -> str:
     return " ".join(parts).strip()
 
 
-NOISE_LINE_PATTERNS = [
-    r"Öppen för alla",
-    r"Vi fokuserar på din kompetens",
-    r"Var ligger arbetsplatsen",
-    r"Postadress",
-    r"Ansök",
-    r"Sök jobbet",
-    r"Arbetsgivaren har tagit bort annonsen",
-    r"Kontakt(uppgifter)?",
-    r"Facklig(a)?",
-    r"Intervjuer sker löpande",
-    r"Urval sker löpande",
-    r"Välkommen med din ansökan",
-    r"GDPR",
-    r"Rekryteringsprocess",
-    r"Vi undanber oss",
-    r"Vi undanber oss kontakt från",
-    r"Samtycke",
-    r"Personuppgifter",
-]
-
-KEEP_SECTION_PATTERNS = [
-    (r"^arbetsuppgifter\b", "arbetsuppgifter"),
-    (r"^dina arbetsuppgifter\b", "arbetsuppgifter"),
-    (r"^arbetsbeskrivning\b", "arbetsuppgifter"),
-    (r"^huvudsakliga arbetsuppgifter\b", "arbetsuppgifter"),
-    (r"^kvalifikationer\b", "kvalifikationer"),
-    (r"^krav\b", "krav"),
-    (r"^kravprofil\b", "krav"),
-    (r"^vi söker\b", "krav"),
-    (r"^meriterande\b", "meriterande"),
-    (r"^kompetens\b", "kompetens"),
-    (r"^profil\b", "profil"),
-    (r"^personliga egenskaper\b", "profil"),
-    (r"^om tjänsten\b", "om_tjänsten"),
-    (r"^om rollen\b", "om_tjänsten"),
-    (r"^villkor\b", "villkor"),
-    (r"^anställningsform\b", "villkor"),
-    (r"^om arbetsplatsen\b", "om_arbetsplatsen"),
-    (r"^om företaget\b", "om_arbetsplatsen"),
-    (r"^vi erbjuder\b", "erbjudande"),
-    (r"^erbjuder vi\b", "erbjudande"),
-]
-
-DROP_SECTION_PATTERNS = [
-    r"^ansökan\b",
-    r"^ansök( idag)?\b",
-    r"^så här ansöker du\b",
-    r"^kontakt\b",
-    r"^kontaktuppgifter\b",
-    r"^facklig(a)?\b",
-    r"^övrigt\b",
-    r"^rekryteringsprocess\b",
-]
-
-
-def clean_text_preserve_newlines(s: str) -> Tuple[str, int]:
-    if not s:
-        return "", 0
-    s = s.replace("\x00", "").replace("\r", "\n")
-
-    removed = 0
-    out_lines: List[str] = []
-    for line in s.splitlines():
-        ln = line.strip()
-        if not ln:
-            continue
-        if any(re.search(p, ln, flags=re.I) for p in NOISE_LINE_PATTERNS):
-            removed += 1
-            continue
-        out_lines.append(ln)
-
-    cleaned = "\n".join(out_lines).strip()
-    cleaned = re.sub(r"[ \t]+", " ", cleaned)
-    return cleaned, removed
-
-
-def sectionize_text(cleaned: str) -> Tuple[Dict[str, str], dict]:
-    if not cleaned:
-        return {}, {"had_headings": False, "kept_sections": []}
-
-    lines = cleaned.splitlines()
-    sections: Dict[str, List[str]] = {}
-    current_key: Optional[str] = None
-    had_heading = False
-
-    keep_compiled = [(re.compile(pat, re.I), key) for pat, key in KEEP_SECTION_PATTERNS]
-    drop_compiled = [re.compile(pat, re.I) for pat in DROP_SECTION_PATTERNS]
-
-    def detect_heading(line: str) -> Tuple[Optional[str], Optional[str]]:
-        for rx in drop_compiled:
-            if rx.search(line):
-                return "drop", None
-        for rx, key in keep_compiled:
-            if rx.search(line):
-                return "keep", key
-        return None, None
-
-    kept = set()
-
-    for ln in lines:
-        kind, key = detect_heading(ln)
-        if kind == "drop":
-            had_heading = True
-            current_key = None
-            continue
-        if kind == "keep" and key:
-            had_heading = True
-            current_key = key
-            kept.add(key)
-            sections.setdefault(key, [])
-            continue
-
-        if current_key:
-            sections[current_key].append(ln)
-
-    out: Dict[str, str] = {}
-    for k, vlines in sections.items():
-        txt = "\n".join(vlines).strip()
-        if txt:
-            out[k] = txt
-
-    return out, {"had_headings": had_heading, "kept_sections": sorted(list(kept))}
-
-
 def build_job_document(row: Dict[str, Any]) -> Tuple[str, dict]:
     snap = safe_json_loads(row.get("source_snapshot"))
 
@@ -391,7 +247,7 @@ HAS_PARSE_DEBUG = table_has_column("job_ads", "parse_debug")
 HAS_ERROR = table_has_column("job_ads", "embedding_error")
 
 
-def fetch_jobs_to_process() -> List[Dict[str, Any]]:
+def fetch_jobs_to_process(limit: int = BATCH_LIMIT) -> List[Dict[str, Any]]:
     q = supabase.table("job_ads").select("*")
 
     # If you want to continually refresh non-gpu_final:
@@ -402,7 +258,7 @@ def fetch_jobs_to_process() -> List[Dict[str, Any]]:
     # (keeps DB stable and avoids rewriting everything)
     q = q.is_("embedding", "null")
 
-    res = q.limit(BATCH_LIMIT).execute()
+    res = q.limit(limit).execute()
     return res.data or []
 
 
@@ -438,24 +294,64 @@ def update_job_error(job_id: str, msg: str) -> None:
 
 
 # ---------------- Main loop ----------------
+def save_job_with_retries(job_id: str, pooled: List[float], doc: str, debug: dict) -> bool:
+    for save_attempt in range(MAX_RETRIES):
+        try:
+            update_job_success(job_id, pooled, doc, debug)
+            return True
+        except Exception as e:
+            print(f"   ⚠️ Save failed ({save_attempt+1}/{MAX_RETRIES}) for {job_id}: {e}")
+            time.sleep(2)
+    return False
+
+
+def mark_job_failed(job_id: str, headline: str, msg: str) -> None:
+    print(f"   ❌ Failed {job_id} ({headline}): {msg}")
+    try:
+        update_job_error(job_id, msg)
+    except Exception:
+        pass
+
+
 async def enrich_job_vectors():
+    embedder = get_embedding_backend()
+    # Behind the embedding scheduler, more requests than slots only queue, and a request of
+    # more than one job would keep an interactive /embed waiting behind the whole batch.
+    scheduled = isinstance(embedder, ScheduledBackend)
+    # Starts where the static setup was (one job per request, one request at a time)
+    controller = EmbedController(
+        "enrich_jobs",
+        concurrency=1,
+        chunks_per_request=MAX_CHUNKS,
+        max_concurrency=min(EMBED_AIMD_MAX_CONCURRENCY, embedder.scheduler.slots) if scheduled else EMBED_AIMD_MAX_CONCURRENCY,
+        max_chunks_per_request=MAX_CHUNKS if scheduled else EMBED_AIMD_MAX_CHUNKS_PER_REQUEST,
+        min_chunks_per_request=MAX_CHUNKS,
+        context={"model": EMBEDDING_MODEL, "backend": embedder.name, "chunk_chars": CHUNK_CHARS},
+    )
     print(
         f"📦 CPU Job Enrichment (High-signal extraction within CPU limits)\n"
         f"   Model: {EMBEDDING_MODEL} | dims={DIMS}\n"
         f"   Batch: {BATCH_LIMIT} | retries={MAX_RETRIES}\n"
         f"   Caps: doc={MAX_TOTAL_CHARS} desc={DESC_CHARS}\n"
         f"   Chunks: {MAX_CHUNKS} x {CHUNK_CHARS} (overlap {OVERLAP_CHARS})\n"
-        f"   Ollama: {OLLAMA_EMBED_URL}\n"
+        f"   Embeddings: {embedder.name} | adaptive={controller.adaptive} (run {controller.run_id})\n"
     )
+    if scheduled and controller.adaptive and controller.pinned():
+        # Raise EMBEDDING_SCHEDULER_SLOTS / OLLAMA_NUM_PARALLEL (or add pool members) to give it room
+        print(
+            f"⚠️ Embed controller cannot adapt: the embedding scheduler has {embedder.scheduler.slots} slot(s) "
+            f"and a request is capped at one job ({MAX_CHUNKS} chunks) so interactive calls never wait behind a batch."
+        )
 
-    async with httpx.AsyncClient(timeout=90.0) as http_client:
+    try:
         while True:
             jobs: List[Dict[str, Any]] = []
+            page_size = controller.jobs_per_page(MAX_CHUNKS, minimum=BATCH_LIMIT)
 
             # DB retry
             for attempt in range(MAX_RETRIES):
                 try:
-                    jobs = fetch_jobs_to_process()
+                    jobs = fetch_jobs_to_process(page_size)
                     break
                 except Exception as e:
                     print(f"⚠️ DB fetch failed ({attempt+1}/{MAX_RETRIES}): {e}")
@@ -465,47 +361,51 @@ async def enrich_job_vectors():
                 print("✅ Inga fler jobb att vektorisera (CPU pass).")
                 break
 
-            print(f"🔄 Processing batch of {len(jobs)}...")
+            print(f"🔄 Processing batch of {len(jobs)}... ({controller.settings()})")
+            saved_ids: List[str] = []
+            prepared: Dict[str, Tuple[str, str, dict]] = {}
+            groups: Dict[str, List[str]] = {}
 
             for row in jobs:
                 job_id = str(row.get("id") or "")
                 headline = (row.get("headline") or "")[:60]
-
                 try:
                     doc, debug = build_job_document(row)
                     chunks = chunk_text(doc, CHUNK_CHARS, OVERLAP_CHARS, MAX_CHUNKS)
                     if not chunks:
                         raise ValueError("No chunks built from document")
+                    prepared[job_id] = (headline, doc, debug)
+                    groups[job_id] = build_chunk_inputs(job_id, chunks)
+                except Exception as e:
+                    mark_job_failed(job_id, headline, str(e))
 
-                    inputs = build_chunk_inputs(job_id, chunks)
-                    chunk_vecs = await ollama_embed_batch(http_client, inputs)
+            results = await embed_groups(embedder.embed_timed, groups, controller, timed=True)
 
-                    pooled = mean_pool(chunk_vecs, DIMS)
-                    pooled = l2_normalize(pooled)
+            for job_id, (headline, doc, debug) in prepared.items():
+                chunk_vecs = results.get(job_id)
+                if isinstance(chunk_vecs, Exception) or chunk_vecs is None:
+                    mark_job_failed(job_id, headline, str(chunk_vecs))
+                    continue
 
-                    # Save with retries
-                    saved = False
-                    for save_attempt in range(MAX_RETRIES):
-                        try:
-                            update_job_success(job_id, pooled, doc, debug)
-                            saved = True
-                            break
-                        except Exception as e:
-                            print(f"   ⚠️ Save failed ({save_attempt+1}/{MAX_RETRIES}) for {job_id}: {e}")
-                            time.sleep(2)
+                pooled = mean_pool(chunk_vecs, DIMS)
+                pooled = l2_normalize(pooled)
 
-                    if saved:
-                        print(f"   ✅ Saved CPU: {headline}...")
-                    else:
-                        raise ValueError("Could not save after retries")
+                if save_job_with_retries(job_id, pooled, doc, debug):
+                    saved_ids.append(job_id)
+                    print(f"   ✅ Saved CPU: {headline}...")
+                else:
+                    mark_job_failed(job_id, headline, "Could not save after retries")
 
+            if JOB_NEIGHBORS_ENABLED and saved_ids:
+                try:
+                    refreshed = refresh_job_neighbors(saved_ids)
+                    print(f"   🕸️ Neighbour lists refreshed: {refreshed}")
                 except Exception as e:
-                    msg = str(e)
-                    print(f"   ❌ Failed {job_id} ({headline}): {msg}")
-                    try:
-                        update_job_error(job_id, msg)
-                    except Exception:
-                        pass
+                    print(f"   ⚠️ Neighbour refresh failed: {e}")
+    finally:
+        summary = controller.summary()
+        print(f"🎛️ Embed controller: {summary}")
+        await embedder.close()
 
 
 if __name__ == "__main__":
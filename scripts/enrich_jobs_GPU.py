@@ -6,6 +6,7 @@ High-quality GPU enrichment (manual local run).
 - Fetch jobs marked for GPU upgrade (embedding_needs_gpu = true)
 - Build high-signal extraction (snapshot-first, section-aware, noise removal)
 - Chunked pooling via Ollama /api/embed (batch input)
+- Concurrency and chunks per request tuned at runtime by embed_controller (--adaptive)
 - Overwrite embedding only when GPU succeeds
 - Mark embedding_quality='gpu_final' and embedding_needs_gpu=false on success
 """
@@ -24,6 +25,13 @@ import httpx
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+try:
+    from scripts.job_neighbors import refresh_job_neighbors
+    from scripts.embed_controller import EMBED_ADAPTIVE_ENABLED, EmbedController, embed_groups
+except ModuleNotFoundError:
+    from job_neighbors import refresh_job_neighbors
+    from embed_controller import EMBED_ADAPTIVE_ENABLED, EmbedController, embed_groups
+
 
 # ------------------- Env / Defaults -------------------
 load_dotenv()
@@ -449,7 +457,7 @@ def parse_bool(s: str) -> bool:
 async def main():
     parser = argparse.ArgumentParser(description="GPU job enrichment (upgrade CPU embeddings to gpu_final).")
     parser.add_argument("--limit", type=int, default=2000, help="Max jobs to process this run.")
-    parser.add_argument("--batch", type=int, default=32, help="How many jobs to fetch per loop.")
+    parser.add_argument("--batch", type=int, default=32, help="Minimum jobs to fetch per loop (the controller may fetch more).")
     parser.add_argument("--model", type=str, default=DEFAULT_MODEL, help="Ollama embedding model.")
     parser.add_argument("--dims", type=int, default=DEFAULT_DIMS, help="Expected embedding dims.")
     parser.add_argument("--ollama-embed-url", type=str, default=DEFAULT_OLLAMA_EMBED_URL, help="Ollama /api/embed endpoint.")
@@ -458,7 +466,11 @@ async def main():
     parser.add_argument("--chunk-chars", type=int, default=int(os.getenv("JOB_GPU_CHUNK_CHARS", "1400")), help="Chunk size.")
     parser.add_argument("--overlap-chars", type=int, default=int(os.getenv("JOB_GPU_OVERLAP_CHARS", "200")), help="Overlap size.")
     parser.add_argument("--max-chunks", type=int, default=int(os.getenv("JOB_GPU_MAX_CHUNKS", "10")), help="Max chunks pooled per job.")
+    parser.add_argument("--adaptive", type=parse_bool, default=EMBED_ADAPTIVE_ENABLED, help="Tune concurrency and chunks per request from latency/errors.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Starting number of /api/embed requests in flight.")
+    parser.add_argument("--chunks-per-request", type=int, default=0, help="Starting inputs per /api/embed request (default: --max-chunks).")
     parser.add_argument("--sleep", type=float, default=0.0, help="Sleep seconds between loops (throttle).")
+    parser.add_argument("--neighbors", type=parse_bool, default=parse_bool(os.getenv("JOB_NEIGHBORS_ENABLED", "true")), help="Refresh job neighbour lists after each batch.")
     args = parser.parse_args()
 
     print(f"🧠 GPU Enrich (manual)")
@@ -467,23 +479,47 @@ async def main():
     print(f"   Model:    {args.model} dims={args.dims}")
     print(f"   Caps:     desc={args.desc_chars} doc={args.max_total_chars}")
     print(f"   Chunks:   max={args.max_chunks} size={args.chunk_chars} overlap={args.overlap_chars}")
+    controller = EmbedController(
+        "enrich_jobs_GPU",
+        concurrency=args.concurrency,
+        chunks_per_request=args.chunks_per_request or args.max_chunks,
+        adaptive=args.adaptive,
+        min_chunks_per_request=args.max_chunks,
+        context={"model": args.model, "url": args.ollama_embed_url, "chunk_chars": args.chunk_chars},
+    )
+    print(f"   Control:  adaptive={controller.adaptive} start={controller.settings()} (run {controller.run_id})")
     print(f"   Will overwrite embedding only on success.\n")
 
     processed = 0
     failures = 0
     started = time.time()
 
-    async with httpx.AsyncClient(timeout=180.0) as http_client:
+    async def embed(inputs: List[str]) -> List[List[float]]:
+        return await ollama_embed_batch(http_client, args.ollama_embed_url, args.model, args.dims, inputs)
+
+    def mark_failed(job_id: Any, headline: str, msg: str) -> None:
+        print(f"❌ Failed {job_id} ({headline}): {msg}")
+        try:
+            update_job_gpu_error(job_id, msg)
+        except Exception:
+            pass
+        # IMPORTANT: we do NOT delete/reset CPU embedding; job remains cpu_quick unless overwritten later.
+
+    http_limits = httpx.Limits(max_connections=controller.max_concurrency)
+    async with httpx.AsyncClient(timeout=180.0, limits=http_limits) as http_client:
         while processed < args.limit:
             remaining = args.limit - processed
-            fetch_n = min(args.batch, remaining)
+            fetch_n = min(controller.jobs_per_page(args.max_chunks, minimum=args.batch), remaining)
 
             rows = fetch_jobs_to_upgrade(supabase, fetch_n)
             if not rows:
                 print("✅ No more jobs flagged for GPU upgrade.")
                 break
 
-            print(f"➡️  Processing batch: {len(rows)} jobs (done={processed}/{args.limit})")
+            print(f"➡️  Processing batch: {len(rows)} jobs (done={processed}/{args.limit}, {controller.settings()})")
+            upgraded_ids: List[str] = []
+            prepared: Dict[str, Tuple[Any, str, str, dict]] = {}
+            groups: Dict[str, List[str]] = {}
 
             for row in rows:
                 job_id = row.get("id")
@@ -495,13 +531,27 @@ async def main():
                     if not chunks:
                         raise ValueError("No chunks built from document")
 
-                    inputs = build_chunk_inputs(str(job_id), chunks)
-                    vecs = await ollama_embed_batch(http_client, args.ollama_embed_url, args.model, args.dims, inputs)
+                    prepared[str(job_id)] = (job_id, headline, doc, debug)
+                    groups[str(job_id)] = build_chunk_inputs(str(job_id), chunks)
+                except Exception as e:
+                    failures += 1
+                    mark_failed(job_id, headline, str(e))
+
+            results = await embed_groups(embed, groups, controller)
+
+            for key, (job_id, headline, doc, debug) in prepared.items():
+                vecs = results.get(key)
+                try:
+                    if isinstance(vecs, Exception):
+                        raise vecs
+                    if not vecs:
+                        raise ValueError("No embeddings returned")
 
                     pooled = mean_pool(vecs, args.dims)
                     pooled = l2_normalize(pooled)
 
                     update_job_gpu_success(job_id, pooled, doc, debug, args.model)
+                    upgraded_ids.append(str(job_id))
                     processed += 1
 
                     if processed % 50 == 0:
@@ -511,23 +561,25 @@ async def main():
 
                 except Exception as e:
                     failures += 1
-                    msg = str(e)
-                    print(f"❌ Failed {job_id} ({headline}): {msg}")
-                    try:
-                        update_job_gpu_error(job_id, msg)
-                    except Exception:
-                        pass
-                    # IMPORTANT: we do NOT delete/reset CPU embedding; job remains cpu_quick unless overwritten later.
+                    mark_failed(job_id, headline, str(e))
+
+            if args.neighbors and upgraded_ids:
+                try:
+                    refresh_job_neighbors(upgraded_ids)
+                except Exception as e:
+                    print(f"⚠️ Neighbour refresh failed: {e}")
 
             if args.sleep > 0:
                 time.sleep(args.sleep)
 
+    summary = controller.summary()
     elapsed = time.time() - started
     rate = processed / elapsed if elapsed > 0 else 0
     print("\n--- DONE ---")
     print(f"✅ Upgraded to GPU: {processed}")
     print(f"❌ Failures:       {failures}")
     print(f"⏱️  Time:          {elapsed:.1f}s | Rate: {rate:.2f} jobs/sec")
+    print(f"🎛️  Controller:    final={summary['final']} best={summary['best']}")
 
 
 if __name__ == "__main__":
@@ -1,11 +1,11 @@
 # scripts/generate_candidate_vector.py
 import os
 import asyncio
-import httpx
 import math
 import re
 import json
 import time
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import List, Optional, Tuple, Dict, Any
 
@@ -15,8 +15,10 @@ from dotenv import load_dotenv
 # Import parsers
 try:
     from scripts.parse_cv_pdf import extract_text_from_pdf, extract_text_from_docx, summarize_cv_text
+    from scripts.embedding_backends import PRIORITY_BATCH, get_embedding_backend
 except ImportError:
     from parse_cv_pdf import extract_text_from_pdf, extract_text_from_docx, summarize_cv_text
+    from embedding_backends import PRIORITY_BATCH, get_embedding_backend
 
 load_dotenv()
 
@@ -27,8 +29,7 @@ SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
     raise SystemExit("❌ Missing SUPABASE_URL or SUPABASE_SERVICE_KEY")
 
-# Prefer /api/embed (batch + normalized vectors)
-OLLAMA_EMBED_URL = os.getenv("OLLAMA_EMBED_URL", "http://ollama:11434/api/embed")
+# Embeddings come from embedding_backends (EMBEDDING_BACKEND=ollama|onnx)
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
 DIMS = int(os.getenv("DIMS", "768"))
 
@@ -595,45 +596,19 @@ def build_chunk_inputs(candidate: dict, chunks: List[str]) -> List[str]:
     return inputs
 
 
-async def ollama_embed_batch(inputs: List[str]) -> List[List[float]]:
-    if not inputs:
-        return []
-
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        resp = await client.post(
-            OLLAMA_EMBED_URL,
-            json={"model": EMBEDDING_MODEL, "input": inputs},
-        )
-        resp.raise_for_status()
-        data = resp.json()
-
-        embs = data.get("embeddings")
-        if embs is None:
-            single = data.get("embedding")
-            if single is not None:
-                embs = [single]
-            else:
-                raise ValueError(f"Unexpected Ollama embed response keys: {list(data.keys())}")
+# Shared backend (EMBEDDING_BACKEND=ollama|onnx); also used by the service endpoints
+embedding_backend = get_embedding_backend()
 
-        out: List[List[float]] = []
-        for e in embs:
-            if not e or len(e) != DIMS:
-                got = len(e) if e else 0
-                raise ValueError(f"Invalid embedding dims. Expected {DIMS}, got {got}")
-            out.append(e)
 
-        return out
-
-
-async def embed_text_to_vector(candidate: dict, source_text: str) -> Optional[List[float]]:
+async def embed_text_to_vector(candidate: dict, source_text: str, priority: str = PRIORITY_BATCH) -> Optional[List[float]]:
     """
     Your production embedding pipeline:
       - clean
       - extract signals
       - fallback to raw if too short
       - chunk
-      - /api/embed batch
-      - mean pool
+      - batch embed (embedding_backends)
+      - mean pool (priority: embedding scheduler class, PRIORITY_PROFILE from the service)
       - L2 normalize
     """
     cv_clean = clean_text_keep_unicode(source_text)
@@ -648,7 +623,7 @@ async def embed_text_to_vector(candidate: dict, source_text: str) -> Optional[Li
         return None
 
     inputs = build_chunk_inputs(candidate, chunks)
-    chunk_vectors = await ollama_embed_batch(inputs)
+    chunk_vectors = await embedding_backend.embed(inputs, priority=priority)
 
     pooled = mean_pool(chunk_vectors)
     pooled = l2_normalize(pooled)
@@ -747,7 +722,7 @@ def combine_for_tags(candidate_text_vector: str, wish_text_vector: str) -> str:
 
 async def enrich_candidates():
     print("📋 Candidate enrichment: profile_vector + wish_vector + category_tags")
-    print(f"   model={EMBEDDING_MODEL} dims={DIMS} embed_url={OLLAMA_EMBED_URL}")
+    print(f"   model={EMBEDDING_MODEL} dims={DIMS} backend={embedding_backend.name}")
     print(f"   batch_size={BATCH_SIZE} force_profile={FORCE_REBUILD_PROFILE} force_wish={FORCE_REBUILD_WISH} force_tags={FORCE_REBUILD_TAGS}")
 
     last_id = load_resume_cursor()
@@ -865,6 +840,10 @@ async def enrich_candidates():
                     print("ℹ️ Nothing to update.")
                     continue
 
+                if "profile_vector" in patch:
+                    # The service's candidate index refreshes on this column
+                    patch["vector_generation_completed_at"] = datetime.now(timezone.utc).isoformat()
+
                 supabase.table("candidate_profiles").update(patch).eq("id", cid).execute()
                 total_updated += 1
                 print(f"✅ Updated candidate {email}")
@@ -1,11 +1,39 @@
 # scripts/geocode_jobs.py
+"""
+Fills location_lat/location_lon for ads that JobTech sent without coordinates.
+
+Work is claimed in batches of GEOCODE_BATCH_SIZE (claim_geocode_jobs leases the rows, so
+two workers never take the same ad). Lookup order per ad:
+  1. Street address found in the description -> local OSM address index (optional, see
+     osm_address_index.py), else geocode_cache, else Nominatim.
+  2. City/municipality -> bundled gazetteer (se_gazetteer.json), no network.
+  3. Unknown place names -> geocode_cache, else Nominatim.
+
+Remote lookups are de-duplicated within a batch and run GEOCODE_CONCURRENCY at a time, with
+request starts spaced NOMINATIM_MIN_INTERVAL_SECONDS apart. Addresses that fail go to
+geocode_quarantine with a retry-after (short for HTTP errors, long for "not found"), and
+are not asked again until it passes. Ads nothing resolves become 'quarantined' with their
+own retry time, and 'failed' after GEOCODE_MAX_ATTEMPTS. Results for a whole batch are
+written with one apply_geocode_results call.
+"""
 import asyncio
+import json
 import os
 import re
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
 import httpx
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+try:
+    from scripts.osm_address_index import OsmAddressIndex, open_index
+except ModuleNotFoundError:
+    from osm_address_index import OsmAddressIndex, open_index
+
 if os.name == 'nt':
     try:
         import sys
@@ -18,64 +46,337 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 NOMINATIM_USER_AGENT = "JobbNuGeocoding/1.0 (info@jobbnu.se)"
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+NOMINATIM_MIN_INTERVAL_SECONDS = float(os.getenv("NOMINATIM_MIN_INTERVAL_SECONDS", "1.1"))
+GEOCODE_BATCH_SIZE = int(os.getenv("GEOCODE_BATCH_SIZE", "500"))
+GEOCODE_CONCURRENCY = int(os.getenv("GEOCODE_CONCURRENCY", "4"))
+GEOCODE_CLAIM_LEASE_SECONDS = int(os.getenv("GEOCODE_CLAIM_LEASE_SECONDS", "900"))
+GEOCODE_MAX_ATTEMPTS = int(os.getenv("GEOCODE_MAX_ATTEMPTS", "4"))
+GEOCODE_RETRY_ERROR_MINUTES = float(os.getenv("GEOCODE_RETRY_ERROR_MINUTES", "30"))
+GEOCODE_RETRY_NOT_FOUND_HOURS = float(os.getenv("GEOCODE_RETRY_NOT_FOUND_HOURS", "72"))
+GAZETTEER_PATH = Path(__file__).with_name("se_gazetteer.json")
+OSM_ADDRESS_INDEX_PATH = os.getenv("OSM_ADDRESS_INDEX_PATH", "")
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 STREET_PATTERN = re.compile(r"([A-ZÅÄÖ][a-zåäö]+(?:gatan|vägen|gränd| torg|plan))\s+(\d+[A-Z]?)", re.IGNORECASE)
+ASCII_FOLD = str.maketrans({"å": "a", "ä": "a", "ö": "o", "é": "e", "ü": "u"})
 
-async def fetch_coordinates(address: str, client: httpx.AsyncClient):
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {"q": address, "format": "json", "countrycodes": "se", "limit": 1}
-    try:
-        await asyncio.sleep(1.1) # Rate limit 1s
-        response = await client.get(url, params=params, headers={"User-Agent": NOMINATIM_USER_AGENT})
-        response.raise_for_status()
-        data = response.json()
+
+def normalize_place(value: str) -> str:
+    text = unicodedata.normalize("NFC", value or "").casefold()
+    text = re.sub(r"[-_/]", " ", text)
+    return re.sub(r"\s+", " ", text).strip(" ,.")
+
+
+def address_key(address: str) -> str:
+    return normalize_place(address)
+
+
+class Gazetteer:
+    """Municipality and locality centroids, looked up by normalized (and ASCII-folded) name."""
+
+    def __init__(self, path: Path = GAZETTEER_PATH):
+        with path.open(encoding="utf-8") as handle:
+            data = json.load(handle)
+        self.places: dict[str, dict] = {}
+        # Localities first so a municipality of the same name wins.
+        for entry in data.get("localities", []) + data.get("municipalities", []):
+            self._add(entry["name"], entry)
+        for alias, target in (data.get("aliases") or {}).items():
+            entry = self.places.get(normalize_place(target))
+            if entry:
+                self._add(alias, entry)
+
+    def _add(self, name: str, entry: dict) -> None:
+        key = normalize_place(name)
+        self.places[key] = entry
+        self.places.setdefault(key.translate(ASCII_FOLD), entry)
+
+    def lookup(self, city: str | None) -> dict | None:
+        key = normalize_place(city or "")
+        if not key:
+            return None
+        key = re.sub(r"\s+(kommun|stad|municipality)$", "", key)
+        candidates = [key, key.translate(ASCII_FOLD)]
+        if key.endswith("s"):
+            # "Stockholms kommun", "Göteborgs stad"
+            candidates += [key[:-1], key[:-1].translate(ASCII_FOLD)]
+        for candidate in candidates:
+            if candidate in self.places:
+                return self.places[candidate]
+        return None
+
+
+class NominatimGeocoder:
+    def __init__(self, client: httpx.AsyncClient, min_interval_s: float = NOMINATIM_MIN_INTERVAL_SECONDS):
+        self.client = client
+        self.min_interval_s = min_interval_s
+        self.requests = 0
+        self._last_request_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _wait_turn(self) -> None:
+        async with self._lock:
+            wait_s = self._last_request_at + self.min_interval_s - time.monotonic()
+            if wait_s > 0:
+                await asyncio.sleep(wait_s)
+            self._last_request_at = time.monotonic()
+
+    async def search(self, address: str) -> tuple[str, dict | None]:
+        """Returns ("ok", coords), ("not_found", None) or ("error", None)."""
+        params = {"q": address, "format": "json", "countrycodes": "se", "limit": 1}
+        await self._wait_turn()
+        self.requests += 1
+        try:
+            response = await self.client.get(NOMINATIM_URL, params=params, headers={"User-Agent": NOMINATIM_USER_AGENT})
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            print(f"   ⚠️ Geocoding error for '{address}': {e}")
+            return "error", None
         if data:
-            return {"lat": float(data[0]["lat"]), "lon": float(data[0]["lon"]), "display_name": data[0]["display_name"]}
+            return "ok", {"lat": float(data[0]["lat"]), "lon": float(data[0]["lon"]), "display_name": data[0]["display_name"]}
+        return "not_found", None
+
+
+
+def retry_delay(reason: str, attempts: int) -> timedelta:
+    """Doubles per attempt; "not found" waits much longer than a transient HTTP error."""
+    factor = 2 ** max(0, attempts - 1)
+    if reason == "not_found":
+        return timedelta(hours=GEOCODE_RETRY_NOT_FOUND_HOURS * factor)
+    return timedelta(minutes=GEOCODE_RETRY_ERROR_MINUTES * factor)
+
+
+def parse_timestamp(value: str | None) -> datetime | None:
+    if not value:
         return None
-    except Exception as e:
-        print(f"   ⚠️ Geocoding error for '{address}': {e}")
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+class AddressStore:
+    """
+    geocode_cache (found addresses) and geocode_quarantine (failed ones), read per batch and
+    written back in bulk by flush().
+    """
+
+    def __init__(self):
+        self.found: dict[str, dict] = {}
+        self.quarantine: dict[str, dict] = {}
+        self._loaded: set[str] = set()
+        self._new_cache_rows: dict[str, dict] = {}
+        self._new_quarantine_rows: dict[str, dict] = {}
+        self._released: set[str] = set()
+
+    def prefetch(self, keys: list[str]) -> None:
+        missing = sorted({k for k in keys if k and k not in self._loaded})
+        for i in range(0, len(missing), 100):
+            chunk = missing[i:i + 100]
+            cached = supabase.table("geocode_cache").select("address_key, found, lat, lon, display_name").in_("address_key", chunk).execute().data or []
+            for row in cached:
+                if row.get("found"):
+                    self.found[row["address_key"]] = row
+            quarantined = supabase.table("geocode_quarantine").select("address_key, attempts, last_error, retry_after").in_("address_key", chunk).execute().data or []
+            for row in quarantined:
+                row["retry_after"] = parse_timestamp(row.get("retry_after"))
+                self.quarantine[row["address_key"]] = row
+            self._loaded.update(chunk)
+
+    def lookup(self, key: str) -> tuple[str | None, dict | None]:
+        """("ok", coords), ("not_found" | "error", None) while quarantined, or (None, None) if unknown."""
+        row = self.found.get(key)
+        if row:
+            return "ok", {"lat": row["lat"], "lon": row["lon"], "display_name": row.get("display_name")}
+        held = self.quarantine.get(key)
+        if held and held.get("retry_after") and held["retry_after"] > datetime.now(timezone.utc):
+            return ("not_found" if held.get("last_error") == "not_found" else "error"), None
+        return None, None
+
+    def record(self, key: str, query: str, status: str, coords: dict | None) -> None:
+        if status == "ok" and coords:
+            row = {"address_key": key, "query": query, "found": True, "lat": coords["lat"], "lon": coords["lon"],
+                   "display_name": coords["display_name"], "source": "nominatim"}
+            self.found[key] = row
+            self._new_cache_rows[key] = row
+            if key in self.quarantine:
+                self._released.add(key)
+                self.quarantine.pop(key, None)
+            return
+        attempts = int((self.quarantine.get(key) or {}).get("attempts") or 0) + 1
+        retry_after = datetime.now(timezone.utc) + retry_delay(status, attempts)
+        self.quarantine[key] = {"address_key": key, "attempts": attempts, "last_error": status, "retry_after": retry_after}
+        self._new_quarantine_rows[key] = {
+            "address_key": key,
+            "query": query,
+            "attempts": attempts,
+            "last_error": status,
+            "retry_after": retry_after.isoformat(),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._released.discard(key)
+
+    async def resolve(self, queries: dict[str, str], geocoder: NominatimGeocoder) -> None:
+        """Looks up every key not already cached or quarantined, GEOCODE_CONCURRENCY at a time."""
+        self.prefetch(list(queries))
+        todo = {key: query for key, query in queries.items() if self.lookup(key)[0] is None}
+        if not todo:
+            return
+        semaphore = asyncio.Semaphore(max(1, GEOCODE_CONCURRENCY))
+
+        async def resolve_one(key: str, query: str) -> None:
+            async with semaphore:
+                status, coords = await geocoder.search(query)
+            self.record(key, query, status, coords)
+
+        await asyncio.gather(*(resolve_one(key, query) for key, query in todo.items()))
+
+    def flush(self) -> None:
+        if self._new_cache_rows:
+            supabase.table("geocode_cache").upsert(list(self._new_cache_rows.values()), on_conflict="address_key").execute()
+            self._new_cache_rows = {}
+        if self._new_quarantine_rows:
+            supabase.table("geocode_quarantine").upsert(list(self._new_quarantine_rows.values()), on_conflict="address_key").execute()
+            self._new_quarantine_rows = {}
+        if self._released:
+            supabase.table("geocode_quarantine").delete().in_("address_key", sorted(self._released)).execute()
+            self._released = set()
+
+
+def street_address(job: dict) -> str | None:
+    match = STREET_PATTERN.search(job.get("description_text") or "")
+    if not match:
         return None
+    city = job.get("city") or ""
+    return f"{match.group(0)}, {city}" if city else match.group(0)
+
+
+def resolved_result(job_id: str, lat: float, lon: float, location: str | None, source: str) -> dict:
+    return {
+        "id": job_id,
+        "location_lat": lat,
+        "location_lon": lon,
+        "location": location,
+        "geocode_status": "ok",
+        "geocode_source": source,
+        "geocode_attempts": None,
+        "geocode_retry_at": None,
+    }
+
+
+def unresolved_result(job: dict, reason: str) -> dict:
+    attempts = int(job.get("geocode_attempts") or 0) + 1
+    gave_up = attempts >= GEOCODE_MAX_ATTEMPTS
+    return {
+        "id": job["id"],
+        "location_lat": None,
+        "location_lon": None,
+        "location": None,
+        "geocode_status": "failed" if gave_up else "quarantined",
+        "geocode_source": None,
+        "geocode_attempts": attempts,
+        "geocode_retry_at": None if gave_up else (datetime.now(timezone.utc) + retry_delay(reason, attempts)).isoformat(),
+    }
+
+
+async def geocode_batch(
+    jobs: list[dict],
+    gazetteer: Gazetteer,
+    store: AddressStore,
+    geocoder: NominatimGeocoder,
+    osm_index: OsmAddressIndex | None = None,
+) -> list[dict]:
+    streets = {job["id"]: street_address(job) for job in jobs}
+
+    local_hits: dict[str, dict] = {}
+    if osm_index is not None:
+        for job in jobs:
+            address = streets[job["id"]]
+            if not address:
+                continue
+            place = gazetteer.lookup(job.get("city"))
+            hit = osm_index.lookup_address(address, near=(place["lat"], place["lon"]) if place else None)
+            if hit:
+                local_hits[job["id"]] = hit
+
+    await store.resolve(
+        {address_key(a): a for job_id, a in streets.items() if a and job_id not in local_hits}, geocoder
+    )
+
+    results: list[dict] = []
+    needs_remote_city: list[tuple[dict, str | None]] = []
+    for job in jobs:
+        city = job.get("city") or ""
+        address = streets[job["id"]]
+        street_status = None
+        if job["id"] in local_hits:
+            hit = local_hits[job["id"]]
+            results.append(resolved_result(job["id"], hit["lat"], hit["lon"], hit["display_name"], "osm_local"))
+            continue
+        if address:
+            street_status, coords = store.lookup(address_key(address))
+            if coords:
+                results.append(resolved_result(job["id"], coords["lat"], coords["lon"], coords.get("display_name") or address, "address"))
+                continue
+
+        place = gazetteer.lookup(city)
+        if place:
+            results.append(resolved_result(job["id"], place["lat"], place["lon"], city, "gazetteer"))
+            continue
+        needs_remote_city.append((job, street_status))
+
+    await store.resolve({address_key(job["city"]): job["city"] for job, _ in needs_remote_city if job.get("city")}, geocoder)
+    for job, street_status in needs_remote_city:
+        city_status, coords = store.lookup(address_key(job.get("city") or "")) if job.get("city") else (None, None)
+        if coords:
+            results.append(resolved_result(job["id"], coords["lat"], coords["lon"], coords.get("display_name") or job["city"], "nominatim_city"))
+            continue
+        reason = "error" if "error" in (street_status, city_status) else "not_found"
+        results.append(unresolved_result(job, reason))
+    return results
+
 
 async def geocode_new_jobs():
     print("🌍 Starting Geocoding Service...")
+    gazetteer = Gazetteer()
+    store = AddressStore()
+    osm_index = open_index(OSM_ADDRESS_INDEX_PATH)
+    if osm_index is not None:
+        print(f"🗺️ Using local OSM address index {OSM_ADDRESS_INDEX_PATH}")
+    counts = {"osm_local": 0, "address": 0, "gazetteer": 0, "nominatim_city": 0, "quarantined": 0, "failed": 0}
+    processed = 0
+    started = time.perf_counter()
+
     async with httpx.AsyncClient() as client:
+        geocoder = NominatimGeocoder(client)
         while True:
-            response = supabase.table("job_ads").select("id, headline, description_text, city").is_("location_lat", "null").neq("city", "null").limit(20).execute()
-            jobs = response.data
+            jobs = supabase.rpc(
+                "claim_geocode_jobs",
+                {"p_limit": GEOCODE_BATCH_SIZE, "p_lease_seconds": GEOCODE_CLAIM_LEASE_SECONDS},
+            ).execute().data or []
             if not jobs:
-                print("✅ All jobs geocoded.")
                 break
 
-            print(f"📍 Processing batch of {len(jobs)} jobs...")
-            for job in jobs:
-                job_id = job["id"]
-                city = job.get("city") or ""
-                desc = job.get("description_text") or ""
-                
-                final_location = city
-                coords = None
-
-                street_match = STREET_PATTERN.search(desc)
-                if street_match:
-                    full_address = f"{street_match.group(0)}, {city}"
-                    coords = await fetch_coordinates(full_address, client)
-                    if coords: final_location = coords["display_name"]
-
-                if not coords:
-                    coords = await fetch_coordinates(city, client)
-                    if coords: final_location = coords["display_name"]
-
-                update_data = {}
-                if coords:
-                    update_data = {"location_lat": coords["lat"], "location_lon": coords["lon"], "location": final_location}
-                    print(f"   ✅ Geocoded {job_id} -> {final_location[:30]}...")
-                else:
-                    print(f"   ❌ Failed {job_id}. Marking 0,0.")
-                    update_data = {"location_lat": 0, "location_lon": 0, "location": city}
-
-                # Update the job in database
-                supabase.table("job_ads").update(update_data).eq("id", job_id).execute()
+            batch_started = time.perf_counter()
+            results = await geocode_batch(jobs, gazetteer, store, geocoder, osm_index)
+            store.flush()
+            supabase.rpc("apply_geocode_results", {"p_results": results}).execute()
+
+            for result in results:
+                status = result["geocode_status"]
+                counts[result["geocode_source"] if status == "ok" else status] += 1
+            processed += len(results)
+            batch_s = time.perf_counter() - batch_started
+            print(
+                f"📍 Geocoded batch of {len(jobs)} in {batch_s:.1f}s "
+                f"({len(jobs) / max(batch_s, 1e-6) * 60:.0f} jobs/min, nominatim_requests={geocoder.requests})"
+            )
+
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"✅ All jobs geocoded. {processed} jobs in {elapsed:.1f}s ({rate:.0f} jobs/min) {counts} nominatim_requests={geocoder.requests}")
 
 if __name__ == "__main__":
     asyncio.run(geocode_new_jobs())
@@ -4,20 +4,41 @@ Layer 4: The Auditor - Automated Skill Gap Analysis
 Extracts required and preferred skills from job descriptions using llama3.2
 Stores results in skills_data JSONB column for frontend comparison
 
+SkillExtractor is the shared engine (the /extract-job-skills endpoint uses it too):
+- the deterministic extractor in skill_rules.py goes first; the LLM is only asked when its
+  coverage is low (SKILL_RULES_ENABLED=false sends everything to the LLM)
+- at most SKILL_EXTRACTION_CONCURRENCY requests in flight, matching OLLAMA_NUM_PARALLEL
+- SKILL_PROMPT_BATCH_SIZE > 1 packs that many ads into one prompt (answer keyed by ad id);
+  ads whose part of the answer fails validation are retried with a single-ad prompt
+- results cached in job_skill_cache by description hash, so reposted ads are free
+- pending ads are walked with keyset pagination and written back a page at a time
+
 Usage:
     python scripts/granite_skill_extractor.py          # Process jobs missing skills_data
     python scripts/granite_skill_extractor.py --all    # Process all jobs
+    python scripts/granite_skill_extractor.py --compare 40 --prompt-batch 4
+        # single-ad vs batched prompts on 40 pending ads (no writes): jobs/min, parse failures
 """
 
-import os
-import sys
+import argparse
+import asyncio
+import hashlib
 import json
+import os
+import threading
 import time
-import httpx
+from collections import OrderedDict
 from typing import Dict, List, Optional
+
+import httpx
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+try:
+    from scripts.skill_rules import extract_skills_by_rules
+except ModuleNotFoundError:
+    from skill_rules import extract_skills_by_rules
+
 load_dotenv()
 
 # Configuration
@@ -26,24 +47,39 @@ SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 OLLAMA_GENERATE_URL = os.getenv("OLLAMA_GENERATE_URL", "http://ollama:11434/api/generate")
 EXTRACTION_MODEL = os.getenv("EXTRACTION_MODEL", "llama3.2:3b")
 
-BATCH_SIZE = 50
-DELAY_BETWEEN_BATCHES = 2  # seconds
+# Requests beyond the server's parallel slots only queue inside Ollama, so match them.
+SKILL_EXTRACTION_CONCURRENCY = int(os.getenv("SKILL_EXTRACTION_CONCURRENCY") or os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+SKILL_EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("SKILL_EXTRACTION_TIMEOUT_SECONDS", "120"))
+PAGE_SIZE = int(os.getenv("SKILL_EXTRACTION_PAGE_SIZE", "200"))
+SKILL_PROMPT_BATCH_SIZE = int(os.getenv("SKILL_PROMPT_BATCH_SIZE", "1"))
+# Per-ad budget inside a batched prompt, and a context window large enough to hold the batch.
+BATCH_DESCRIPTION_CHARS = int(os.getenv("SKILL_BATCH_DESCRIPTION_CHARS", "1500"))
+BATCH_NUM_CTX = int(os.getenv("SKILL_BATCH_NUM_CTX", "8192"))
+# In-memory LRU in front of job_skill_cache (the durable cache); bounded for the long-running API.
+SKILL_CACHE_MAX_ENTRIES = int(os.getenv("SKILL_CACHE_MAX_ENTRIES", "2048"))
+SKILL_RULES_ENABLED = os.getenv("SKILL_RULES_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+MAX_DESCRIPTION_CHARS = 3000
+MIN_DESCRIPTION_CHARS = 50
+MAX_SKILLS = 15
+EMPTY_SKILLS = {"required_skills": [], "preferred_skills": []}
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 
-def extract_skills_with_llm(job_description: str) -> Optional[Dict]:
-    """
-    Layer 4: Extract skills using local LLM (llama3.2)
-    Returns: {"required_skills": [...], "preferred_skills": [...]}
-    """
-    if not job_description or len(job_description.strip()) < 50:
+def prepare_description(job_description: Optional[str]) -> Optional[str]:
+    text = (job_description or "").strip()
+    if len(text) < MIN_DESCRIPTION_CHARS:
         return None
-
     # Truncate very long descriptions
-    desc_text = job_description[:3000]
+    return text[:MAX_DESCRIPTION_CHARS]
+
+
+def description_hash(desc_text: str, model: str = EXTRACTION_MODEL) -> str:
+    return hashlib.sha256(f"{model}\n{desc_text}".encode("utf-8")).hexdigest()
+
 
-    prompt = f"""Extract two JSON lists from this Swedish job description:
+def build_prompt(desc_text: str) -> str:
+    return f"""Extract two JSON lists from this Swedish job description:
 1. 'required_skills' - Must-have requirements (Krav, Kvalifikationer)
 2. 'preferred_skills' - Nice-to-have requirements (Meriterande)
 
@@ -65,136 +101,415 @@ Job Description:
 
 Your response (JSON only):"""
 
-    try:
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(
-                OLLAMA_GENERATE_URL,
-                json={
-                    "model": EXTRACTION_MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "temperature": 0.2,
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            generated_text = data.get("response", "")
-
-            # Clean up response
-            cleaned = generated_text.strip()
-            if cleaned.startswith("```json"):
-                cleaned = cleaned[7:]
-            if cleaned.startswith("```"):
-                cleaned = cleaned[3:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
-            cleaned = cleaned.strip()
-
-            # Parse JSON
-            skills_data = json.loads(cleaned)
-
-            # Validate structure
-            if isinstance(skills_data, dict):
-                required = skills_data.get("required_skills", [])
-                preferred = skills_data.get("preferred_skills", [])
-
-                if not isinstance(required, list):
-                    required = []
-                if not isinstance(preferred, list):
-                    preferred = []
-
-                return {
-                    "required_skills": required[:15],  # Max 15 each
-                    "preferred_skills": preferred[:15]
-                }
-
-    except json.JSONDecodeError as e:
-        print(f"⚠️ Failed to parse JSON: {str(e)[:100]}")
+
+def build_batch_prompt(items: Dict[str, str]) -> str:
+    ads = "\n\n".join(f"### Ad {ad_id}\n{text[:BATCH_DESCRIPTION_CHARS]}" for ad_id, text in items.items())
+    example = ", ".join(f'"{ad_id}": {{"required_skills": [...], "preferred_skills": [...]}}' for ad_id in items)
+    return f"""Extract two JSON lists from EACH of the Swedish job descriptions below:
+1. 'required_skills' - Must-have requirements (Krav, Kvalifikationer)
+2. 'preferred_skills' - Nice-to-have requirements (Meriterande)
+
+Include:
+- Technical skills (programming languages, tools, software)
+- Certifications (B-körkort, PLC, etc.)
+- Experience requirements
+- Education requirements
+- Language requirements
+
+Treat every ad separately. Return ONLY one JSON object with one key per ad id, exactly:
+{{{example}}}
+
+{ads}
+
+Your response (JSON only):"""
+
+
+def strip_code_fence(generated_text: str) -> str:
+    # Clean up response
+    cleaned = (generated_text or "").strip()
+    if cleaned.startswith("```json"):
+        cleaned = cleaned[7:]
+    if cleaned.startswith("```"):
+        cleaned = cleaned[3:]
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-3]
+    return cleaned.strip()
+
+
+def validate_skills(skills_data) -> Optional[Dict]:
+    if not isinstance(skills_data, dict):
         return None
-    except Exception as e:
-        print(f"❌ Extraction error: {e}")
+    if "required_skills" not in skills_data and "preferred_skills" not in skills_data:
         return None
+    required = skills_data.get("required_skills", [])
+    preferred = skills_data.get("preferred_skills", [])
+    if not isinstance(required, list):
+        required = []
+    if not isinstance(preferred, list):
+        preferred = []
+    return {
+        "required_skills": [str(s) for s in required if isinstance(s, (str, int, float))][:MAX_SKILLS],
+        "preferred_skills": [str(s) for s in preferred if isinstance(s, (str, int, float))][:MAX_SKILLS],
+    }
 
-    return None
 
+def parse_skills_response(generated_text: str) -> Optional[Dict]:
+    return validate_skills(json.loads(strip_code_fence(generated_text)))
 
-def process_jobs(process_all: bool = False):
-    """
-    Process jobs and extract skills using Layer 4
-    """
-    print("🚀 Layer 4: Automated Skill Gap Analysis")
-    print(f"Mode: {'Process all jobs' if process_all else 'Process jobs missing skills_data'}")
 
-    # Fetch jobs to process
-    query = supabase.table("job_ads").select("id, description, title")
+def parse_batch_response(generated_text: str, ad_ids: List[str]) -> Dict[str, Optional[Dict]]:
+    """{ad_id: skills or None}; a broken answer invalidates every ad in the batch."""
+    try:
+        data = json.loads(strip_code_fence(generated_text))
+    except json.JSONDecodeError:
+        return {ad_id: None for ad_id in ad_ids}
+    if not isinstance(data, dict):
+        return {ad_id: None for ad_id in ad_ids}
+    return {ad_id: validate_skills(data.get(ad_id)) for ad_id in ad_ids}
+
+
+class SkillExtractor:
+    """One per event loop; shares the HTTP pool, the concurrency limit and the (LRU) result cache."""
+
+    def __init__(
+        self,
+        model: str = EXTRACTION_MODEL,
+        concurrency: int = SKILL_EXTRACTION_CONCURRENCY,
+        prompt_batch_size: int = SKILL_PROMPT_BATCH_SIZE,
+        cache_max_entries: int = SKILL_CACHE_MAX_ENTRIES,
+    ):
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.prompt_batch_size = max(1, prompt_batch_size)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.cache: OrderedDict[str, Dict] = OrderedDict()
+        self.cache_max_entries = max(1, cache_max_entries)
+        # extract() reads and writes the cache from worker threads (asyncio.to_thread)
+        self._cache_lock = threading.Lock()
+        self.stats = {
+            "rule_hits": 0, "cache_hits": 0, "llm_calls": 0, "llm_items": 0, "failures": 0,
+            "batch_items": 0, "batch_parse_failures": 0,
+        }
+
+    def llm_avoidance_rate(self) -> float:
+        """Share of extractions answered by the rules or the cache instead of the LLM."""
+        avoided = self.stats["rule_hits"] + self.stats["cache_hits"]
+        total = avoided + self.stats["llm_items"]
+        return avoided / total if total else 0.0
+
+    def batch_parse_failure_rate(self) -> float:
+        return self.stats["batch_parse_failures"] / self.stats["batch_items"] if self.stats["batch_items"] else 0.0
+
+    def _rules(self, job_description: Optional[str], source_snapshot=None) -> tuple[Optional[Dict], bool]:
+        if not SKILL_RULES_ENABLED:
+            return None, False
+        skills_data, info = extract_skills_by_rules(job_description, source_snapshot)
+        found = bool(skills_data["required_skills"] or skills_data["preferred_skills"])
+        return (skills_data if found else None), info["confident"]
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self._client = httpx.AsyncClient(timeout=SKILL_EXTRACTION_TIMEOUT_SECONDS, limits=limits)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _remember(self, entries: Dict[str, Dict]) -> None:
+        with self._cache_lock:
+            for key, data in entries.items():
+                self.cache[key] = data
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_max_entries:
+                self.cache.popitem(last=False)
+
+    def prefetch_cache(self, hashes: List[str]) -> Dict[str, Dict]:
+        """Cached results for hashes, from memory or job_skill_cache (one query per 100 misses)."""
+        found: Dict[str, Dict] = {}
+        with self._cache_lock:
+            for h in hashes:
+                if h in self.cache:
+                    self.cache.move_to_end(h)
+                    found[h] = self.cache[h]
+        missing = sorted({h for h in hashes if h not in found})
+        for i in range(0, len(missing), 100):
+            rows = (
+                supabase.table("job_skill_cache")
+                .select("description_hash, skills_data")
+                .in_("description_hash", missing[i:i + 100])
+                .execute()
+            ).data or []
+            for row in rows:
+                found[row["description_hash"]] = row["skills_data"]
+        self._remember({h: found[h] for h in missing if h in found})
+        return found
+
+    def store_cache(self, entries: Dict[str, Dict]) -> None:
+        if not entries:
+            return
+        rows = [{"description_hash": h, "model": self.model, "skills_data": data} for h, data in entries.items()]
+        try:
+            supabase.table("job_skill_cache").upsert(rows, on_conflict="description_hash").execute()
+        except Exception as e:
+            print(f"⚠️ Could not store {len(rows)} skill cache rows: {e}")
+        self._remember(entries)
+
+    async def _post(self, payload: Dict) -> Optional[str]:
+        client = self._ensure_client()
+        async with self._semaphore:
+            self.stats["llm_calls"] += 1
+            try:
+                response = await client.post(OLLAMA_GENERATE_URL, json={"model": self.model, "stream": False, **payload})
+                response.raise_for_status()
+                return response.json().get("response", "")
+            except Exception as e:
+                print(f"❌ Extraction error: {e}")
+                return None
+
+    async def _generate(self, desc_text: str) -> Optional[Dict]:
+        self.stats["llm_items"] += 1
+        generated = await self._post({"prompt": build_prompt(desc_text), "options": {"temperature": 0.2}})
+        if generated is not None:
+            try:
+                result = parse_skills_response(generated)
+                if result is not None:
+                    return result
+            except json.JSONDecodeError as e:
+                print(f"⚠️ Failed to parse JSON: {str(e)[:100]}")
+        self.stats["failures"] += 1
+        return None
 
-    if not process_all:
-        # Only process jobs where skills_data is empty or null
-        query = query.or_("skills_data.is.null,skills_data.eq.{}")
+    async def _generate_batch(self, texts: List[str]) -> List[Optional[Dict]]:
+        """One prompt for several ads; items that fail validation get a single-ad retry."""
+        if len(texts) == 1:
+            return [await self._generate(texts[0])]
+        ad_ids = [f"a{i + 1}" for i in range(len(texts))]
+        self.stats["llm_items"] += len(texts)
+        self.stats["batch_items"] += len(texts)
+        generated = await self._post({
+            "prompt": build_batch_prompt(dict(zip(ad_ids, texts))),
+            "format": "json",
+            "options": {"temperature": 0.2, "num_ctx": BATCH_NUM_CTX},
+        })
+        parsed = parse_batch_response(generated, ad_ids) if generated is not None else {ad_id: None for ad_id in ad_ids}
+
+        results: List[Optional[Dict]] = [parsed[ad_id] for ad_id in ad_ids]
+        retry = [i for i, result in enumerate(results) if result is None]
+        if retry:
+            self.stats["batch_parse_failures"] += len(retry)
+            # The retried ads were already counted once in llm_items.
+            self.stats["llm_items"] -= len(retry)
+            for i, result in zip(retry, await asyncio.gather(*(self._generate(texts[i]) for i in retry))):
+                results[i] = result
+        return results
+
+    async def _generate_many(self, texts: List[str]) -> List[Optional[Dict]]:
+        if self.prompt_batch_size <= 1:
+            return list(await asyncio.gather(*(self._generate(text) for text in texts)))
+        chunks = [texts[i:i + self.prompt_batch_size] for i in range(0, len(texts), self.prompt_batch_size)]
+        results = await asyncio.gather(*(self._generate_batch(chunk) for chunk in chunks))
+        return [result for chunk_results in results for result in chunk_results]
+
+    async def extract(self, job_description: Optional[str], source_snapshot=None) -> Optional[Dict]:
+        """Skills for one description: rules, then cache, then Ollama."""
+        rule_result, confident = self._rules(job_description, source_snapshot)
+        if confident:
+            self.stats["rule_hits"] += 1
+            return rule_result
+        desc_text = prepare_description(job_description)
+        if desc_text is None:
+            return rule_result
+        key = description_hash(desc_text, self.model)
+        # Off the event loop: the service calls this from its /extract-job-skills handler
+        cached = await asyncio.to_thread(self.prefetch_cache, [key])
+        if key in cached:
+            self.stats["cache_hits"] += 1
+            return cached[key]
+        result = await self._generate(desc_text)
+        if result is not None:
+            await asyncio.to_thread(self.store_cache, {key: result})
+        return result if result is not None else rule_result
+
+    async def extract_many(self, jobs: List[Dict]) -> Dict[str, Optional[Dict]]:
+        """
+        job_ads rows (id, description_text, source_snapshot) -> {job_id: skills_data or None}.
+        Rule-confident ads never reach the LLM; for the rest the cache is read in one query,
+        identical descriptions are sent once and new results are cached in one upsert.
+        None means the LLM failed; unlike extract(), there is no rule fallback so the
+        batch job retries the ad on its next run.
+        """
+        out: Dict[str, Optional[Dict]] = {}
+        rule_fallback: Dict[str, Optional[Dict]] = {}
+        prepared: Dict[str, Optional[str]] = {}
+        for job in jobs:
+            rule_result, confident = self._rules(job.get("description_text"), job.get("source_snapshot"))
+            if confident:
+                self.stats["rule_hits"] += 1
+                out[job["id"]] = rule_result
+                continue
+            rule_fallback[job["id"]] = rule_result
+            prepared[job["id"]] = prepare_description(job.get("description_text"))
 
-    query = query.eq("removed", False).limit(1000)
+        keys = {job_id: description_hash(text, self.model) for job_id, text in prepared.items() if text}
+        # Kept locally for the page: the LRU may evict entries while a large page is processed.
+        found = self.prefetch_cache(list(keys.values()))
 
-    result = query.execute()
-    jobs = result.data
+        to_generate: Dict[str, str] = {}
+        for job_id, key in keys.items():
+            if key in found or key in to_generate:
+                self.stats["cache_hits"] += 1
+            else:
+                to_generate[key] = prepared[job_id]
 
-    if not jobs:
-        print("✅ No jobs to process")
-        return
+        generated = await self._generate_many(list(to_generate.values()))
+        new_results = {key: result for key, result in zip(to_generate, generated) if result is not None}
+        self.store_cache(new_results)
+        found.update(new_results)
 
-    total = len(jobs)
-    print(f"📊 Found {total} jobs to process")
+        for job_id, text in prepared.items():
+            if not text:
+                # Too short for the LLM; keep what the rules found, if anything.
+                out[job_id] = rule_fallback[job_id] or EMPTY_SKILLS
+                continue
+            # A failed LLM call leaves the ad pending (None) instead of saving the thin rule
+            # result, which would take it out of the skills_data-is-empty filter for good.
+            out[job_id] = found.get(keys[job_id])
+        return out
 
-    processed = 0
-    failed = 0
-    skipped = 0
 
-    for i in range(0, total, BATCH_SIZE):
-        batch = jobs[i:i + BATCH_SIZE]
-        print(f"\n📦 Processing batch {i // BATCH_SIZE + 1} ({i + 1}-{min(i + BATCH_SIZE, total)} of {total})")
+def save_skills(rows: List[Dict]) -> int:
+    if not rows:
+        return 0
+    return int(supabase.rpc("apply_job_skills", {"p_rows": rows}).execute().data or 0)
 
-        for job in batch:
-            job_id = job["id"]
-            description = job.get("description", "")
-            title = job.get("title", "Unknown")
 
-            if not description or len(description.strip()) < 50:
-                print(f"⏭️ Skipping job {job_id} (no description)")
-                skipped += 1
-                continue
+async def process_jobs_async(
+    process_all: bool = False, limit: Optional[int] = None, prompt_batch_size: int = SKILL_PROMPT_BATCH_SIZE
+) -> Dict[str, int]:
+    """
+    Process jobs and extract skills using Layer 4
+    """
+    print("🚀 Layer 4: Automated Skill Gap Analysis")
+    print(f"Mode: {'Process all jobs' if process_all else 'Process jobs missing skills_data'} "
+          f"(concurrency={SKILL_EXTRACTION_CONCURRENCY}, prompt_batch={prompt_batch_size})")
 
-            # Extract skills
-            skills_data = extract_skills_with_llm(description)
+    extractor = SkillExtractor(prompt_batch_size=prompt_batch_size)
+    counts = {"processed": 0, "failed": 0, "skipped": 0}
+    last_id = ""
+    seen = 0
+    started = time.perf_counter()
 
-            if skills_data:
-                # Save to database
-                try:
-                    supabase.table("job_ads").update({
-                        "skills_data": skills_data
-                    }).eq("id", job_id).execute()
+    try:
+        while limit is None or seen < limit:
+            page_size = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - seen)
+            query = supabase.table("job_ads").select("id, headline, description_text, source_snapshot").eq("is_active", True)
+            if not process_all:
+                # Only process jobs where skills_data is empty or null
+                query = query.or_("skills_data.is.null,skills_data.eq.{}")
+            # Keyset pagination: ads that fail stay pending for the next run without being re-read now.
+            jobs = query.gt("id", last_id).order("id").limit(page_size).execute().data or []
+            if not jobs:
+                break
+            last_id = jobs[-1]["id"]
+            seen += len(jobs)
+
+            results = await extractor.extract_many(jobs)
+            rows = []
+            for job in jobs:
+                skills_data = results.get(job["id"])
+                if skills_data is None:
+                    counts["failed"] += 1
+                    continue
+                if skills_data is EMPTY_SKILLS:
+                    # Too short to extract from; stored as empty lists so it is not rescanned.
+                    counts["skipped"] += 1
+                else:
+                    counts["processed"] += 1
+                rows.append({"id": job["id"], "skills_data": skills_data})
+
+            try:
+                save_skills(rows)
+            except Exception as e:
+                print(f"❌ Failed to save {len(rows)} jobs: {e}")
+                counts["failed"] += len(rows)
+
+            elapsed = time.perf_counter() - started
+            print(
+                f"📦 {seen} jobs scanned ({seen / max(elapsed, 1e-6) * 60:.0f}/min) "
+                f"rule_hits={extractor.stats['rule_hits']} cache_hits={extractor.stats['cache_hits']} "
+                f"llm_calls={extractor.stats['llm_calls']} llm_avoided={extractor.llm_avoidance_rate():.0%}"
+            )
+    finally:
+        await extractor.close()
 
-                    processed += 1
-                    req_count = len(skills_data.get("required_skills", []))
-                    pref_count = len(skills_data.get("preferred_skills", []))
-                    print(f"✅ Job {job_id}: {title[:50]} - Req: {req_count}, Pref: {pref_count}")
+    print(f"\n🏁 Complete! Processed: {counts['processed']}, Failed: {counts['failed']}, Skipped: {counts['skipped']} "
+          f"(rule_hits={extractor.stats['rule_hits']}, cache_hits={extractor.stats['cache_hits']}, "
+          f"llm_calls={extractor.stats['llm_calls']}, llm_avoided={extractor.llm_avoidance_rate():.0%}, "
+          f"batch_parse_failures={extractor.batch_parse_failure_rate():.0%})")
+    return counts
 
-                except Exception as e:
-                    print(f"❌ Failed to save job {job_id}: {e}")
-                    failed += 1
-            else:
-                print(f"⚠️ Failed to extract skills for job {job_id}")
-                failed += 1
 
-            # Small delay to avoid overwhelming Ollama
-            time.sleep(0.1)
+def process_jobs(
+    process_all: bool = False, limit: Optional[int] = None, prompt_batch_size: int = SKILL_PROMPT_BATCH_SIZE
+) -> Dict[str, int]:
+    return asyncio.run(process_jobs_async(process_all, limit, prompt_batch_size))
 
-        # Delay between batches
-        if i + BATCH_SIZE < total:
-            print(f"⏸️ Sleeping {DELAY_BETWEEN_BATCHES}s between batches...")
-            time.sleep(DELAY_BETWEEN_BATCHES)
 
-    print(f"\n🏁 Complete! Processed: {processed}, Failed: {failed}, Skipped: {skipped}")
+async def compare_prompt_modes(sample_size: int, prompt_batch_size: int) -> Dict[str, Dict]:
+    """
+    Runs the same pending ads through single-ad and batched prompts (LLM only: no rules,
+    no cache, no writes) and reports jobs/min and parse-failure rate for each.
+    """
+    jobs = (
+        supabase.table("job_ads")
+        .select("id, description_text")
+        .eq("is_active", True)
+        .or_("skills_data.is.null,skills_data.eq.{}")
+        .order("id")
+        .limit(sample_size)
+        .execute()
+    ).data or []
+    texts = [t for t in (prepare_description(job.get("description_text")) for job in jobs) if t]
+    if not texts:
+        print("✅ No pending ads to sample")
+        return {}
+
+    report: Dict[str, Dict] = {}
+    for label, batch_size in (("single", 1), (f"batch_{prompt_batch_size}", prompt_batch_size)):
+        extractor = SkillExtractor(prompt_batch_size=batch_size)
+        started = time.perf_counter()
+        try:
+            results = await extractor._generate_many(texts)
+        finally:
+            await extractor.close()
+        elapsed = time.perf_counter() - started
+        # Batched mode: ads whose part of the shared answer was unusable (before the single-ad retry).
+        failures = extractor.stats["batch_parse_failures"] if batch_size > 1 else extractor.stats["failures"]
+        report[label] = {
+            "ads": len(texts),
+            "llm_calls": extractor.stats["llm_calls"],
+            "jobs_per_min": round(len(texts) / elapsed * 60, 1) if elapsed > 0 else None,
+            "parse_failure_rate": round(failures / len(texts), 3),
+            "unresolved": sum(1 for r in results if r is None),
+        }
+        print(f"📊 {label}: {report[label]}")
+    return report
 
 
 if __name__ == "__main__":
-    process_all = "--all" in sys.argv
-    process_jobs(process_all)
+    parser = argparse.ArgumentParser(description="Extract required/preferred skills from job ads.")
+    parser.add_argument("--all", action="store_true", help="Process all active jobs, not only those missing skills_data")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many jobs")
+    parser.add_argument("--prompt-batch", type=int, default=SKILL_PROMPT_BATCH_SIZE, help="Ads per LLM prompt")
+    parser.add_argument("--compare", type=int, default=0, metavar="N",
+                        help="Compare single-ad and batched prompts on N pending ads without writing")
+    args = parser.parse_args()
+    if args.compare:
+        asyncio.run(compare_prompt_modes(args.compare, max(2, args.prompt_batch)))
+    else:
+        process_jobs(args.all, args.limit, args.prompt_batch)
@@ -1,15 +1,25 @@
 # scripts/initial_load.py
+import argparse
+import asyncio
 import os
 import sys
 import json
-import requests
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+try:
+    from scripts.job_ingest import build_job_row, upsert_job_rows
+    from scripts.jobtech_client import JobTechClient, TokenBucket, get_client
+    from scripts.jobtech_search import SearchPaginator, parse_time
+except ModuleNotFoundError:
+    from job_ingest import build_job_row, upsert_job_rows
+    from jobtech_client import JobTechClient, TokenBucket, get_client
+    from jobtech_search import SearchPaginator, parse_time
+
 if sys.platform == "win32":
     try:
         sys.stdout.reconfigure(encoding="utf-8")
@@ -20,213 +30,232 @@ load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-JOBTECH_API_KEY = os.getenv("JOBTECH_API_KEY")
-
-API_BASE_URL = "https://jobsearch.api.jobtechdev.se"
-SEARCH_ENDPOINT = f"{API_BASE_URL}/search"
 
 DAYS_TO_FETCH = int(os.getenv("DAYS_TO_FETCH", "120"))
-BATCH_SIZE = int(os.getenv("BATCH_SIZE", "100"))
-REQUEST_DELAY = float(os.getenv("REQUEST_DELAY", "0.2"))
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "8"))
+BACKFILL_REQUESTS_PER_SECOND = float(os.getenv("BACKFILL_REQUESTS_PER_SECOND", "8"))
+BACKFILL_UPSERT_BATCH_SIZE = int(os.getenv("BACKFILL_UPSERT_BATCH_SIZE", "1000"))
 
 SCRIPT_DIR = Path(__file__).resolve().parent
-REPO_ROOT = SCRIPT_DIR.parent
-CATEGORY_MAP_PATH = REPO_ROOT / "config" / "category_map.json"
-
+STATE_FILE = SCRIPT_DIR / "initial_load_state.json"
 if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
     print("❌ Missing Supabase env vars. Aborting.")
     raise SystemExit(1)
 
-if not CATEGORY_MAP_PATH.exists():
-    raise SystemExit(f"❌ Missing category map file: {CATEGORY_MAP_PATH}")
-
-CATEGORY_MAP = json.loads(CATEGORY_MAP_PATH.read_text(encoding="utf-8"))
-
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 
-def compute_category_tags(field: str, group: str, role: str) -> list[str]:
-    field_l = (field or "").lower()
-    group_l = (group or "").lower()
-    role_l = (role or "").lower()
-
-    tags: list[str] = []
-    for tag, rules in CATEGORY_MAP.items():
-        fields = [x.lower() for x in rules.get("fields", [])]
-        groups = [x.lower() for x in rules.get("groups", [])]
-        role_contains = [x.lower() for x in rules.get("roles_contains", [])]
+def fetch_jobs_for_time_range(pub_after: str, pub_before: str):
+    try:
+        return SearchPaginator(base_params={"sort": "pubdate-desc"}).fetch_all(
+            parse_time(pub_after), parse_time(pub_before)
+        )
+    except Exception as e:
+        print(f" ❌ API error: {e}")
+        return []
 
-        hit = False
-        if fields and any(f in field_l for f in fields):
-            hit = True
-        if groups and any(g in group_l for g in groups):
-            hit = True
-        if role_contains and any(rc in role_l for rc in role_contains):
-            hit = True
 
-        if hit:
-            tags.append(tag)
+def fetch_jobs_for_date(date_string: str):
+    # One window per day; the paginator splits busy days itself instead of fixed 4h chunks.
+    print(f"   📅 Processing {date_string}")
+    all_hits = fetch_jobs_for_time_range(f"{date_string}T00:00:00", f"{date_string}T23:59:59")
+    print(f"      -> {len(all_hits)} jobs.")
+    return all_hits
 
-    return sorted(set(tags))
 
+def upsert_jobs(jobs):
+    if not jobs:
+        return 0
 
-def fetch_jobs_for_time_range(pub_after: str, pub_before: str):
-    hits_for_chunk = []
-    offset = 0
-    headers = {"api-key": JOBTECH_API_KEY} if JOBTECH_API_KEY else {}
+    seen_at = datetime.now(timezone.utc).isoformat()
+    try:
+        counts = upsert_job_rows(supabase, [build_job_row(job, seen_at=seen_at) for job in jobs], seen_at=seen_at)
+    except Exception as e:
+        print(f"      ❌ DB error: {e}")
+        return 0
 
-    while True:
-        params = {
-            "published-after": pub_after,
-            "published-before": pub_before,
-            "limit": BATCH_SIZE,
-            "offset": offset,
-            "sort": "pubdate-desc",
-        }
+    print(f"      💾 {counts}")
+    return sum(counts[key] for key in ("new", "changed", "unchanged"))
 
-        try:
-            response = requests.get(SEARCH_ENDPOINT, params=params, headers=headers, timeout=30)
-            if response.status_code == 429:
-                print(" ⏳ Rate limit! Waiting 5s...")
-                time.sleep(5)
-                continue
 
-            response.raise_for_status()
-            data = response.json()
-            hits = data.get("hits", [])
+def run_full_load(days: int = DAYS_TO_FETCH):
+    print(f"🚀 Full load: last {days} days")
+    total_jobs = 0
+    start_date = datetime.now() - timedelta(days=days)
 
-            if not hits:
-                break
+    for i in range(days + 1):
+        date_string = (start_date + timedelta(days=i)).strftime("%Y-%m-%d")
+        jobs = fetch_jobs_for_date(date_string)
+        total_jobs += upsert_jobs(jobs)
 
-            hits_for_chunk.extend(hits)
-            offset += BATCH_SIZE
+    print(f"✅ Full load finished. Upserted {total_jobs} jobs.")
 
-            if len(hits) < BATCH_SIZE:
-                break
 
-            if offset >= 2000:
-                print(f" (⚠️ Max offset reached for interval {pub_after})", end="")
-                break
+# ---------------------------------------------------------------------------
+# Backfill mode: concurrent day windows, one writer, resumable per day
+# ---------------------------------------------------------------------------
 
-            time.sleep(REQUEST_DELAY)
+def load_state() -> dict:
+    if not STATE_FILE.exists():
+        return {}
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
 
-        except Exception as e:
-            print(f" ❌ API error: {e}")
-            break
 
-    return hits_for_chunk
+def save_state(state: dict) -> None:
+    state["updated_at"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    STATE_FILE.write_text(json.dumps(state, ensure_ascii=True, indent=2), encoding="utf-8")
 
 
-def fetch_jobs_for_date(date_string: str):
-    all_hits = []
-    time_chunks = [
-        ("00:00:00", "03:59:59"),
-        ("04:00:00", "07:59:59"),
-        ("08:00:00", "11:59:59"),
-        ("12:00:00", "15:59:59"),
-        ("16:00:00", "19:59:59"),
-        ("20:00:00", "23:59:59"),
-    ]
-
-    print(f"   📅 Processing {date_string} ", end="", flush=True)
-
-    for start_time, end_time in time_chunks:
-        pub_after = f"{date_string}T{start_time}"
-        pub_before = f"{date_string}T{end_time}"
-        chunk_hits = fetch_jobs_for_time_range(pub_after, pub_before)
-        all_hits.extend(chunk_hits)
-        print(".", end="", flush=True)
-
-    print(f" -> {len(all_hits)} jobs.")
-    return all_hits
+def build_load_rows(hits: list[dict]) -> list[dict]:
+    # A day window can return the same ad twice across split points; one row per id keeps
+    # the bulk upsert from touching a row twice in one statement.
+    seen_at = datetime.now(timezone.utc).isoformat()
+    return list({row["id"]: row for row in (build_job_row(hit, seen_at=seen_at) for hit in hits)}.values())
 
 
-def upsert_jobs(jobs):
-    if not jobs:
-        return 0
+def upsert_load_rows(rows: list[dict]) -> dict:
+    return upsert_job_rows(supabase, rows, batch_size=BACKFILL_UPSERT_BATCH_SIZE)
 
-    batch_size = 100
-    upserted_count = 0
-
-    for i in range(0, len(jobs), batch_size):
-        batch = jobs[i : i + batch_size]
-        job_data_batch = []
-
-        for job in batch:
-            workplace = job.get("workplace_address") or {}
-            occupation = job.get("occupation") or {}
-            occupation_group = job.get("occupation_group") or {}
-            occupation_field = job.get("occupation_field") or {}
-            description = job.get("description") or {}
-
-            # Coordinates may be [lon, lat]
-            lat = None
-            lon = None
-            coords = workplace.get("coordinates")
-            if isinstance(coords, list) and len(coords) == 2:
-                lon, lat = coords[0], coords[1]
-
-            role_label = occupation.get("label") or ""
-            field_label = occupation_field.get("label") or ""
-            group_label = occupation_group.get("label") or ""
-
-            category_tags = compute_category_tags(field_label, group_label, role_label)
-
-            job_data = {
-                "id": str(job.get("id")),
-                "headline": job.get("headline"),
-                "description_text": description.get("text"),
-                "city": workplace.get("municipality"),
-                "location": workplace.get("municipality"),
-                "published_date": job.get("publication_date"),
-                "application_deadline": job.get("application_deadline"),
-                "webpage_url": job.get("webpage_url"),
-                "job_category": role_label,
-                "requires_dl_b": job.get("driving_license_required", False),
-                "location_lat": lat,
-                "location_lon": lon,
-
-                # Taxonomy fields
-                "occupation_field_label": occupation_field.get("label"),
-                "occupation_field_concept_id": occupation_field.get("concept_id"),
-                "occupation_field_legacy_ams_taxonomy_id": occupation_field.get("legacy_ams_taxonomy_id"),
-
-                "occupation_group_label": occupation_group.get("label"),
-                "occupation_group_concept_id": occupation_group.get("concept_id"),
-                "occupation_group_legacy_ams_taxonomy_id": occupation_group.get("legacy_ams_taxonomy_id"),
-
-                "occupation_label": occupation.get("label"),
-                "occupation_concept_id": occupation.get("concept_id"),
-                "occupation_legacy_ams_taxonomy_id": occupation.get("legacy_ams_taxonomy_id"),
-
-                # Control layer
-                "category_tags": category_tags,
-
-                # ✅ FORCE re-enrichment (keeps your pipeline behavior)
-                "embedding": None,
-                "embedding_text": None,
-                "embedding_error": None,
-                "embedding_updated_at": None,
-                "parse_debug": None,
-
-                # ✅ store the full payload ONCE (you had this twice before)
-                "source_snapshot": job,
-            }
-
-            job_data_batch.append(job_data)
 
+async def fetch_worker(
+    window_queue: asyncio.Queue,
+    write_queue: asyncio.Queue,
+    client: JobTechClient,
+    stats: dict,
+) -> None:
+    while True:
+        date_string = await window_queue.get()
         try:
-            supabase.table("job_ads").upsert(job_data_batch, on_conflict="id").execute()
-            upserted_count += len(job_data_batch)
+            # The shared paginator splits busy days and retries 5xx/429 like every other caller.
+            paginator = SearchPaginator(base_params={"sort": "pubdate-desc"}, client=client)
+            hits = await asyncio.to_thread(
+                paginator.fetch_all, parse_time(f"{date_string}T00:00:00"), parse_time(f"{date_string}T23:59:59")
+            )
+            stats["requests"] += paginator.request_count
+            stats["splits"] += paginator.split_count
+            await write_queue.put((date_string, hits))
         except Exception as e:
-            print(f"      ❌ DB error: {e}")
-
-    return upserted_count
-
+            stats["failed_windows"] += 1
+            print(f"   ❌ {date_string}: {e}")
+        finally:
+            window_queue.task_done()
+
+
+async def write_worker(write_queue: asyncio.Queue, state: dict, stats: dict) -> None:
+    """
+    Transforms and upserts off the fetch loop. A day is only marked complete once all of
+    its rows have been written, so an interrupted run resumes with the unwritten days.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    buffer: list[dict] = []
+    buffered_days: dict[str, int] = {}
+
+    async def flush() -> None:
+        if buffer:
+            try:
+                counts = await asyncio.to_thread(upsert_load_rows, list({row["id"]: row for row in buffer}.values()))
+                stats["rows"] += len(buffer)
+                for key, value in counts.items():
+                    stats[key] = stats.get(key, 0) + value
+            except Exception as e:
+                stats["failed_windows"] += len(buffered_days)
+                print(f"   ❌ DB error, {len(buffered_days)} day(s) left for the next run: {e}")
+                buffer.clear()
+                buffered_days.clear()
+                return
+        for date_string, count in buffered_days.items():
+            # Today is still receiving ads, so it is never recorded as done.
+            if date_string < today:
+                state["completed_windows"][date_string] = count
+        save_state(state)
+        buffer.clear()
+        buffered_days.clear()
 
-def run_full_load():
-    print(f"🚀 Full load: last {DAYS_TO_FETCH} days")
-    total_jobs = 0
-    start_date = datetime.now() - timedelta(days=DAYS_TO_FETCH)
+    while True:
+        item = await write_queue.get()
+        try:
+            if item is None:
+                await flush()
+                return
+            date_string, hits = item
+            rows = await asyncio.to_thread(build_load_rows, hits)
+            buffer.extend(rows)
+            buffered_days[date_string] = len(rows)
+            if len(buffer) >= BACKFILL_UPSERT_BATCH_SIZE:
+                await flush()
+        finally:
+            write_queue.task_done()
+
+
+async def run_backfill(
+    days: int = DAYS_TO_FETCH,
+    workers: int = BACKFILL_WORKERS,
+    requests_per_second: float = BACKFILL_REQUESTS_PER_SECOND,
+    reset_state: bool = False,
+) -> dict:
+    state = {} if reset_state else load_state()
+    completed = state.setdefault("completed_windows", {})
+
+    start_date = datetime.now() - timedelta(days=days)
+    dates = [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days + 1)]
+    todo = [d for d in dates if d not in completed]
+    print(f"🚀 Backfill: {len(todo)}/{len(dates)} day windows to fetch ({workers} workers, {requests_per_second} req/s)")
+
+    stats = {"requests": 0, "throttled": 0, "splits": 0, "rows": 0, "failed_windows": 0}
+    started = time.perf_counter()
+
+    # Own bucket so --rps applies to this run; the daily jobs use the shared client's budget.
+    # Latency/429 counters still go to the shared client's stats.
+    shared = get_client()
+    client = JobTechClient(TokenBucket(requests_per_second, burst=workers), endpoint_stats=shared.endpoint_stats)
+    throttled_before = shared.stats().get("search", {}).get("throttled", 0)
 
-    for i in range(DAYS_TO_FETCH + 1):
+    try:
+        window_queue: asyncio.Queue = asyncio.Queue()
+        for date_string in todo:
+            window_queue.put_nowait(date_string)
+        # Bounded so fetchers wait for the writer instead of piling whole days up in memory.
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+
+        writer = asyncio.create_task(write_worker(write_queue, state, stats))
+        fetchers = [
+            asyncio.create_task(fetch_worker(window_queue, write_queue, client, stats))
+            for _ in range(max(1, workers))
+        ]
+        await window_queue.join()
+        for fetcher in fetchers:
+            fetcher.cancel()
+        await write_queue.put(None)
+        await writer
+    finally:
+        client.session.close()
+
+    stats["throttled"] = shared.stats().get("search", {}).get("throttled", 0) - throttled_before
+    elapsed = time.perf_counter() - started
+    stats["elapsed_seconds"] = round(elapsed, 1)
+    stats["jobs_per_minute"] = round(stats["rows"] / elapsed * 60, 1) if elapsed > 0 else 0.0
+    print(f"✅ Backfill finished: {stats}")
+    shared.log_stats()
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load JobTech ads for the last N days into job_ads.")
+    parser.add_argument("--backfill", action="store_true", help="Concurrent, resumable backfill instead of the day-by-day load")
+    parser.add_argument("--days", type=int, default=DAYS_TO_FETCH)
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--rps", type=float, default=BACKFILL_REQUESTS_PER_SECOND, help="Global request budget (requests/second)")
+    parser.add_argument("--reset-state", action="store_true", help="Ignore saved backfill progress and fetch every day again.")
+    args = parser.parse_args()
+
+    if args.backfill:
+        asyncio.run(run_backfill(args.days, args.workers, args.rps, args.reset_state))
+    else:
+        run_full_load(args.days)
+
+
+if __name__ == "__main__":
+    main()
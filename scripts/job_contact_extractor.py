@@ -81,6 +81,12 @@ DEPRIORITIZED_HOST_HINTS = [
     "jobsearch.api.jobtechdev.se",
 ]
 
+CRAWLER_USER_AGENT = "Mozilla/5.0 (compatible; JobbNuBot/1.0; +https://jobbnu.se)"
+HTML_FETCH_HEADERS = {
+    "User-Agent": CRAWLER_USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml",
+}
+
 
 def normalize_email(raw: str) -> Optional[str]:
     email = unquote((raw or "")).strip().strip(".,;:()[]<>\"'")
@@ -107,6 +113,42 @@ def classify_application_channel(webpage_url: Optional[str], contact_email: Opti
     return "unknown", "no_url_and_no_email"
 
 
+def scan_snapshot(value, path: str = "source_snapshot") -> tuple[list[tuple[str, str]], list[tuple[str, str]], bool]:
+    """
+    One walk over the snapshot that yields what collect_texts() and collect_urls() would
+    (same fragments, same paths, same order) plus whether any key or string contains "@".
+    Without an "@" no email regex can match, so callers can skip the JSON dump and the
+    regex passes entirely.
+    """
+    texts: list[tuple[str, str]] = []
+    urls: list[tuple[str, str]] = []
+    has_at = False
+
+    def walk(node, node_path: str) -> None:
+        nonlocal has_at
+        if isinstance(node, str):
+            candidate = node.strip()
+            if candidate:
+                texts.append((candidate, node_path))
+                if not has_at and "@" in candidate:
+                    has_at = True
+                if candidate.startswith(("http://", "https://", "mailto:")):
+                    urls.append((candidate, node_path))
+        elif isinstance(node, (int, float)):
+            texts.append((str(node), node_path))
+        elif isinstance(node, dict):
+            for key, nested in node.items():
+                if not has_at and isinstance(key, str) and "@" in key:
+                    has_at = True
+                walk(nested, f"{node_path}.{key}")
+        elif isinstance(node, list):
+            for index, nested in enumerate(node):
+                walk(nested, f"{node_path}[{index}]")
+
+    walk(value, path)
+    return texts, urls, has_at
+
+
 def collect_urls(value, path: str = "source_snapshot") -> list[tuple[str, str]]:
     found: list[tuple[str, str]] = []
 
@@ -173,15 +215,21 @@ def score_application_url(url: str, source_path: str) -> int:
     return score
 
 
-def pick_application_url(webpage_url: Optional[str], source_snapshot: Optional[dict]) -> tuple[Optional[str], Optional[str]]:
+def pick_application_url(
+    webpage_url: Optional[str],
+    source_snapshot: Optional[dict],
+    snapshot_urls: Optional[list[tuple[str, str]]] = None,
+) -> tuple[Optional[str], Optional[str]]:
     candidates: list[tuple[int, str, str]] = []
 
     direct_url = (webpage_url or "").strip()
     if direct_url.startswith(("http://", "https://", "mailto:")):
         candidates.append((score_application_url(direct_url, "webpage_url"), direct_url, "webpage_url"))
 
-    if isinstance(source_snapshot, dict):
-        for candidate_url, source_path in collect_urls(source_snapshot):
+    if snapshot_urls is None and isinstance(source_snapshot, dict):
+        snapshot_urls = collect_urls(source_snapshot)
+    if snapshot_urls:
+        for candidate_url, source_path in snapshot_urls:
             candidates.append((score_application_url(candidate_url, source_path), candidate_url, source_path))
 
     if not candidates:
@@ -243,12 +291,21 @@ def pick_best_email_from_sources(sources: list[tuple[str, str]]) -> tuple[Option
 
     for source_text, source_path in sources:
         text = source_text or ""
+        # Both email patterns need a literal "@"; most fragments have none.
+        if "@" not in text:
+            continue
+        lowered = text.lower() if text.isascii() else None
         for email in extract_email_candidates(text):
-            pattern = re.escape(email)
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                start = max(0, match.start() - 180)
-                end = min(len(text), match.end() + 180)
+            if lowered is not None:
+                # ASCII-only: a plain find on the lowered text is the IGNORECASE search.
+                position = lowered.find(email)
+                span = (position, position + len(email)) if position >= 0 else None
+            else:
+                match = re.search(re.escape(email), text, re.IGNORECASE)
+                span = match.span() if match else None
+            if span:
+                start = max(0, span[0] - 180)
+                end = min(len(text), span[1] + 180)
                 context = text[start:end]
             else:
                 context = text[:360]
@@ -268,10 +325,7 @@ def fetch_page_html(url: str, timeout: int = 8) -> tuple[Optional[str], Optional
             url,
             timeout=timeout,
             allow_redirects=True,
-            headers={
-                "User-Agent": "Mozilla/5.0 (compatible; JobbNuBot/1.0; +https://jobbnu.se)",
-                "Accept": "text/html,application/xhtml+xml",
-            },
+            headers=HTML_FETCH_HEADERS,
         )
         if not response.ok:
             return None, f"http_{response.status_code}"
@@ -280,19 +334,32 @@ def fetch_page_html(url: str, timeout: int = 8) -> tuple[Optional[str], Optional
         return None, str(exc)
 
 
-def extract_job_contact_data(description_text: Optional[str], webpage_url: Optional[str], source_snapshot: Optional[dict]) -> dict:
+def extract_job_contact_data(
+    description_text: Optional[str],
+    webpage_url: Optional[str],
+    source_snapshot: Optional[dict],
+    fetch_html: bool = True,
+) -> dict:
+    """
+    With fetch_html=False the employer page is not requested; the result instead reports
+    contact_html_pending so the crawl stage (contact_page_crawler.py) can look it up later.
+    """
     description = description_text or ""
     sources: list[tuple[str, str]] = []
+    snapshot_urls: list[tuple[str, str]] = []
     if description:
         sources.append((description, "description_text"))
     if isinstance(source_snapshot, dict):
-        sources.extend(collect_texts(source_snapshot))
-        try:
-            sources.append((json.dumps(source_snapshot, ensure_ascii=False), "source_snapshot.json"))
-        except Exception:
-            pass
-
-    application_url, application_url_source = pick_application_url(webpage_url, source_snapshot)
+        snapshot_texts, snapshot_urls, snapshot_has_at = scan_snapshot(source_snapshot)
+        sources.extend(snapshot_texts)
+        # The dump can only add candidates when the snapshot contains an "@" somewhere.
+        if snapshot_has_at:
+            try:
+                sources.append((json.dumps(source_snapshot, ensure_ascii=False), "source_snapshot.json"))
+            except Exception:
+                pass
+
+    application_url, application_url_source = pick_application_url(webpage_url, source_snapshot, snapshot_urls)
     email = None
     context = None
     email_source = None
@@ -305,7 +372,8 @@ def extract_job_contact_data(description_text: Optional[str], webpage_url: Optio
         email, context, email_source = pick_best_email_from_sources(sources)
 
     fetch_error = None
-    if not email and webpage_url:
+    html_pending = bool(not email and webpage_url and not fetch_html)
+    if not email and webpage_url and fetch_html:
         html, fetch_error = fetch_page_html(webpage_url)
         if html:
             email, context, _ = pick_best_email_from_sources([(html, "webpage_html")])
@@ -325,4 +393,5 @@ def extract_job_contact_data(description_text: Optional[str], webpage_url: Optio
         "application_channel": application_channel,
         "application_channel_reason": reason,
         "contact_email_context": context,
+        "contact_html_pending": html_pending,
     }
@@ -0,0 +1,247 @@
+# scripts/job_ingest.py
+"""
+Shared JobTech ad -> job_ads row transform.
+
+Used by the daily /search poll (update_jobs.py) and the stream client (jobtech_stream.py)
+so new, updated and re-published ads are written the same way whatever fetched them.
+
+Each row carries two fingerprints:
+- snapshot_fingerprint: the whole source ad. Unchanged means the stored row is already
+  current, so upsert_job_rows() only touches last_seen_at.
+- content_fingerprint: just the fields enrich_jobs.build_job_document reads. Only when it
+  changes are the embedding columns reset so the ad is re-embedded.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    from scripts.job_contact_extractor import extract_job_contact_data
+except ModuleNotFoundError:
+    from job_contact_extractor import extract_job_contact_data
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+CATEGORY_MAP_PATH = REPO_ROOT / "config" / "category_map.json"
+
+if not CATEGORY_MAP_PATH.exists():
+    raise SystemExit(f"❌ Missing category map file: {CATEGORY_MAP_PATH}")
+
+CATEGORY_MAP = json.loads(CATEGORY_MAP_PATH.read_text(encoding="utf-8"))
+
+# Employer pages are fetched by contact_page_crawler.py, not while ingesting. Set to true to
+# restore the old inline fetch (e.g. for one-off scripts without the crawler running).
+CONTACT_HTML_INLINE = os.getenv("JOB_CONTACT_FETCH_HTML_INLINE", "false").lower() in ("1", "true", "yes", "y", "on")
+
+
+def compute_category_tags(field: str, group: str, role: str) -> list[str]:
+    field_l = (field or "").lower()
+    group_l = (group or "").lower()
+    role_l = (role or "").lower()
+
+    tags: list[str] = []
+    for tag, rules in CATEGORY_MAP.items():
+        fields = [x.lower() for x in rules.get("fields", [])]
+        groups = [x.lower() for x in rules.get("groups", [])]
+        role_contains = [x.lower() for x in rules.get("roles_contains", [])]
+
+        hit = False
+        if fields and any(f in field_l for f in fields):
+            hit = True
+        if groups and any(g in group_l for g in groups):
+            hit = True
+        if role_contains and any(rc in role_l for rc in role_contains):
+            hit = True
+
+        if hit:
+            tags.append(tag)
+
+    return sorted(set(tags))
+
+
+EMBEDDING_RESET_FIELDS = {
+    "embedding": None,
+    "embedding_text": None,
+    "embedding_error": None,
+    "embedding_updated_at": None,
+    "parse_debug": None,
+}
+FINGERPRINT_LOOKUP_BATCH_SIZE = 200
+
+
+def _digest(value) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def compute_snapshot_fingerprint(job: dict) -> str:
+    return _digest(job)
+
+
+def compute_content_fingerprint(row: dict, snapshot: dict | None) -> str:
+    """Hash of the inputs to build_job_document (headline, taxonomy, place, description, skills)."""
+    snap = snapshot if isinstance(snapshot, dict) else {}
+    description = snap.get("description") if isinstance(snap.get("description"), dict) else {}
+
+    def skill_labels(key: str) -> list:
+        block = snap.get(key) if isinstance(snap.get(key), dict) else {}
+        return [s.get("label") for s in block.get("skills") or [] if isinstance(s, dict) and s.get("label")]
+
+    return _digest([
+        row.get("headline"),
+        row.get("company"),
+        row.get("occupation_field_label"),
+        row.get("occupation_group_label"),
+        row.get("occupation_label"),
+        row.get("job_category"),
+        row.get("city"),
+        row.get("location"),
+        row.get("description_text"),
+        description.get("text_formatted"),
+        skill_labels("must_have"),
+        skill_labels("nice_to_have"),
+    ])
+
+
+def upsert_job_rows(client, rows: list[dict], batch_size: int = 100, seen_at: str | None = None) -> dict:
+    """
+    Writes build_job_row() output with the fingerprint rules above. Rows stored before
+    fingerprints existed are rewritten in full but keep their embeddings.
+    Returns counts of new, changed, content_changed and unchanged rows.
+    """
+    counts = {"new": 0, "changed": 0, "content_changed": 0, "unchanged": 0}
+    rows = list({row["id"]: row for row in rows}.values())
+    touched_at = seen_at or datetime.now(timezone.utc).isoformat()
+
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        stored: dict[str, dict] = {}
+        ids = [row["id"] for row in batch]
+        for j in range(0, len(ids), FINGERPRINT_LOOKUP_BATCH_SIZE):
+            found = (
+                client.table("job_ads")
+                .select("id, snapshot_fingerprint, content_fingerprint")
+                .in_("id", ids[j:j + FINGERPRINT_LOOKUP_BATCH_SIZE])
+                .execute()
+            ).data or []
+            stored.update({str(r["id"]): r for r in found})
+
+        unchanged_ids: list[str] = []
+        plain_rows: list[dict] = []
+        reset_rows: list[dict] = []
+        for row in batch:
+            previous = stored.get(row["id"])
+            if previous is None:
+                counts["new"] += 1
+                plain_rows.append(row)
+            elif previous.get("snapshot_fingerprint") == row["snapshot_fingerprint"]:
+                counts["unchanged"] += 1
+                unchanged_ids.append(row["id"])
+            elif previous.get("content_fingerprint") and previous["content_fingerprint"] != row["content_fingerprint"]:
+                counts["changed"] += 1
+                counts["content_changed"] += 1
+                reset_rows.append({**row, **EMBEDDING_RESET_FIELDS})
+            else:
+                counts["changed"] += 1
+                plain_rows.append(row)
+
+        # Bulk upserts need identical keys per statement, hence the two row groups.
+        if plain_rows:
+            client.table("job_ads").upsert(plain_rows, on_conflict="id").execute()
+        if reset_rows:
+            client.table("job_ads").upsert(reset_rows, on_conflict="id").execute()
+        if unchanged_ids:
+            (
+                client.table("job_ads")
+                .update({"last_seen_at": touched_at, "is_active": True, "source_inactivated_at": None})
+                .in_("id", unchanged_ids)
+                .execute()
+            )
+
+    return counts
+
+
+def build_job_row(job: dict, seen_at: str | None = None) -> dict:
+    workplace = job.get("workplace_address") or {}
+    occupation = job.get("occupation") or {}
+    occupation_group = job.get("occupation_group") or {}
+    occupation_field = job.get("occupation_field") or {}
+    description = job.get("description") or {}
+
+    # Geo coords are typically [lon, lat]
+    lat = None
+    lon = None
+    coords = workplace.get("coordinates")
+    if isinstance(coords, list) and len(coords) == 2:
+        lon, lat = coords[0], coords[1]
+
+    field_label = occupation_field.get("label") or ""
+    group_label = occupation_group.get("label") or ""
+    role_label = occupation.get("label") or ""
+
+    category_tags = compute_category_tags(field_label, group_label, role_label)
+
+    job_data = {
+        "id": str(job.get("id")),
+        "headline": job.get("headline"),
+        "description_text": description.get("text"),
+        "city": workplace.get("municipality"),
+        "location": workplace.get("municipality"),
+        "published_date": job.get("publication_date"),
+        "application_deadline": job.get("application_deadline"),
+        "webpage_url": job.get("webpage_url"),
+        "job_category": role_label,  # keep for backwards compat
+
+        "requires_dl_b": job.get("driving_license_required", False),
+        "location_lat": lat,
+        "location_lon": lon,
+        # Ads without source coordinates go back through geocode_jobs.
+        "geocode_status": None,
+        "geocode_source": None,
+
+        "source_snapshot": job,
+
+        # Taxonomy fields
+        "occupation_field_label": occupation_field.get("label"),
+        "occupation_field_concept_id": occupation_field.get("concept_id"),
+        "occupation_field_legacy_ams_taxonomy_id": occupation_field.get("legacy_ams_taxonomy_id"),
+
+        "occupation_group_label": occupation_group.get("label"),
+        "occupation_group_concept_id": occupation_group.get("concept_id"),
+        "occupation_group_legacy_ams_taxonomy_id": occupation_group.get("legacy_ams_taxonomy_id"),
+
+        "occupation_label": occupation.get("label"),
+        "occupation_concept_id": occupation.get("concept_id"),
+        "occupation_legacy_ams_taxonomy_id": occupation.get("legacy_ams_taxonomy_id"),
+
+        # Control layer
+        "category_tags": category_tags,
+        "is_active": True,
+        "last_seen_at": seen_at or datetime.now(timezone.utc).isoformat(),
+        "source_inactivated_at": None,
+    }
+
+    contact_data = extract_job_contact_data(
+        description_text=description.get("text"),
+        webpage_url=job.get("webpage_url"),
+        source_snapshot=job,
+        fetch_html=CONTACT_HTML_INLINE,
+    )
+
+    job_data.update({
+        "contact_email": contact_data["contact_email"],
+        "has_contact_email": contact_data["has_contact_email"],
+        "contact_email_source": contact_data["contact_email_source"],
+        "application_url": contact_data["application_url"],
+        "application_url_source": contact_data["application_url_source"],
+        "application_channel": contact_data["application_channel"],
+        "application_channel_reason": contact_data["application_channel_reason"],
+        "contact_html_status": "pending" if contact_data["contact_html_pending"] else None,
+    })
+
+    job_data["snapshot_fingerprint"] = compute_snapshot_fingerprint(job)
+    job_data["content_fingerprint"] = compute_content_fingerprint(job_data, job)
+
+    return job_data
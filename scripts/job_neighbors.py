@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from supabase import Client, create_client
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+load_dotenv(REPO_ROOT / ".env")
+
+SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+    raise SystemExit("Missing SUPABASE_URL/NEXT_PUBLIC_SUPABASE_URL or service key env vars")
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+NEIGHBOR_K = int(os.getenv("JOB_NEIGHBORS_K", "20"))
+REFRESH_BATCH_SIZE = int(os.getenv("JOB_NEIGHBORS_BATCH_SIZE", "25"))
+BACKFILL_PAGE_SIZE = int(os.getenv("JOB_NEIGHBORS_BACKFILL_PAGE_SIZE", "500"))
+
+
+def refresh_job_neighbors(job_ids: list[str], k: int = NEIGHBOR_K) -> int:
+    """
+    Rebuild the neighbour list for freshly embedded jobs and insert them into their
+    neighbours' lists. One ANN query per job, batched into a few RPCs.
+    """
+    ids = [str(job_id) for job_id in dict.fromkeys(job_ids) if job_id]
+    refreshed = 0
+    for i in range(0, len(ids), REFRESH_BATCH_SIZE):
+        batch = ids[i:i + REFRESH_BATCH_SIZE]
+        response = supabase.rpc("refresh_job_neighbors", {"p_job_ids": batch, "k": k}).execute()
+        refreshed += response.data if isinstance(response.data, int) else 0
+    return refreshed
+
+
+def fetch_related_jobs(job_id: str, limit: int = 10) -> list[dict]:
+    response = supabase.rpc(
+        "fetch_related_jobs",
+        {"p_job_id": str(job_id), "limit_count": limit},
+    ).execute()
+    return response.data or []
+
+
+def backfill_job_neighbors(limit_jobs: int | None = None) -> int:
+    """Build the graph for every active embedded job (first deploy or after a model change)."""
+    print(f"🕸️ [JOB NEIGHBORS] Backfill started k={NEIGHBOR_K}")
+    started = time.perf_counter()
+    last_id = None
+    total = 0
+
+    while True:
+        query = (
+            supabase.table("job_ads")
+            .select("id")
+            .eq("is_active", True)
+            .not_.is_("embedding", "null")
+            .order("id")
+            .limit(BACKFILL_PAGE_SIZE)
+        )
+        if last_id:
+            query = query.gt("id", last_id)
+        rows = query.execute().data or []
+        if not rows:
+            break
+
+        job_ids = [str(row["id"]) for row in rows]
+        total += refresh_job_neighbors(job_ids)
+        last_id = job_ids[-1]
+        print(f"   refreshed={total} ({total / max(time.perf_counter() - started, 1e-6):.1f} jobs/s)", flush=True)
+
+        if limit_jobs is not None and total >= limit_jobs:
+            break
+
+    print(f"✅ [JOB NEIGHBORS] Backfill finished refreshed={total} in {time.perf_counter() - started:.1f}s")
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the job-to-job nearest-neighbour graph.")
+    parser.add_argument("--backfill", action="store_true", help="Build neighbour lists for all active embedded jobs")
+    parser.add_argument("--limit-jobs", type=int, default=None)
+    parser.add_argument("--job-id", action="append", default=[], help="Refresh specific job ids (repeatable)")
+    parser.add_argument("--related", type=str, default=None, help="Print related jobs for one job id")
+    args = parser.parse_args()
+
+    if args.related:
+        for row in fetch_related_jobs(args.related):
+            print(f"{row.get('similarity', 0):.3f}  {row.get('id')}  {row.get('title')} ({row.get('city') or '-'})")
+        return
+    if args.job_id:
+        print(f"✅ [JOB NEIGHBORS] refreshed={refresh_job_neighbors(args.job_id)}")
+        return
+    if args.backfill:
+        backfill_job_neighbors(limit_jobs=args.limit_jobs)
+        return
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
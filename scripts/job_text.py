@@ -0,0 +1,132 @@
+# scripts/job_text.py
+"""
+Cleaning and sectioning of Swedish job ad descriptions, shared by the embedding document
+builder (enrich_jobs) and the rule-based skill extractor (skill_rules).
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+NOISE_LINE_PATTERNS = [
+    r"Öppen för alla",
+    r"Vi fokuserar på din kompetens",
+    r"Var ligger arbetsplatsen",
+    r"Postadress",
+    r"Ansök",
+    r"Sök jobbet",
+    r"Arbetsgivaren har tagit bort annonsen",
+    r"Kontakt(uppgifter)?",
+    r"Facklig(a)?",
+    r"Intervjuer sker löpande",
+    r"Urval sker löpande",
+    r"Välkommen med din ansökan",
+    r"GDPR",
+    r"Rekryteringsprocess",
+    r"Vi undanber oss",
+    r"Vi undanber oss kontakt från",
+    r"Samtycke",
+    r"Personuppgifter",
+]
+
+KEEP_SECTION_PATTERNS = [
+    (r"^arbetsuppgifter\b", "arbetsuppgifter"),
+    (r"^dina arbetsuppgifter\b", "arbetsuppgifter"),
+    (r"^arbetsbeskrivning\b", "arbetsuppgifter"),
+    (r"^huvudsakliga arbetsuppgifter\b", "arbetsuppgifter"),
+    (r"^kvalifikationer\b", "kvalifikationer"),
+    (r"^krav\b", "krav"),
+    (r"^kravprofil\b", "krav"),
+    (r"^vi söker\b", "krav"),
+    (r"^meriterande\b", "meriterande"),
+    (r"^kompetens\b", "kompetens"),
+    (r"^profil\b", "profil"),
+    (r"^personliga egenskaper\b", "profil"),
+    (r"^om tjänsten\b", "om_tjänsten"),
+    (r"^om rollen\b", "om_tjänsten"),
+    (r"^villkor\b", "villkor"),
+    (r"^anställningsform\b", "villkor"),
+    (r"^om arbetsplatsen\b", "om_arbetsplatsen"),
+    (r"^om företaget\b", "om_arbetsplatsen"),
+    (r"^vi erbjuder\b", "erbjudande"),
+    (r"^erbjuder vi\b", "erbjudande"),
+]
+
+DROP_SECTION_PATTERNS = [
+    r"^ansökan\b",
+    r"^ansök( idag)?\b",
+    r"^så här ansöker du\b",
+    r"^kontakt\b",
+    r"^kontaktuppgifter\b",
+    r"^facklig(a)?\b",
+    r"^övrigt\b",
+    r"^rekryteringsprocess\b",
+]
+
+
+def clean_text_preserve_newlines(s: str) -> Tuple[str, int]:
+    if not s:
+        return "", 0
+    s = s.replace("\x00", "").replace("\r", "\n")
+
+    removed = 0
+    out_lines: List[str] = []
+    for line in s.splitlines():
+        ln = line.strip()
+        if not ln:
+            continue
+        if any(re.search(p, ln, flags=re.I) for p in NOISE_LINE_PATTERNS):
+            removed += 1
+            continue
+        out_lines.append(ln)
+
+    cleaned = "\n".join(out_lines).strip()
+    cleaned = re.sub(r"[ \t]+", " ", cleaned)
+    return cleaned, removed
+
+
+def sectionize_text(cleaned: str) -> Tuple[Dict[str, str], dict]:
+    if not cleaned:
+        return {}, {"had_headings": False, "kept_sections": []}
+
+    lines = cleaned.splitlines()
+    sections: Dict[str, List[str]] = {}
+    current_key: Optional[str] = None
+    had_heading = False
+
+    keep_compiled = [(re.compile(pat, re.I), key) for pat, key in KEEP_SECTION_PATTERNS]
+    drop_compiled = [re.compile(pat, re.I) for pat in DROP_SECTION_PATTERNS]
+
+    def detect_heading(line: str) -> Tuple[Optional[str], Optional[str]]:
+        for rx in drop_compiled:
+            if rx.search(line):
+                return "drop", None
+        for rx, key in keep_compiled:
+            if rx.search(line):
+                return "keep", key
+        return None, None
+
+    kept = set()
+
+    for ln in lines:
+        kind, key = detect_heading(ln)
+        if kind == "drop":
+            had_heading = True
+            current_key = None
+            continue
+        if kind == "keep" and key:
+            had_heading = True
+            current_key = key
+            kept.add(key)
+            sections.setdefault(key, [])
+            continue
+
+        if current_key:
+            sections[current_key].append(ln)
+
+    out: Dict[str, str] = {}
+    for k, vlines in sections.items():
+        txt = "\n".join(vlines).strip()
+        if txt:
+            out[k] = txt
+
+    return out, {"had_headings": had_heading, "kept_sections": sorted(list(kept))}
@@ -0,0 +1,256 @@
+# scripts/jobtech_client.py
+"""
+Shared HTTP client for the JobTech APIs (/search and JobStream).
+
+- One pooled requests.Session per process, so pages reuse keep-alive connections
+  instead of a TCP/TLS handshake each.
+- One token bucket per process: update_jobs, sync_active_jobs, initial_load and the
+  stream poller running inside service.py all draw from the same budget. A 429 pauses
+  the bucket for everyone (Retry-After when the API sends it).
+- Retries use exponential backoff with full jitter.
+- Callers that repeat the same GET (e.g. the daily id-only scan from the long-running
+  service) can opt into conditional requests: If-None-Match is sent when an earlier
+  response for the same URL + params carried an ETag, and a 304 returns the cached body.
+- Latency, error, 429 and 304 counters are kept per endpoint; see stats().
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+load_dotenv()
+
+JOBTECH_API_KEY = os.getenv("JOBTECH_API_KEY")
+REQUESTS_PER_SECOND = float(os.getenv("JOBTECH_REQUESTS_PER_SECOND", "4"))
+BURST = int(os.getenv("JOBTECH_BURST", "4"))
+POOL_SIZE = int(os.getenv("JOBTECH_POOL_SIZE", "16"))
+DEFAULT_TIMEOUT_SECONDS = int(os.getenv("JOBTECH_FETCH_TIMEOUT_SECONDS") or os.getenv("JOB_FETCH_TIMEOUT_SECONDS", "45"))
+MAX_FETCH_RETRIES = int(os.getenv("JOBTECH_MAX_FETCH_RETRIES") or os.getenv("JOB_FETCH_MAX_RETRIES", "3"))
+# 429s in a row before a request gives up (each one pauses the shared bucket first)
+MAX_THROTTLED_RETRIES = int(os.getenv("JOBTECH_MAX_THROTTLED_RETRIES", "8"))
+BACKOFF_BASE_SECONDS = float(os.getenv("JOBTECH_BACKOFF_BASE_SECONDS", "1"))
+BACKOFF_MAX_SECONDS = float(os.getenv("JOBTECH_BACKOFF_MAX_SECONDS", "30"))
+ETAG_CACHE_SIZE = int(os.getenv("JOBTECH_ETAG_CACHE_SIZE", "1024"))
+
+RETRYABLE_STATUS = {500, 502, 503, 504}
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+def retry_after_seconds(headers, attempt: int) -> float:
+    value = (headers or {}).get("Retry-After", "")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return backoff_delay(attempt)
+
+
+class TokenBucket:
+    """Thread-safe token bucket. pause() holds back every caller, not just the throttled one."""
+
+    def __init__(self, rate: float = REQUESTS_PER_SECOND, burst: int = BURST):
+        self.rate = rate
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            # Refill from the end of the pause, so a back-off is not followed by a full burst
+            self._updated_at = self._paused_until
+
+    def _reserve(self) -> float:
+        """Takes a token if one is free and returns 0, otherwise returns how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while (wait_s := self._reserve()) > 0:
+            time.sleep(wait_s)
+
+    async def acquire_async(self) -> None:
+        if self.rate <= 0:
+            return
+        while (wait_s := self._reserve()) > 0:
+            await asyncio.sleep(wait_s)
+
+
+class EndpointStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def record(self, endpoint: str, latency_ms: float | None = None, outcome: str = "ok") -> None:
+        with self._lock:
+            entry = self._stats.setdefault(endpoint, {
+                "requests": 0, "errors": 0, "throttled": 0, "not_modified": 0,
+                "latency_ms_total": 0.0, "latency_ms_max": 0.0,
+            })
+            entry["requests"] += 1
+            if outcome == "error":
+                entry["errors"] += 1
+            elif outcome == "throttled":
+                entry["throttled"] += 1
+            elif outcome == "not_modified":
+                entry["not_modified"] += 1
+            if latency_ms is not None:
+                entry["latency_ms_total"] += latency_ms
+                entry["latency_ms_max"] = max(entry["latency_ms_max"], latency_ms)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            out = {}
+            for endpoint, entry in self._stats.items():
+                row = dict(entry)
+                row["latency_ms_avg"] = round(entry["latency_ms_total"] / entry["requests"], 1) if entry["requests"] else 0.0
+                row["latency_ms_total"] = round(entry["latency_ms_total"], 1)
+                row["latency_ms_max"] = round(entry["latency_ms_max"], 1)
+                out[endpoint] = row
+            return out
+
+
+class JobTechClient:
+    def __init__(self, bucket: TokenBucket | None = None, endpoint_stats: EndpointStats | None = None):
+        self.bucket = bucket or TokenBucket()
+        self.endpoint_stats = endpoint_stats or EndpointStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept"] = "application/json"
+        if JOBTECH_API_KEY:
+            self.session.headers["api-key"] = JOBTECH_API_KEY
+        self._etag_cache: OrderedDict[tuple, tuple[str, object]] = OrderedDict()
+        self._etag_lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(url: str, params: dict | None) -> tuple:
+        return (url, tuple(sorted((k, str(v)) for k, v in (params or {}).items())))
+
+    def _cached(self, key: tuple) -> tuple[str, object] | None:
+        with self._etag_lock:
+            entry = self._etag_cache.get(key)
+            if entry is not None:
+                self._etag_cache.move_to_end(key)
+            return entry
+
+    def _remember(self, key: tuple, etag: str, payload) -> None:
+        if ETAG_CACHE_SIZE <= 0:
+            return
+        with self._etag_lock:
+            self._etag_cache[key] = (etag, payload)
+            self._etag_cache.move_to_end(key)
+            while len(self._etag_cache) > ETAG_CACHE_SIZE:
+                self._etag_cache.popitem(last=False)
+
+    def get_json(
+        self,
+        url: str,
+        params: dict | None = None,
+        endpoint: str | None = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        conditional: bool = False,
+    ):
+        endpoint = endpoint or url
+        key = self._cache_key(url, params)
+        attempt = 0
+        throttled = 0
+        while True:
+            cached = self._cached(key) if conditional else None
+            headers = {"If-None-Match": cached[0]} if cached else None
+
+            self.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+            except requests.exceptions.RequestException as e:
+                self.endpoint_stats.record(endpoint, (time.perf_counter() - started) * 1000, "error")
+                attempt += 1
+                if attempt >= MAX_FETCH_RETRIES:
+                    raise
+                wait_s = backoff_delay(attempt)
+                print(f"      ⏳ [JOBTECH] {endpoint}: {e.__class__.__name__}; retry {attempt}/{MAX_FETCH_RETRIES} in {wait_s:.1f}s")
+                time.sleep(wait_s)
+                continue
+            latency_ms = (time.perf_counter() - started) * 1000
+
+            if response.status_code == 304 and cached:
+                self.endpoint_stats.record(endpoint, latency_ms, "not_modified")
+                return cached[1]
+
+            if response.status_code == 429:
+                self.endpoint_stats.record(endpoint, latency_ms, "throttled")
+                throttled += 1
+                if throttled > MAX_THROTTLED_RETRIES:
+                    print(f"      ❌ [JOBTECH] {endpoint}: still rate limited after {MAX_THROTTLED_RETRIES} pauses")
+                    response.raise_for_status()
+                wait_s = retry_after_seconds(response.headers, throttled)
+                print(f"      ⏳ [JOBTECH] {endpoint}: rate limited (429); pausing {wait_s:.1f}s")
+                self.bucket.pause(wait_s)
+                continue
+
+            if response.status_code in RETRYABLE_STATUS and attempt + 1 < MAX_FETCH_RETRIES:
+                self.endpoint_stats.record(endpoint, latency_ms, "error")
+                attempt += 1
+                wait_s = backoff_delay(attempt)
+                print(f"      ⏳ [JOBTECH] {endpoint}: HTTP {response.status_code}; retry {attempt}/{MAX_FETCH_RETRIES} in {wait_s:.1f}s")
+                time.sleep(wait_s)
+                continue
+
+            if response.status_code >= 400:
+                self.endpoint_stats.record(endpoint, latency_ms, "error")
+                response.raise_for_status()
+
+            self.endpoint_stats.record(endpoint, latency_ms)
+            payload = response.json()
+            etag = response.headers.get("ETag")
+            if conditional and etag:
+                self._remember(key, etag, payload)
+            return payload
+
+    def stats(self) -> dict[str, dict]:
+        return self.endpoint_stats.snapshot()
+
+    def log_stats(self, label: str = "JOBTECH") -> None:
+        for endpoint, row in self.stats().items():
+            print(
+                f"📊 [{label}] {endpoint}: requests={row['requests']} errors={row['errors']} "
+                f"429={row['throttled']} 304={row['not_modified']} "
+                f"avg={row['latency_ms_avg']}ms max={row['latency_ms_max']}ms"
+            )
+
+
+_client: JobTechClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> JobTechClient:
+    """Process-wide client, so every caller shares one connection pool and one rate budget."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = JobTechClient()
+        return _client
@@ -0,0 +1,157 @@
+# scripts/jobtech_search.py
+"""
+Shared paginator for the JobTech /search API.
+
+/search only pages up to offset 2000. Instead of stopping there, every window is first
+asked for its total hit count (the first page request returns it for free). Windows that
+fit under the cap are paged out; larger ones are split into enough equal sub-windows to
+fit and planned again. Pages are then fetched concurrently through the shared JobTech
+client, so they draw from the same connection pool and rate budget as every other caller.
+
+Window bounds are sent inclusive on both ends and hits are de-duplicated by id, so an ad
+published exactly on a split point is never lost.
+"""
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+try:
+    from scripts.jobtech_client import JobTechClient, get_client
+except ModuleNotFoundError:
+    from jobtech_client import JobTechClient, get_client
+
+load_dotenv()
+
+SEARCH_URL = os.getenv("JOBTECH_SEARCH_URL", "https://jobsearch.api.jobtechdev.se/search")
+PAGE_LIMIT = 100
+MAX_OFFSET = 2000
+# Split so each sub-window lands comfortably under the cap even if ads arrive unevenly.
+SPLIT_FILL_RATIO = 0.8
+MIN_WINDOW_SECONDS = 1
+MAX_WORKERS = int(os.getenv("JOBTECH_MAX_WORKERS", "4"))
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def split_window(start: datetime, end: datetime, total: int) -> list[tuple[datetime, datetime]]:
+    """Equal sub-windows, enough of them that each should hold under the offset cap."""
+    parts = max(2, math.ceil(total / (MAX_OFFSET * SPLIT_FILL_RATIO)))
+    step = max(MIN_WINDOW_SECONDS, math.ceil((end - start).total_seconds() / parts))
+    windows = []
+    cursor = start
+    while cursor < end:
+        part_end = min(end, cursor + timedelta(seconds=step))
+        windows.append((cursor, part_end))
+        cursor = part_end
+    return windows
+
+
+def aligned_windows(start: datetime, end: datetime, step: timedelta) -> list[tuple[datetime, datetime]]:
+    cursor = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    windows = []
+    while cursor < end:
+        windows.append((max(start, cursor), min(end, cursor + step)))
+        cursor += step
+    return windows
+
+
+class SearchPaginator:
+    def __init__(
+        self,
+        base_params: dict | None = None,
+        client: JobTechClient | None = None,
+        max_workers: int = MAX_WORKERS,
+        conditional: bool = False,
+    ):
+        self.base_params = dict(base_params or {})
+        self.client = client or get_client()
+        self.max_workers = max(1, max_workers)
+        self.conditional = conditional
+        self.request_count = 0
+        self.split_count = 0
+        self._count_lock = threading.Lock()
+
+    def search(self, start: datetime, end: datetime, offset: int = 0, limit: int = PAGE_LIMIT) -> dict:
+        params = {
+            **self.base_params,
+            "published-after": start.strftime(TIME_FORMAT),
+            "published-before": end.strftime(TIME_FORMAT),
+            "offset": offset,
+            "limit": limit,
+        }
+        with self._count_lock:
+            self.request_count += 1
+        return self.client.get_json(SEARCH_URL, params=params, endpoint="search", conditional=self.conditional)
+
+    @staticmethod
+    def total_hits(data: dict) -> int:
+        total = data.get("total")
+        if isinstance(total, dict):
+            total = total.get("value")
+        return int(total) if isinstance(total, (int, float)) else len(data.get("hits") or [])
+
+    def plan(
+        self, start: datetime, end: datetime, align: timedelta | None = None
+    ) -> list[tuple[datetime, datetime, int, list[dict]]]:
+        """
+        Returns (start, end, total, first_page_hits) for windows that fit under the offset cap.
+        The first page doubles as the count request, so fitting windows cost nothing extra.
+
+        With align (e.g. one day), the span is first cut on fixed midnight-based boundaries so
+        repeated scans request identical windows, which is what lets conditional requests hit.
+        """
+        pending = aligned_windows(start, end, align) if align else [(start, end)]
+        planned: list[tuple[datetime, datetime, int, list[dict]]] = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending:
+                results = list(pool.map(lambda window: (window, self.search(*window)), pending))
+                pending = []
+                for (window_start, window_end), data in results:
+                    total = self.total_hits(data)
+                    span_seconds = (window_end - window_start).total_seconds()
+                    if total <= MAX_OFFSET or span_seconds <= MIN_WINDOW_SECONDS:
+                        if total > MAX_OFFSET:
+                            print(f"      ⚠️ {total} ads within {MIN_WINDOW_SECONDS}s at {window_start}; only {MAX_OFFSET} reachable.")
+                        planned.append((window_start, window_end, total, data.get("hits") or []))
+                        continue
+
+                    with self._count_lock:
+                        self.split_count += 1
+                    pending.extend(split_window(window_start, window_end, total))
+        return planned
+
+    def fetch_all(self, start: datetime, end: datetime, align: timedelta | None = None) -> list[dict]:
+        planned = self.plan(start, end, align=align)
+
+        hits_by_id: dict[str, dict] = {}
+        page_jobs: list[tuple[datetime, datetime, int]] = []
+        for window_start, window_end, total, first_hits in planned:
+            for hit in first_hits:
+                hits_by_id[str(hit.get("id"))] = hit
+            reachable = min(total, MAX_OFFSET)
+            for offset in range(PAGE_LIMIT, reachable, PAGE_LIMIT):
+                page_jobs.append((window_start, window_end, offset))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for data in pool.map(lambda job: self.search(job[0], job[1], offset=job[2]), page_jobs):
+                for hit in data.get("hits") or []:
+                    hits_by_id[str(hit.get("id"))] = hit
+
+        print(
+            f"   🔎 JobTech search {start.strftime(TIME_FORMAT)} -> {end.strftime(TIME_FORMAT)}: "
+            f"{len(hits_by_id)} ads, windows={len(planned)} splits={self.split_count} requests={self.request_count}"
+        )
+        return list(hits_by_id.values())
+
+
+def fetch_hits_between(start: datetime, end: datetime, base_params: dict | None = None) -> list[dict]:
+    return SearchPaginator(base_params=base_params).fetch_all(start, end)
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.strptime(value[:19], TIME_FORMAT)
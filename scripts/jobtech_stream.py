@@ -0,0 +1,213 @@
+# scripts/jobtech_stream.py
+"""
+JobTech JobStream ingestion: one snapshot, then incremental change-feed polls.
+
+- /snapshot returns every currently published ad. Used once (or when the checkpoint is lost)
+  and doubles as a full "which ids are live" reconciliation.
+- /stream?date=<checkpoint> returns ads created, updated or removed since the checkpoint.
+  Removed ads come back as {"id": ..., "removed": true, ...}.
+
+New, updated and removed ads all go through apply_ads(), and the checkpoint is only advanced
+after a batch has been written, so a crashed poll is simply repeated.
+"""
+import argparse
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from supabase import Client, create_client
+
+try:
+    from scripts.job_ingest import build_job_row, upsert_job_rows
+    from scripts.jobtech_client import get_client
+except ModuleNotFoundError:
+    from job_ingest import build_job_row, upsert_job_rows
+    from jobtech_client import get_client
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+JOBSTREAM_URL = os.getenv("JOBSTREAM_URL", "https://jobstream.api.jobtechdev.se").rstrip("/")
+FETCH_TIMEOUT_SECONDS = int(os.getenv("JOBSTREAM_FETCH_TIMEOUT_SECONDS", "120"))
+UPSERT_BATCH_SIZE = int(os.getenv("JOBSTREAM_UPSERT_BATCH_SIZE", "200"))
+# Poll up to now - lag so ads written while the request is in flight land in the next window.
+STREAM_LAG_SECONDS = int(os.getenv("JOBSTREAM_LAG_SECONDS", "60"))
+# Same guard as sync_active_jobs: never reconcile against a suspiciously small snapshot.
+SNAPSHOT_MIN_ADS = int(os.getenv("JOBSTREAM_SNAPSHOT_MIN_ADS", "10000"))
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+CHECKPOINT_FILE = Path(os.getenv("JOBSTREAM_CHECKPOINT_FILE", str(SCRIPT_DIR / "jobstream_checkpoint.json")))
+
+if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+    raise SystemExit("❌ Missing SUPABASE_URL or SUPABASE_SERVICE_KEY")
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+_poll_lock = threading.Lock()
+
+
+def format_ts(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def load_checkpoint(path: Path = CHECKPOINT_FILE) -> dict:
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"⚠️ [JOBSTREAM] Could not read checkpoint {path}: {e}")
+    return {}
+
+
+def save_checkpoint(checkpoint: dict, path: Path = CHECKPOINT_FILE) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(checkpoint, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+class SupabaseJobSink:
+    """Writes stream results to job_ads."""
+
+    def upsert(self, rows: list[dict]) -> None:
+        counts = upsert_job_rows(supabase, rows, batch_size=UPSERT_BATCH_SIZE)
+        print(f"   💾 [JOBSTREAM] {counts}")
+
+    def deactivate(self, job_ids: list[str], inactivated_at: str) -> None:
+        for i in range(0, len(job_ids), UPSERT_BATCH_SIZE):
+            (
+                supabase.table("job_ads")
+                .update({"is_active": False, "source_inactivated_at": inactivated_at})
+                .in_("id", job_ids[i:i + UPSERT_BATCH_SIZE])
+                .eq("is_active", True)
+                .execute()
+            )
+
+    def active_ids(self) -> set[str]:
+        ids: set[str] = set()
+        last_id = None
+        while True:
+            query = supabase.table("job_ads").select("id").eq("is_active", True).order("id").limit(1000)
+            if last_id:
+                query = query.gt("id", last_id)
+            rows = query.execute().data or []
+            if not rows:
+                break
+            ids.update(str(row["id"]) for row in rows)
+            last_id = rows[-1]["id"]
+        return ids
+
+
+class JobStreamClient:
+    def __init__(self, base_url: str = JOBSTREAM_URL, checkpoint_path: Path = CHECKPOINT_FILE, sink=None, client=None):
+        self.base_url = base_url.rstrip("/")
+        self.checkpoint_path = checkpoint_path
+        self.sink = sink or SupabaseJobSink()
+        self.client = client or get_client()
+
+    def _get(self, path: str, params: dict | None = None) -> list[dict]:
+        data = self.client.get_json(
+            f"{self.base_url}{path}", params=params, endpoint=f"jobstream{path}", timeout=FETCH_TIMEOUT_SECONDS
+        )
+        if isinstance(data, dict):
+            data = data.get("hits") or data.get("ads") or []
+        return data if isinstance(data, list) else []
+
+    def apply_ads(self, ads: list[dict]) -> dict:
+        """Single write path for new, updated and removed ads."""
+        seen_at = datetime.now(timezone.utc).isoformat()
+        rows: list[dict] = []
+        removed_ids: list[str] = []
+        for ad in ads:
+            if not isinstance(ad, dict) or ad.get("id") is None:
+                continue
+            if ad.get("removed"):
+                removed_ids.append(str(ad["id"]))
+            else:
+                rows.append(build_job_row(ad, seen_at=seen_at))
+
+        # The same id can appear twice in one window (published then edited); keep the last version.
+        rows = list({row["id"]: row for row in rows}.values())
+        removed = set(removed_ids)
+        rows = [row for row in rows if row["id"] not in removed]
+
+        if rows:
+            self.sink.upsert(rows)
+        if removed_ids:
+            self.sink.deactivate(sorted(removed), seen_at)
+        return {"upserted": len(rows), "removed": len(removed)}
+
+    def run_snapshot(self) -> dict:
+        started_at = datetime.now(timezone.utc) - timedelta(seconds=STREAM_LAG_SECONDS)
+        print(f"📸 [JOBSTREAM] Fetching snapshot from {self.base_url}/snapshot ...")
+        ads = self._get("/snapshot")
+        counts = self.apply_ads(ads)
+
+        live_ids = {str(ad["id"]) for ad in ads if isinstance(ad, dict) and ad.get("id") is not None and not ad.get("removed")}
+        stale = 0
+        if len(live_ids) >= SNAPSHOT_MIN_ADS:
+            stale_ids = sorted(self.sink.active_ids() - live_ids)
+            self.sink.deactivate(stale_ids, datetime.now(timezone.utc).isoformat())
+            stale = len(stale_ids)
+        else:
+            print(f"⚠️ [JOBSTREAM] Snapshot has only {len(live_ids)} ads; skipping stale reconciliation.")
+
+        checkpoint = {
+            "snapshot_completed_at": format_ts(datetime.now(timezone.utc)),
+            "last_stream_at": format_ts(started_at),
+        }
+        save_checkpoint(checkpoint, self.checkpoint_path)
+        counts["stale_deactivated"] = stale
+        print(f"✅ [JOBSTREAM] Snapshot applied: {counts}")
+        return counts
+
+    def poll_stream(self) -> dict:
+        checkpoint = load_checkpoint(self.checkpoint_path)
+        if not checkpoint.get("last_stream_at"):
+            return self.run_snapshot()
+
+        since = checkpoint["last_stream_at"]
+        until = format_ts(datetime.now(timezone.utc) - timedelta(seconds=STREAM_LAG_SECONDS))
+        if until < since:
+            return {"upserted": 0, "removed": 0}
+
+        ads = self._get("/stream", params={"date": since, "updated-before-date": until})
+        counts = self.apply_ads(ads)
+        checkpoint["last_stream_at"] = until
+        save_checkpoint(checkpoint, self.checkpoint_path)
+        print(f"🔁 [JOBSTREAM] {since} -> {until}: {counts}")
+        return counts
+
+
+def run_jobstream_poll() -> dict | None:
+    """Entry point for the scheduler; overlapping polls are skipped, not queued."""
+    if not _poll_lock.acquire(blocking=False):
+        print("ℹ️ [JOBSTREAM] Previous poll still running; skipping.")
+        return None
+    try:
+        return JobStreamClient().poll_stream()
+    except Exception as e:
+        print(f"❌ [JOBSTREAM] Poll failed: {e}")
+        return None
+    finally:
+        _poll_lock.release()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest JobTech ads via the JobStream snapshot + change feed.")
+    parser.add_argument("--snapshot", action="store_true", help="Force a full snapshot (and stale reconciliation)")
+    args = parser.parse_args()
+
+    client = JobStreamClient()
+    if args.snapshot:
+        client.run_snapshot()
+    else:
+        client.poll_stream()
+
+
+if __name__ == "__main__":
+    main()
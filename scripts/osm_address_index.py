@@ -0,0 +1,313 @@
+# scripts/osm_address_index.py
+"""
+Optional offline street-level geocoder: a SQLite index of Swedish OSM addresses that
+geocode_jobs consults before Nominatim when OSM_ADDRESS_INDEX_PATH points at it.
+
+Build it once from an extract (e.g. https://download.geofabrik.de/europe/sweden-latest.osm.pbf):
+
+  python scripts/osm_address_index.py import sweden-latest.osm.pbf --db data/osm_addresses.sqlite
+  python scripts/osm_address_index.py import addresses.geojsonseq --db ...   # osmium export -f geojsonseq
+  python scripts/osm_address_index.py import addresses.csv --db ...          # street,housenumber,city,postcode,lat,lon
+  python scripts/osm_address_index.py bench --db data/osm_addresses.sqlite --queries 20000
+  python scripts/osm_address_index.py lookup "Storgatan 5, Luleå" --db data/osm_addresses.sqlite
+
+.osm.pbf input needs pyosmium (pip install osmium); the other formats only need the stdlib.
+
+Lookups are exact B-tree probes on (street, housenumber, city). OSM addr:city is the postal town,
+not the municipality the ad names, so when it does not match, the candidate closest to the
+caller's `near` point (the municipality seat) within OSM_MAX_DISTANCE_KM wins.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import statistics
+import time
+import unicodedata
+from pathlib import Path
+
+OSM_MAX_DISTANCE_KM = float(os.getenv("OSM_MAX_DISTANCE_KM", "40"))
+IMPORT_BATCH_SIZE = 10000
+
+ADDRESS_PATTERN = re.compile(r"^\s*(.+?)\s+(\d+\s?[A-Za-z]?)\s*(?:,\s*(.*))?$")
+
+SCHEMA = """
+CREATE TABLE addresses (
+  street_key TEXT NOT NULL,
+  housenumber TEXT NOT NULL,
+  city_key TEXT NOT NULL,
+  street TEXT NOT NULL,
+  city TEXT,
+  postcode TEXT,
+  lat REAL NOT NULL,
+  lon REAL NOT NULL
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def normalize_key(value: str | None) -> str:
+    text = unicodedata.normalize("NFC", value or "").casefold()
+    text = re.sub(r"[-_/.]", " ", text)
+    return re.sub(r"\s+", " ", text).strip(" ,")
+
+
+def normalize_housenumber(value: str | None) -> str:
+    return re.sub(r"\s+", "", value or "").upper()
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def parse_address(address: str) -> tuple[str, str, str | None] | None:
+    """"Storgatan 5B, Luleå" -> ("Storgatan", "5B", "Luleå")."""
+    match = ADDRESS_PATTERN.match(address or "")
+    if not match:
+        return None
+    return match.group(1), match.group(2), (match.group(3) or None)
+
+
+# ---------------- Import ----------------
+
+def iter_csv(path: Path):
+    with path.open(encoding="utf-8", newline="") as handle:
+        for row in csv.DictReader(handle):
+            yield row.get("street"), row.get("housenumber"), row.get("city"), row.get("postcode"), row.get("lat"), row.get("lon")
+
+
+def iter_geojsonseq(path: Path):
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip().lstrip("\x1e")
+            if not line:
+                continue
+            feature = json.loads(line)
+            props = feature.get("properties") or {}
+            geometry = feature.get("geometry") or {}
+            coords = geometry.get("coordinates")
+            if geometry.get("type") == "Point":
+                lon, lat = coords[0], coords[1]
+            elif geometry.get("type") == "Polygon" and coords:
+                ring = coords[0]
+                lon = sum(p[0] for p in ring) / len(ring)
+                lat = sum(p[1] for p in ring) / len(ring)
+            else:
+                continue
+            yield props.get("addr:street"), props.get("addr:housenumber"), props.get("addr:city"), props.get("addr:postcode"), lat, lon
+
+
+def iter_pbf(path: Path):
+    try:
+        import osmium
+    except ModuleNotFoundError:
+        raise SystemExit("❌ Reading .osm.pbf needs pyosmium (pip install osmium), or export to geojsonseq/csv first.")
+
+    rows: list[tuple] = []
+
+    class AddressHandler(osmium.SimpleHandler):
+        def _emit(self, tags, lat: float, lon: float) -> None:
+            rows.append((tags.get("addr:street"), tags.get("addr:housenumber"), tags.get("addr:city"), tags.get("addr:postcode"), lat, lon))
+
+        def node(self, n):
+            if "addr:street" in n.tags and "addr:housenumber" in n.tags:
+                self._emit(n.tags, n.location.lat, n.location.lon)
+
+        def way(self, w):
+            if "addr:street" in w.tags and "addr:housenumber" in w.tags:
+                points = [(node.location.lat, node.location.lon) for node in w.nodes if node.location.valid()]
+                if points:
+                    self._emit(w.tags, sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+
+    # Buildings carry most Swedish addresses, so way geometries are needed (locations=True).
+    AddressHandler().apply_file(str(path), locations=True)
+    yield from rows
+
+
+def source_rows(path: Path):
+    name = path.name.lower()
+    if name.endswith(".pbf"):
+        return iter_pbf(path)
+    if name.endswith((".geojsonseq", ".geojsonl", ".jsonl")):
+        return iter_geojsonseq(path)
+    if name.endswith(".csv"):
+        return iter_csv(path)
+    raise SystemExit(f"❌ Unsupported input format: {path}")
+
+
+def build_index(source: Path, db_path: Path) -> dict:
+    started = time.perf_counter()
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_suffix(db_path.suffix + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+
+    imported = skipped = 0
+    batch: list[tuple] = []
+    for street, housenumber, city, postcode, lat, lon in source_rows(source):
+        try:
+            lat_f, lon_f = float(lat), float(lon)
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        if not street or not housenumber:
+            skipped += 1
+            continue
+        batch.append((normalize_key(street), normalize_housenumber(housenumber), normalize_key(city),
+                      street, city, postcode, lat_f, lon_f))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            conn.executemany("INSERT INTO addresses VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO addresses VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        imported += len(batch)
+    load_s = time.perf_counter() - started
+
+    # Index after the bulk load; far cheaper than maintaining it row by row.
+    conn.execute("CREATE INDEX idx_addresses_street_number ON addresses(street_key, housenumber, city_key)")
+    conn.execute("INSERT INTO meta VALUES ('source', ?), ('imported_rows', ?), ('built_at', ?)",
+                 (source.name, str(imported), time.strftime("%Y-%m-%dT%H:%M:%S")))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_path, db_path)
+
+    return {
+        "rows": imported,
+        "skipped": skipped,
+        "load_s": round(load_s, 1),
+        "total_s": round(time.perf_counter() - started, 1),
+        "size_mb": round(db_path.stat().st_size / 1024 / 1024, 1),
+    }
+
+
+# ---------------- Lookup ----------------
+
+class OsmAddressIndex:
+    def __init__(self, db_path: Path | str):
+        self.db_path = Path(db_path)
+        self.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+
+    def lookup(self, street: str, housenumber: str, city: str | None = None,
+               near: tuple[float, float] | None = None) -> dict | None:
+        street_key, number_key, city_key = normalize_key(street), normalize_housenumber(housenumber), normalize_key(city)
+        best = None
+        if city_key:
+            best = self.conn.execute(
+                "SELECT city_key, street, housenumber, city, lat, lon FROM addresses "
+                "WHERE street_key = ? AND housenumber = ? AND city_key = ? LIMIT 1",
+                (street_key, number_key, city_key),
+            ).fetchone()
+        if best is not None:
+            rows = [best]
+        else:
+            rows = self.conn.execute(
+                "SELECT city_key, street, housenumber, city, lat, lon FROM addresses WHERE street_key = ? AND housenumber = ?",
+                (street_key, number_key),
+            ).fetchall()
+        if not rows:
+            return None
+
+        if best is None and near is not None:
+            distance, candidate = min((haversine_km(near[0], near[1], row[4], row[5]), row) for row in rows)
+            best = candidate if distance <= OSM_MAX_DISTANCE_KM else None
+        if best is None and len(rows) == 1 and not city_key and near is None:
+            best = rows[0]
+        if best is None:
+            return None
+        _, street_name, number, city_name, lat, lon = best
+        display = f"{street_name} {number}, {city_name}" if city_name else f"{street_name} {number}"
+        return {"lat": lat, "lon": lon, "display_name": display}
+
+    def lookup_address(self, address: str, near: tuple[float, float] | None = None) -> dict | None:
+        parsed = parse_address(address)
+        if not parsed:
+            return None
+        street, housenumber, city = parsed
+        return self.lookup(street, housenumber, city, near=near)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def open_index(db_path: str | None) -> OsmAddressIndex | None:
+    if not db_path or not Path(db_path).exists():
+        return None
+    return OsmAddressIndex(db_path)
+
+
+def benchmark(db_path: Path, queries: int) -> dict:
+    index = OsmAddressIndex(db_path)
+    total = index.conn.execute("SELECT count(*) FROM addresses").fetchone()[0]
+    max_rowid = index.conn.execute("SELECT max(rowid) FROM addresses").fetchone()[0]
+    if not total:
+        return {"rows": 0}
+    sample = []
+    for _ in range(queries):
+        row = index.conn.execute(
+            "SELECT street, housenumber, city, lat, lon FROM addresses WHERE rowid >= ? LIMIT 1",
+            (random.randint(1, max_rowid),),
+        ).fetchone()
+        if row:
+            sample.append(row)
+
+    latencies_us: list[float] = []
+    misses = 0
+    for street, housenumber, city, lat, lon in sample:
+        started = time.perf_counter()
+        hit = index.lookup(street, housenumber, city, near=(lat, lon))
+        latencies_us.append((time.perf_counter() - started) * 1_000_000)
+        if hit is None:
+            misses += 1
+    latencies_us.sort()
+    index.close()
+    return {
+        "rows": total,
+        "queries": len(sample),
+        "misses": misses,
+        "p50_us": round(statistics.median(latencies_us), 1),
+        "p99_us": round(latencies_us[min(len(latencies_us) - 1, int(len(latencies_us) * 0.99))], 1),
+        "size_mb": round(db_path.stat().st_size / 1024 / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline OSM address index for geocode_jobs.")
+    parser.add_argument("command", choices=["import", "bench", "lookup"])
+    parser.add_argument("value", nargs="?", help="Source file for import, address for lookup")
+    parser.add_argument("--db", default=os.getenv("OSM_ADDRESS_INDEX_PATH", "data/osm_addresses.sqlite"))
+    parser.add_argument("--queries", type=int, default=10000)
+    args = parser.parse_args()
+    db_path = Path(args.db)
+
+    if args.command == "import":
+        if not args.value:
+            parser.error("import needs a source file")
+        print(f"📦 Importing {args.value} -> {db_path} ...")
+        print(f"✅ {build_index(Path(args.value), db_path)}")
+    elif args.command == "bench":
+        print(f"📊 {benchmark(db_path, max(1, args.queries))}")
+    else:
+        if not args.value:
+            parser.error("lookup needs an address")
+        index = OsmAddressIndex(db_path)
+        started = time.perf_counter()
+        hit = index.lookup_address(args.value)
+        print(f"{'✅' if hit else '❌'} {hit} ({(time.perf_counter() - started) * 1_000_000:.0f}µs)")
+
+
+if __name__ == "__main__":
+    main()
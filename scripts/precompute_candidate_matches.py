@@ -5,6 +5,7 @@ import math
 import os
 import re
 import sys
+import time
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -32,6 +33,27 @@ NATIONAL_RETRIEVAL_POOL_LIMIT = int(os.getenv("PRECOMPUTE_MATCH_NATIONAL_RETRIEV
 NATIONAL_INCREMENTAL_INSERT_LIMIT = int(os.getenv("PRECOMPUTE_MATCH_NATIONAL_INCREMENTAL_LIMIT", "500"))
 PROFILE_BATCH_SIZE = int(os.getenv("PRECOMPUTE_MATCH_PROFILE_BATCH_SIZE", "100"))
 UPSERT_BATCH_SIZE = int(os.getenv("PRECOMPUTE_MATCH_UPSERT_BATCH_SIZE", "100"))
+# Local full refreshes retrieve at max(active radius, ring radius) and keep the whole scored pool,
+# so a later radius change inside that ring is a single SQL rewrite instead of a new retrieval.
+RING_RADIUS_KM = float(os.getenv("PRECOMPUTE_MATCH_RING_RADIUS_KM", "100"))
+RING_POOL_LIMIT = int(os.getenv("PRECOMPUTE_MATCH_RING_POOL_LIMIT", "1500"))
+# Progressive first build: publish the top few matches by similarity before the full pool is done.
+FIRST_POOL_LIMIT = int(os.getenv("PRECOMPUTE_MATCH_FIRST_POOL_LIMIT", "50"))
+RING_POOL_MAX_AGE_HOURS = float(os.getenv("PRECOMPUTE_MATCH_RING_MAX_AGE_HOURS", "24"))
+# "ann" queries the vector index per user; "neighbors" seeds from the job neighbour graph of the
+# user's current top matches and never touches the index.
+INCREMENTAL_SOURCE = os.getenv("PRECOMPUTE_MATCH_INCREMENTAL_SOURCE", "ann").strip().lower()
+NEIGHBOR_SEED_LIMIT = int(os.getenv("PRECOMPUTE_MATCH_NEIGHBOR_SEED_LIMIT", "50"))
+MULTI_VECTOR_RETRIEVAL = os.getenv("PRECOMPUTE_MATCH_MULTI_VECTOR", "true").lower() in ("1", "true", "yes", "y", "on")
+
+# Weighted max-sim: a job's similarity is max(weight * cosine) over every vector the candidate has.
+# Override with PRECOMPUTE_MATCH_VECTOR_WEIGHTS="persona_target_vector=1.0,wish_vector=0.8" (0 disables a vector).
+DEFAULT_VECTOR_WEIGHTS = {
+    "profile_vector": 1.0,
+    "persona_current_vector": 1.0,
+    "persona_target_vector": 0.95,
+    "wish_vector": 0.9,
+}
 
 KEYWORD_PATTERNS = [
     re.compile(r"\b(JavaScript|TypeScript|Python|Java|C\+\+|C#|Ruby|PHP|Swift|Kotlin|Go|Rust)\b", re.I),
@@ -43,6 +65,26 @@ KEYWORD_PATTERNS = [
 CAPITALIZED_PATTERN = re.compile(r"\b[A-ZÅÄÖ][a-zA-ZÅÄÖåäö0-9.+#-]{2,}\b")
 MAX_KEYWORDS = 12
 
+RETRIEVAL_STATS = {"rpc_calls": 0, "rows": 0, "seconds": 0.0}
+
+
+def parse_vector_weights(raw: str) -> dict[str, float]:
+    weights: dict[str, float] = {}
+    for part in (raw or "").split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if not name or name not in DEFAULT_VECTOR_WEIGHTS:
+            continue
+        try:
+            weights[name] = float(value)
+        except ValueError:
+            continue
+    return weights
+
+
+VECTOR_WEIGHTS = {**DEFAULT_VECTOR_WEIGHTS, **parse_vector_weights(os.getenv("PRECOMPUTE_MATCH_VECTOR_WEIGHTS", ""))}
+PROFILE_VECTOR_COLUMNS = ",".join(name for name in DEFAULT_VECTOR_WEIGHTS if name != "profile_vector")
+
 
 def has_vector_value(value) -> bool:
     if isinstance(value, list):
@@ -59,6 +101,15 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--user-id", type=str, default=None, help="Only process one user")
     parser.add_argument("--limit-users", type=int, default=None, help="Stop after processing this many users")
     parser.add_argument("--scope", choices=["auto", "local", "national"], default="auto")
+    parser.add_argument("--progressive", action="store_true", help="Publish a small first page of matches before the full pool")
+    parser.add_argument("--radius-km", type=float, default=None, help="Apply a new local radius, from the stored ring pool when it covers it")
+    parser.add_argument(
+        "--benchmark-retrieval",
+        type=int,
+        default=0,
+        metavar="REPEATS",
+        help="Time single-vector, per-vector and multi-vector retrieval for the selected users instead of refreshing",
+    )
     return parser
 
 
@@ -129,9 +180,141 @@ def compute_profile_signature(profile: dict) -> str:
         "location_lon": profile.get("location_lon"),
         "commute_radius_km": profile.get("commute_radius_km"),
     }
+    extra_vectors = {
+        vector["name"]: vector["vector"]
+        for vector in build_retrieval_vectors(profile)
+        if vector["name"] != "profile_vector"
+    }
+    if extra_vectors:
+        payload["retrieval_vectors"] = extra_vectors
     return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=True).encode("utf-8")).hexdigest()
 
 
+def to_vector_literal(value) -> str:
+    if isinstance(value, list):
+        return "[" + ",".join(str(float(x)) for x in value) + "]"
+    return str(value).strip()
+
+
+def build_retrieval_vectors(profile: dict) -> list[dict]:
+    if not MULTI_VECTOR_RETRIEVAL:
+        return []
+    vectors: list[dict] = []
+    for name, weight in VECTOR_WEIGHTS.items():
+        if weight <= 0 or not has_vector_value(profile.get(name)):
+            continue
+        vectors.append({"name": name, "vector": to_vector_literal(profile[name]), "weight": weight})
+    return vectors
+
+
+def fetch_semantic_pool(
+    profile: dict,
+    match_scope: str,
+    radius_km: float | None,
+    limit_count: int,
+    seen_after: str | None = None,
+) -> list[dict]:
+    """
+    One retrieval round trip per user and scope. Candidates with more than one vector
+    (persona/wish) use the weighted max-sim RPC; everyone else keeps the single-vector RPCs.
+    """
+    vectors = build_retrieval_vectors(profile)
+    started = time.perf_counter()
+
+    if len(vectors) > 1:
+        local = match_scope != "national"
+        response = supabase.rpc(
+            "fetch_candidate_semantic_pool_multi",
+            {
+                "candidate_vectors": vectors,
+                "candidate_lat": profile.get("location_lat") if local else None,
+                "candidate_lon": profile.get("location_lon") if local else None,
+                "radius_km": radius_km if local else None,
+                "seen_after": seen_after,
+                "limit_count": limit_count,
+            },
+        ).execute()
+    elif match_scope == "national" and seen_after:
+        response = supabase.rpc(
+            "fetch_recent_candidate_semantic_pool_national",
+            {
+                "candidate_vector": profile["profile_vector"],
+                "seen_after": seen_after,
+                "limit_count": limit_count,
+            },
+        ).execute()
+    elif match_scope == "national":
+        response = supabase.rpc(
+            "fetch_candidate_semantic_pool_national",
+            {
+                "candidate_vector": profile["profile_vector"],
+                "limit_count": limit_count,
+            },
+        ).execute()
+    elif seen_after:
+        response = supabase.rpc(
+            "fetch_recent_candidate_semantic_pool",
+            {
+                "candidate_vector": profile["profile_vector"],
+                "seen_after": seen_after,
+                "candidate_lat": profile.get("location_lat"),
+                "candidate_lon": profile.get("location_lon"),
+                "radius_km": radius_km,
+                "limit_count": limit_count,
+            },
+        ).execute()
+    else:
+        response = supabase.rpc(
+            "fetch_candidate_semantic_pool",
+            {
+                "candidate_vector": profile["profile_vector"],
+                "candidate_lat": profile.get("location_lat"),
+                "candidate_lon": profile.get("location_lon"),
+                "radius_km": radius_km,
+                "limit_count": limit_count,
+            },
+        ).execute()
+
+    rows = response.data or []
+    RETRIEVAL_STATS["rpc_calls"] += 1
+    RETRIEVAL_STATS["rows"] += len(rows)
+    RETRIEVAL_STATS["seconds"] += time.perf_counter() - started
+    return rows
+
+
+def fetch_neighbor_pool(
+    profile: dict,
+    match_scope: str,
+    radius_km: float | None,
+    limit_count: int,
+    seen_after: str | None,
+) -> list[dict]:
+    local = match_scope != "national"
+    vectors = build_retrieval_vectors(profile)
+    started = time.perf_counter()
+    response = supabase.rpc(
+        "fetch_candidate_neighbor_pool",
+        {
+            "p_user_id": profile["user_id"],
+            "candidate_vector": profile["profile_vector"],
+            "p_match_scope": match_scope,
+            "seen_after": seen_after,
+            "candidate_lat": profile.get("location_lat") if local else None,
+            "candidate_lon": profile.get("location_lon") if local else None,
+            "radius_km": radius_km if local else None,
+            "seed_limit": NEIGHBOR_SEED_LIMIT,
+            "limit_count": limit_count,
+            # Same weighted max-sim as fetch_semantic_pool for persona/wish candidates
+            "candidate_vectors": vectors if len(vectors) > 1 else None,
+        },
+    ).execute()
+    rows = response.data or []
+    RETRIEVAL_STATS["rpc_calls"] += 1
+    RETRIEVAL_STATS["rows"] += len(rows)
+    RETRIEVAL_STATS["seconds"] += time.perf_counter() - started
+    return rows
+
+
 def effective_radius_km(profile: dict, state: dict | None = None) -> float | None:
     if isinstance(state, dict):
         active_radius = state.get("active_radius_km")
@@ -145,6 +328,19 @@ def effective_radius_km(profile: dict, state: dict | None = None) -> float | Non
     return None
 
 
+def ring_radius_km(radius_km: float | None) -> float | None:
+    if radius_km is None or RING_RADIUS_KM <= 0:
+        return radius_km
+    return max(radius_km, RING_RADIUS_KM)
+
+
+def within_radius(row: dict, radius_km: float | None) -> bool:
+    if radius_km is None:
+        return True
+    distance_m = row.get("distance_m")
+    return isinstance(distance_m, (int, float)) and distance_m <= radius_km * 1000.0
+
+
 def calc_distance_m(lat1, lon1, lat2, lon2):
     if not all(isinstance(v, (int, float)) for v in [lat1, lon1, lat2, lon2]):
         return None
@@ -311,6 +507,33 @@ def delete_match_rows(user_id: str, job_ids: list[str], match_scope: str) -> Non
         )
 
 
+def upsert_pool_rows(rows: list[dict]) -> None:
+    pool_rows = [{key: value for key, value in row.items() if key != "match_scope"} for row in rows]
+    for i in range(0, len(pool_rows), UPSERT_BATCH_SIZE):
+        batch = pool_rows[i:i + UPSERT_BATCH_SIZE]
+        supabase.table("candidate_match_pool").upsert(
+            batch,
+            on_conflict="user_id,job_id",
+        ).execute()
+
+
+def replace_pool_rows(user_id: str, rows: list[dict]) -> None:
+    supabase.table("candidate_match_pool").delete().eq("user_id", user_id).execute()
+    upsert_pool_rows(rows)
+
+
+def count_pool_rows_within(user_id: str, radius_km: float) -> int:
+    response = (
+        supabase.table("candidate_match_pool")
+        .select("job_id", count="exact")
+        .eq("user_id", user_id)
+        .lte("distance_m", radius_km * 1000.0)
+        .limit(1)
+        .execute()
+    )
+    return response.count or 0
+
+
 def update_match_state(user_id: str, payload: dict) -> None:
     state_payload = {
         "user_id": user_id,
@@ -340,7 +563,10 @@ def fetch_candidate_profiles(user_id: str | None = None, limit_users: int | None
     while True:
         query = (
             supabase.table("candidate_profiles")
-            .select("user_id,profile_vector,candidate_text_vector,search_keywords,category_tags,location_lat,location_lon,commute_radius_km,seniority_level")
+            .select(
+                "user_id,profile_vector,candidate_text_vector,search_keywords,category_tags,location_lat,location_lon,commute_radius_km,seniority_level,"
+                + PROFILE_VECTOR_COLUMNS
+            )
             .not_.is_("user_id", "null")
             .order("user_id")
             .limit(PROFILE_BATCH_SIZE)
@@ -390,8 +616,54 @@ def fetch_existing_matches(user_id: str, match_scope: str) -> list[dict]:
     return response.data or []
 
 
-def run_full_refresh(profile: dict, state: dict | None, latest_seen_at: str | None, match_scope: str, track_progress: bool) -> tuple[int, str]:
+def publish_first_matches(profile: dict, radius_km: float | None, match_scope: str, started_at: datetime, started: float) -> int:
+    """
+    Progressive step: a small similarity-only pool, scored and saved right away so the
+    dashboard has something to show while the full pool is still being built.
+    """
+    rows = fetch_semantic_pool(profile, match_scope, radius_km, FIRST_POOL_LIMIT)
+    scored = [score_job(profile, row, f"{match_scope}_full_refresh") for row in rows]
+    first_rows = rank_scored_rows(profile, scored)
+    upsert_match_rows(first_rows)
+
+    ready_at = datetime.now(timezone.utc)
+    time_to_first_match_ms = int((time.perf_counter() - started) * 1000)
+    update_match_state(
+        profile["user_id"],
+        {
+            "profile_signature": compute_profile_signature(profile),
+            "match_ready": True,
+            "status": "partial_ready",
+            "last_error": None,
+            "last_pool_size": len(rows),
+            "saved_job_count": len(first_rows),
+            "active_radius_km": radius_km,
+            "candidate_lat": profile.get("location_lat"),
+            "candidate_lon": profile.get("location_lon"),
+            "precompute_started_at": started_at.isoformat(),
+            "first_match_ready_at": ready_at.isoformat(),
+            "time_to_first_match_ms": time_to_first_match_ms,
+        },
+    )
+    print(
+        f"⚡ [MATCH PRECOMPUTE] user={profile['user_id']} partial_ready saved={len(first_rows)} time_to_first_match_ms={time_to_first_match_ms}",
+        flush=True,
+    )
+    return len(first_rows)
+
+
+def run_full_refresh(
+    profile: dict,
+    state: dict | None,
+    latest_seen_at: str | None,
+    match_scope: str,
+    track_progress: bool,
+    progressive: bool = False,
+) -> tuple[int, str]:
     radius_km = effective_radius_km(profile, state)
+    started_at = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    published_count = 0
     if track_progress:
         update_match_state(
             profile["user_id"],
@@ -405,29 +677,29 @@ def run_full_refresh(profile: dict, state: dict | None, latest_seen_at: str | No
                 "active_radius_km": radius_km,
                 "candidate_lat": profile.get("location_lat"),
                 "candidate_lon": profile.get("location_lon"),
+                "precompute_started_at": started_at.isoformat(),
             },
         )
-
-    if match_scope == "national":
-        response = supabase.rpc(
-            "fetch_candidate_semantic_pool_national",
-            {
-                "candidate_vector": profile["profile_vector"],
-                "limit_count": NATIONAL_RETRIEVAL_POOL_LIMIT,
-            },
-        ).execute()
+        if progressive and FIRST_POOL_LIMIT > 0:
+            published_count = publish_first_matches(profile, radius_km, match_scope, started_at, started)
+
+    pool_radius_km = ring_radius_km(radius_km) if match_scope == "local" else None
+    if pool_radius_km is not None:
+        # One ring retrieval; the active radius is a distance filter on it. A ring pool that hit
+        # RING_POOL_LIMIT holds the best jobs inside the radius only if it has RETRIEVAL_POOL_LIMIT
+        # of them there; otherwise far-away jobs crowded local ones out, so query the radius too.
+        pool_rows = fetch_semantic_pool(profile, match_scope, pool_radius_km, RING_POOL_LIMIT)
+        rows = [row for row in pool_rows if within_radius(row, radius_km)]
+        if len(pool_rows) >= RING_POOL_LIMIT and len(rows) < RETRIEVAL_POOL_LIMIT:
+            rows = fetch_semantic_pool(profile, match_scope, radius_km, RETRIEVAL_POOL_LIMIT)
     else:
-        response = supabase.rpc(
-            "fetch_candidate_semantic_pool",
-            {
-                "candidate_vector": profile["profile_vector"],
-                "candidate_lat": profile.get("location_lat"),
-                "candidate_lon": profile.get("location_lon"),
-                "radius_km": radius_km,
-                "limit_count": RETRIEVAL_POOL_LIMIT,
-            },
-        ).execute()
-    rows = response.data or []
+        pool_rows = []
+        rows = fetch_semantic_pool(
+            profile,
+            match_scope,
+            radius_km,
+            NATIONAL_RETRIEVAL_POOL_LIMIT if match_scope == "national" else RETRIEVAL_POOL_LIMIT,
+        )
     if track_progress:
         update_match_state(
             profile["user_id"],
@@ -437,7 +709,7 @@ def run_full_refresh(profile: dict, state: dict | None, latest_seen_at: str | No
                 "status": "semantic_pool_ready",
                 "last_error": None,
                 "last_pool_size": len(rows),
-                "saved_job_count": 0,
+                "saved_job_count": published_count,
                 "active_radius_km": radius_km,
                 "candidate_lat": profile.get("location_lat"),
                 "candidate_lon": profile.get("location_lon"),
@@ -445,6 +717,18 @@ def run_full_refresh(profile: dict, state: dict | None, latest_seen_at: str | No
         )
 
     scored = [score_job(profile, row, f"{match_scope}_full_refresh") for row in rows]
+    if pool_radius_km is not None:
+        scored_ids = {str(row["job_id"]) for row in scored}
+        replace_pool_rows(
+            profile["user_id"],
+            scored
+            + [
+                score_job(profile, row, f"{match_scope}_full_refresh")
+                for row in pool_rows
+                if str(row.get("id")) not in scored_ids
+            ],
+        )
+        scored = [row for row in scored if within_radius(row, radius_km)]
     ranked_rows = rank_scored_rows(profile, scored)
     top_rows = ranked_rows[:SAVED_MATCH_LIMIT]
     top_ids = [row["job_id"] for row in top_rows]
@@ -458,7 +742,7 @@ def run_full_refresh(profile: dict, state: dict | None, latest_seen_at: str | No
                 "status": "saving_matches",
                 "last_error": None,
                 "last_pool_size": len(rows),
-                "saved_job_count": 0,
+                "saved_job_count": published_count,
                 "active_radius_km": radius_km,
                 "candidate_lat": profile.get("location_lat"),
                 "candidate_lon": profile.get("location_lon"),
@@ -483,9 +767,27 @@ def run_full_refresh(profile: dict, state: dict | None, latest_seen_at: str | No
                 "last_job_ingest_seen_at": latest_seen_at,
                 "last_pool_size": len(rows),
                 "saved_job_count": len(top_rows),
+                **(
+                    {
+                        "first_match_ready_at": datetime.now(timezone.utc).isoformat(),
+                        "time_to_first_match_ms": int((time.perf_counter() - started) * 1000),
+                    }
+                    if not published_count and not (state or {}).get("first_match_ready_at")
+                    else {}
+                ),
                 "active_radius_km": radius_km,
                 "candidate_lat": profile.get("location_lat"),
                 "candidate_lon": profile.get("location_lon"),
+                **(
+                    {
+                        "pool_radius_km": pool_radius_km,
+                        "pool_size": len(pool_rows),
+                        "pool_truncated": len(pool_rows) >= RING_POOL_LIMIT,
+                        "pool_built_at": datetime.now(timezone.utc).isoformat(),
+                    }
+                    if pool_radius_km is not None
+                    else {}
+                ),
             },
         )
     return len(top_rows), f"{match_scope}_full"
@@ -510,28 +812,17 @@ def run_incremental_refresh(profile: dict, state: dict, latest_seen_at: str | No
             )
         return 0, f"{match_scope}_noop"
 
-    if match_scope == "national":
-        response = supabase.rpc(
-            "fetch_recent_candidate_semantic_pool_national",
-            {
-                "candidate_vector": profile["profile_vector"],
-                "seen_after": seen_after,
-                "limit_count": NATIONAL_INCREMENTAL_INSERT_LIMIT,
-            },
-        ).execute()
-    else:
-        response = supabase.rpc(
-            "fetch_recent_candidate_semantic_pool",
-            {
-                "candidate_vector": profile["profile_vector"],
-                "seen_after": seen_after,
-                "candidate_lat": profile.get("location_lat"),
-                "candidate_lon": profile.get("location_lon"),
-                "radius_km": radius_km,
-                "limit_count": INCREMENTAL_INSERT_LIMIT,
-            },
-        ).execute()
-    rows = response.data or []
+    pool_radius_km = None
+    if match_scope == "local" and state.get("pool_built_at") and isinstance(state.get("pool_radius_km"), (int, float)):
+        pool_radius_km = max(float(state["pool_radius_km"]), radius_km or 0.0)
+    pool_fetcher = fetch_neighbor_pool if INCREMENTAL_SOURCE == "neighbors" else fetch_semantic_pool
+    rows = pool_fetcher(
+        profile,
+        match_scope,
+        pool_radius_km if pool_radius_km is not None else radius_km,
+        NATIONAL_INCREMENTAL_INSERT_LIMIT if match_scope == "national" else RING_POOL_LIMIT if pool_radius_km is not None else INCREMENTAL_INSERT_LIMIT,
+        seen_after=seen_after,
+    )
     if track_progress:
         update_match_state(
             profile["user_id"],
@@ -548,6 +839,9 @@ def run_incremental_refresh(profile: dict, state: dict, latest_seen_at: str | No
             },
         )
     scored = [score_job(profile, row, f"{match_scope}_incremental_refresh") for row in rows]
+    if pool_radius_km is not None:
+        upsert_pool_rows(scored)
+        scored = [row for row in scored if within_radius(row, radius_km)]
     ranked_rows = rank_scored_rows(profile, scored)
     scope_incremental_limit = NATIONAL_INCREMENTAL_INSERT_LIMIT if match_scope == "national" else INCREMENTAL_INSERT_LIMIT
     top_incremental = ranked_rows[:scope_incremental_limit]
@@ -596,11 +890,72 @@ def run_incremental_refresh(profile: dict, state: dict, latest_seen_at: str | No
                 "active_radius_km": radius_km,
                 "candidate_lat": profile.get("location_lat"),
                 "candidate_lon": profile.get("location_lon"),
+                **({"pool_truncated": True} if pool_radius_km is not None and len(rows) >= RING_POOL_LIMIT else {}),
             },
         )
     return len(top_incremental), f"{match_scope}_incremental"
 
 
+def pool_covers_radius(profile: dict, state: dict | None, radius_km: float | None) -> bool:
+    if not state or radius_km is None:
+        return False
+    pool_radius_km = state.get("pool_radius_km")
+    pool_built_at = state.get("pool_built_at")
+    if not isinstance(pool_radius_km, (int, float)) or not pool_built_at:
+        return False
+    if radius_km > float(pool_radius_km):
+        return False
+    if state.get("pool_truncated") is None:
+        return False
+    if state["pool_truncated"] and count_pool_rows_within(profile["user_id"], radius_km) < RETRIEVAL_POOL_LIMIT:
+        # A pool cut at RING_POOL_LIMIT holds the top jobs inside radius_km only as far as it
+        # reaches there; with fewer than a retrieval's worth, better ones may lie below the cut.
+        return False
+    if state.get("profile_signature") != compute_profile_signature(profile):
+        return False
+    try:
+        built_at = datetime.fromisoformat(str(pool_built_at).replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    age_hours = (datetime.now(timezone.utc) - built_at).total_seconds() / 3600
+    return age_hours <= RING_POOL_MAX_AGE_HOURS
+
+
+def run_radius_refresh(profile: dict, state: dict, radius_km: float, latest_seen_at: str | None) -> tuple[int, str]:
+    """
+    Answer a radius change from the stored ring pool: one SQL statement rewrites the
+    local matches, no retrieval or rescoring. New jobs since the pool was built are
+    picked up by the following incremental run.
+    """
+    response = supabase.rpc(
+        "apply_candidate_match_radius",
+        {
+            "p_user_id": profile["user_id"],
+            "p_radius_km": radius_km,
+            "p_limit": SAVED_MATCH_LIMIT,
+        },
+    ).execute()
+    saved_count = response.data if isinstance(response.data, int) else 0
+    update_match_state(
+        profile["user_id"],
+        {
+            "profile_signature": compute_profile_signature(profile),
+            "match_ready": True,
+            "status": "success",
+            "last_error": None,
+            "last_pool_size": state.get("pool_size") if isinstance(state.get("pool_size"), int) else 0,
+            "saved_job_count": saved_count,
+            "active_radius_km": radius_km,
+            "candidate_lat": profile.get("location_lat"),
+            "candidate_lon": profile.get("location_lon"),
+        },
+    )
+    if latest_seen_at and state.get("last_job_ingest_seen_at") and latest_seen_at > state["last_job_ingest_seen_at"]:
+        affected, _ = run_incremental_refresh(profile, {**state, "active_radius_km": radius_km}, latest_seen_at, "local", True)
+        saved_count += affected
+    return saved_count, "local_radius"
+
+
 def should_run_full_refresh(profile: dict, state: dict | None, mode: str, match_scope: str) -> bool:
     if mode == "full":
         return True
@@ -623,7 +978,15 @@ def should_run_full_refresh(profile: dict, state: dict | None, mode: str, match_
     return len(existing_matches) == 0
 
 
-def process_scope(profile: dict, state: dict | None, mode: str, latest_seen_at: str | None, match_scope: str, track_progress: bool) -> tuple[int, str]:
+def process_scope(
+    profile: dict,
+    state: dict | None,
+    mode: str,
+    latest_seen_at: str | None,
+    match_scope: str,
+    track_progress: bool,
+    progressive: bool = False,
+) -> tuple[int, str]:
     radius_km = effective_radius_km(profile, state)
     if not has_vector_value(profile.get("profile_vector")):
         if track_progress:
@@ -660,12 +1023,19 @@ def process_scope(profile: dict, state: dict | None, mode: str, latest_seen_at:
         )
 
     if should_run_full_refresh(profile, state, mode, match_scope):
-        return run_full_refresh(profile, state, latest_seen_at, match_scope, track_progress)
+        return run_full_refresh(profile, state, latest_seen_at, match_scope, track_progress, progressive=progressive)
     return run_incremental_refresh(profile, state or {}, latest_seen_at, match_scope, track_progress)
 
 
-def run_precomputed_match_refresh(mode: str = "auto", user_id: str | None = None, limit_users: int | None = None, scope: str = "auto") -> None:
-    print(f"🧠 [MATCH PRECOMPUTE] Starting refresh mode={mode} scope={scope} user_id={user_id or '-'}")
+def run_precomputed_match_refresh(
+    mode: str = "auto",
+    user_id: str | None = None,
+    limit_users: int | None = None,
+    scope: str = "auto",
+    radius_km: float | None = None,
+    progressive: bool = False,
+) -> None:
+    print(f"🧠 [MATCH PRECOMPUTE] Starting refresh mode={mode} scope={scope} user_id={user_id or '-'} radius_km={radius_km or '-'}")
     profiles = fetch_candidate_profiles(user_id=user_id, limit_users=limit_users)
     if not profiles:
         print("ℹ️ [MATCH PRECOMPUTE] No candidate profiles found.")
@@ -678,6 +1048,7 @@ def run_precomputed_match_refresh(mode: str = "auto", user_id: str | None = None
     processed = 0
     full_runs = 0
     incremental_runs = 0
+    radius_runs = 0
     skipped = 0
 
     for profile in profiles:
@@ -687,19 +1058,31 @@ def run_precomputed_match_refresh(mode: str = "auto", user_id: str | None = None
         try:
             scopes = ["local", "national"] if scope == "auto" else [scope]
             for current_scope in scopes:
-                affected, run_kind = process_scope(
-                    profile,
-                    state_map.get(profile_user_id),
-                    mode,
-                    latest_seen_at,
-                    current_scope,
-                    current_scope == "local",
-                )
+                state = state_map.get(profile_user_id)
+                if (
+                    current_scope == "local"
+                    and radius_km is not None
+                    and mode != "incremental"
+                    and pool_covers_radius(profile, state, radius_km)
+                ):
+                    affected, run_kind = run_radius_refresh(profile, state, radius_km, latest_seen_at)
+                else:
+                    affected, run_kind = process_scope(
+                        profile,
+                        state,
+                        mode,
+                        latest_seen_at,
+                        current_scope,
+                        current_scope == "local",
+                        progressive=progressive,
+                    )
                 processed += 1
                 if run_kind.endswith("full"):
                     full_runs += 1
                 elif run_kind.endswith("incremental"):
                     incremental_runs += 1
+                elif run_kind.endswith("radius"):
+                    radius_runs += 1
                 else:
                     skipped += 1
 
@@ -723,14 +1106,69 @@ def run_precomputed_match_refresh(mode: str = "auto", user_id: str | None = None
             print(f"❌ [MATCH PRECOMPUTE] user={profile_user_id} failed: {exc}", flush=True)
 
     print(
-        f"✅ [MATCH PRECOMPUTE] finished processed={processed} full={full_runs} incremental={incremental_runs} skipped={skipped}",
+        f"✅ [MATCH PRECOMPUTE] finished processed={processed} full={full_runs} incremental={incremental_runs} radius={radius_runs} skipped={skipped} "
+        f"retrieval_rpcs={RETRIEVAL_STATS['rpc_calls']} retrieval_s={RETRIEVAL_STATS['seconds']:.2f}",
         flush=True,
     )
 
 
+def benchmark_retrieval(user_id: str | None = None, limit_users: int | None = None, repeats: int = 3) -> None:
+    """
+    Compare retrieval cost per user for the local scope:
+      single     = profile_vector only (previous behavior)
+      per_vector = one pool query per candidate vector (the approach multi-vector replaces)
+      multi      = one weighted max-sim query over all vectors
+    """
+    profiles = [
+        profile
+        for profile in fetch_candidate_profiles(user_id=user_id, limit_users=limit_users)
+        if has_vector_value(profile.get("profile_vector"))
+    ]
+    if not profiles:
+        print("ℹ️ [MATCH BENCHMARK] No candidate profiles with vectors found.")
+        return
+
+    totals = {"single": [0, 0.0], "per_vector": [0, 0.0], "multi": [0, 0.0]}
+    for profile in profiles:
+        vectors = build_retrieval_vectors(profile)
+        radius_km = effective_radius_km(profile)
+        for _ in range(max(1, repeats)):
+            for kind in totals:
+                calls_before = RETRIEVAL_STATS["rpc_calls"]
+                started = time.perf_counter()
+                if kind == "single":
+                    fetch_semantic_pool({**profile, **{name: None for name in DEFAULT_VECTOR_WEIGHTS if name != "profile_vector"}}, "local", radius_km, RETRIEVAL_POOL_LIMIT)
+                elif kind == "per_vector":
+                    for vector in vectors or [{"name": "profile_vector", "vector": profile["profile_vector"]}]:
+                        fetch_semantic_pool({"profile_vector": vector["vector"], "location_lat": profile.get("location_lat"), "location_lon": profile.get("location_lon")}, "local", radius_km, RETRIEVAL_POOL_LIMIT)
+                else:
+                    fetch_semantic_pool(profile, "local", radius_km, RETRIEVAL_POOL_LIMIT)
+                totals[kind][0] += RETRIEVAL_STATS["rpc_calls"] - calls_before
+                totals[kind][1] += time.perf_counter() - started
+
+        print(f"   user={profile['user_id']} vectors={len(vectors) or 1}", flush=True)
+
+    runs = len(profiles) * max(1, repeats)
+    for kind, (calls, seconds) in totals.items():
+        print(
+            f"📊 [MATCH BENCHMARK] {kind:<10} rpcs/user={calls / runs:.2f} ms/user={1000 * seconds / runs:.1f}",
+            flush=True,
+        )
+
+
 def main() -> None:
     args = build_parser().parse_args()
-    run_precomputed_match_refresh(mode=args.mode, user_id=args.user_id, limit_users=args.limit_users, scope=args.scope)
+    if args.benchmark_retrieval:
+        benchmark_retrieval(user_id=args.user_id, limit_users=args.limit_users, repeats=args.benchmark_retrieval)
+        return
+    run_precomputed_match_refresh(
+        mode=args.mode,
+        user_id=args.user_id,
+        limit_users=args.limit_users,
+        scope=args.scope,
+        radius_km=args.radius_km,
+        progressive=args.progressive,
+    )
 
 
 if __name__ == "__main__":
@@ -7,8 +7,9 @@ import httpx
 import math
 from datetime import datetime, timezone, timedelta
 from contextlib import asynccontextmanager
-from threading import Thread
+from threading import Lock, Thread
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from supabase import create_client, Client
 from dotenv import load_dotenv
@@ -19,11 +20,18 @@ from scripts.update_jobs import run_job_update
 from scripts.enrich_jobs import enrich_job_vectors
 from scripts.geocode_jobs import geocode_new_jobs
 from scripts.sync_active_jobs import clean_stale_jobs  # removes stale jobs
+from scripts.jobtech_stream import run_jobstream_poll
+from scripts.contact_page_crawler import run_contact_crawl_job
 from scripts.precompute_candidate_matches import run_precomputed_match_refresh
+from scripts.job_neighbors import fetch_related_jobs
+from scripts.granite_skill_extractor import SkillExtractor
+from scripts.embedding_backends import PRIORITY_INTERACTIVE, PRIORITY_PROFILE, EmbeddingRouter, embedding_scheduler
+from scripts.candidate_index import candidate_index, find_candidates_for_job
 from scripts.generate_candidate_vector import (
     build_candidate_vector,  # chunking inside
     compute_category_tags_from_text,
     compute_occupation_fields,
+    embedding_backend,
 )
 import json
 
@@ -33,8 +41,6 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
-# /embed endpoint only (simple legacy helper)
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434/api/embeddings")
 OLLAMA_GENERATE_URL = os.getenv("OLLAMA_GENERATE_URL", "http://ollama:11434/api/generate")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
 CATEGORIZATION_MODEL = os.getenv("CATEGORIZATION_MODEL", "llama3.2:3b")
@@ -46,6 +52,17 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 SCRIPT_DIR = Path(__file__).resolve().parent
 LAST_RUN_FILE = SCRIPT_DIR / "last_run.json"
 STALE_PIPELINE_THRESHOLD_HOURS = int(os.getenv("STALE_PIPELINE_THRESHOLD_HOURS", "18"))
+# JobStream change feed replaces the nightly 120-day id scan and /search poll when enabled
+JOBSTREAM_ENABLED = os.getenv("JOBSTREAM_ENABLED", "false").lower() in ("1", "true", "yes", "y", "on")
+JOBSTREAM_POLL_MINUTES = int(os.getenv("JOBSTREAM_POLL_MINUTES", "5"))
+# Employer contact pages are crawled outside the ingest loop; 0 disables the interval run
+CONTACT_CRAWL_INTERVAL_MINUTES = int(os.getenv("CONTACT_CRAWL_INTERVAL_MINUTES", "15"))
+CANDIDATE_INDEX_ENABLED = os.getenv("CANDIDATE_INDEX_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+CANDIDATE_INDEX_REFRESH_MINUTES = int(os.getenv("CANDIDATE_INDEX_REFRESH_MINUTES", "15"))
+# EMBEDDING_BACKEND=pool: probe every member so cooled-down ones come back without a user request; 0 disables
+EMBEDDING_HEALTH_CHECK_MINUTES = int(os.getenv("EMBEDDING_HEALTH_CHECK_MINUTES", "1"))
+# Shared with the batch extractor: same Ollama concurrency cap and description-hash cache
+skill_extractor = SkillExtractor(model=CATEGORIZATION_MODEL)
 
 # --- Helper: Normalization (only used by /embed endpoint) ---
 def normalize_vector(vector: list[float]) -> list[float]:
@@ -56,40 +73,46 @@ def normalize_vector(vector: list[float]) -> list[float]:
         return [0.0] * len(vector)
     return [x / magnitude for x in vector]
 
-# --- Helper: Simple Ollama Call (For /embed endpoint only) ---
+# --- Helper: Simple embedding call (For /embed endpoint only) ---
 async def fetch_simple_embedding(text: str):
     """Legacy helper for the simple /embed endpoint"""
     if not text or not text.strip():
         return {"vector": None}
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            response = await client.post(
-                OLLAMA_URL,
-                json={"model": EMBEDDING_MODEL, "prompt": text},
-            )
-            response.raise_for_status()
-            data = response.json()
-            embedding = data.get("embedding")
+    try:
+        embedding = (await embedding_backend.embed([text], priority=PRIORITY_INTERACTIVE))[0]
+    except ValueError:
+        return {"vector": None}
+    except (httpx.HTTPError, RuntimeError) as e:
+        print(f"❌ Embedding backend error: {e}")
+        raise HTTPException(503, "Embedding service unavailable")
 
-            if not embedding or len(embedding) != DIMS:
-                return {"vector": None}
+    return {"vector": normalize_vector(embedding)}
 
-            return {"vector": normalize_vector(embedding)}
+# --- Background Pipeline ---
+# The 04:00 run and the startup catch-up must not overlap; a second start is skipped, not queued
+_pipeline_lock = Lock()
 
-        except httpx.RequestError as e:
-            print(f"❌ Connection error to Ollama: {e}")
-            raise HTTPException(503, "Embedding service unavailable")
 
-# --- Background Pipeline ---
 def run_daily_pipeline():
+    if not _pipeline_lock.acquire(blocking=False):
+        print("ℹ️ [CRON] Daily pipeline already running; skipping.")
+        return
     print(f"🚀 [CRON] Starting daily job pipeline: {time.ctime()}")
     try:
-        # 1) Remove stale jobs first
-        clean_stale_jobs()
+        if JOBSTREAM_ENABLED:
+            # 1+2) Stream polls already keep ads and removals current; catch up once more
+            run_jobstream_poll()
+            run_job_update(fetch_new=False)
+        else:
+            # 1) Remove stale jobs first
+            clean_stale_jobs()
+
+            # 2) Fetch new/changed jobs
+            run_job_update()
 
-        # 2) Fetch new/changed jobs
-        run_job_update()
+        # 2b) Look up contact emails on employer pages for ads that had none
+        run_contact_crawl_job()
 
         # 3) Enrich jobs missing embeddings (CPU-safe script)
         asyncio.run(enrich_job_vectors())
@@ -106,6 +129,8 @@ def run_daily_pipeline():
         print("✅ [CRON] Pipeline finished successfully")
     except Exception as e:
         print(f"❌ [CRON] Pipeline failed: {e}")
+    finally:
+        _pipeline_lock.release()
 
 
 def load_last_pipeline_run() -> datetime | None:
@@ -148,17 +173,23 @@ def maybe_run_startup_catchup():
 def trigger_single_user_precompute(user_id: str):
     try:
         print(f"🧠 [MATCH PRECOMPUTE] Triggering first-build refresh for user={user_id}")
-        run_precomputed_match_refresh(mode="full", user_id=user_id, limit_users=1, scope="local")
+        run_precomputed_match_refresh(mode="full", user_id=user_id, limit_users=1, scope="local", progressive=True)
     except Exception as e:
         print(f"⚠️ [MATCH PRECOMPUTE] First-build refresh failed for user={user_id}: {e}")
 
 
-def trigger_precompute_for_user(user_id: str, mode: str = "auto", scope: str = "auto"):
+def trigger_precompute_for_user(user_id: str, mode: str = "auto", scope: str = "auto", radius_km: float | None = None):
     try:
         resolved_mode = mode if mode in {"auto", "full", "incremental"} else "auto"
         resolved_scope = scope if scope in {"auto", "local", "national"} else "auto"
-        print(f"🧠 [MATCH PRECOMPUTE] Triggering refresh for user={user_id} mode={resolved_mode} scope={resolved_scope}")
-        run_precomputed_match_refresh(mode=resolved_mode, user_id=user_id, limit_users=1, scope=resolved_scope)
+        print(f"🧠 [MATCH PRECOMPUTE] Triggering refresh for user={user_id} mode={resolved_mode} scope={resolved_scope} radius_km={radius_km or '-'}")
+        run_precomputed_match_refresh(
+            mode=resolved_mode,
+            user_id=user_id,
+            limit_users=1,
+            scope=resolved_scope,
+            radius_km=radius_km,
+        )
     except Exception as e:
         print(f"⚠️ [MATCH PRECOMPUTE] Refresh failed for user={user_id}: {e}")
 
@@ -171,9 +202,51 @@ def has_vector_value(value) -> bool:
         return bool(stripped and stripped != "[]")
     return False
 
+def refresh_candidate_index():
+    try:
+        changed = candidate_index.refresh()
+        if changed:
+            print(f"🧭 [CANDIDATE INDEX] refreshed {changed} profiles in {candidate_index.stats['last_refresh_ms']}ms")
+    except Exception as e:
+        print(f"⚠️ [CANDIDATE INDEX] Refresh failed: {e}")
+
+
+# The service's event loop; pool probes run on it so the members' HTTP clients stay on one loop
+service_loop: asyncio.AbstractEventLoop | None = None
+
+
+def embedding_pool() -> EmbeddingRouter | None:
+    backend = getattr(embedding_backend, "inner", embedding_backend)  # unwrap ScheduledBackend
+    return backend if isinstance(backend, EmbeddingRouter) else None
+
+
+def check_embedding_pool():
+    pool = embedding_pool()
+    if pool is None or service_loop is None:
+        return
+    try:
+        stats = asyncio.run_coroutine_threadsafe(pool.health_check(), service_loop).result(timeout=120)
+        unhealthy = [m["backend"] for m in stats["members"] if not m["healthy"]]
+        if unhealthy:
+            print(f"⚠️ [EMBEDDING POOL] Unhealthy members: {', '.join(unhealthy)}")
+    except Exception as e:
+        print(f"⚠️ [EMBEDDING POOL] Health check failed: {e}")
+
+
 def run_scheduler():
     print("⏰ Scheduler started. Pipeline set for 04:00 daily.")
-    schedule.every().day.at("04:00").do(run_daily_pipeline)
+    # Own thread: the nightly run takes hours and would otherwise hold up the index refresh,
+    # the pool health probe and the stream poll trigger below
+    schedule.every().day.at("04:00").do(lambda: Thread(target=run_daily_pipeline, daemon=True).start())
+    if CANDIDATE_INDEX_ENABLED:
+        schedule.every(CANDIDATE_INDEX_REFRESH_MINUTES).minutes.do(refresh_candidate_index)
+    if CONTACT_CRAWL_INTERVAL_MINUTES > 0:
+        schedule.every(CONTACT_CRAWL_INTERVAL_MINUTES).minutes.do(lambda: Thread(target=run_contact_crawl_job, daemon=True).start())
+    if EMBEDDING_HEALTH_CHECK_MINUTES > 0 and embedding_pool() is not None:
+        schedule.every(EMBEDDING_HEALTH_CHECK_MINUTES).minutes.do(check_embedding_pool)
+    if JOBSTREAM_ENABLED:
+        print(f"⏰ JobStream polling every {JOBSTREAM_POLL_MINUTES} min.")
+        schedule.every(JOBSTREAM_POLL_MINUTES).minutes.do(lambda: Thread(target=run_jobstream_poll, daemon=True).start())
     while True:
         schedule.run_pending()
         time.sleep(10)
@@ -181,12 +254,18 @@ def run_scheduler():
 # --- FastAPI App ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global service_loop
     print(f"⚡ Unified Service Starting... Model: {EMBEDDING_MODEL}")
+    service_loop = asyncio.get_running_loop()
     scheduler_thread = Thread(target=run_scheduler, daemon=True)
     scheduler_thread.start()
     catchup_thread = Thread(target=maybe_run_startup_catchup, daemon=True)
     catchup_thread.start()
+    if CANDIDATE_INDEX_ENABLED:
+        Thread(target=refresh_candidate_index, daemon=True).start()
     yield
+    await skill_extractor.close()
+    await embedding_backend.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -387,7 +466,42 @@ Return JSON only."""
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "model": EMBEDDING_MODEL, "dims": DIMS}
+    status = {"status": "ok", "model": EMBEDDING_MODEL, "dims": DIMS, "embedding_backend": embedding_backend.name}
+    pool = embedding_backend.stats()
+    if pool:
+        status["embedding_pool"] = pool
+    return status
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(embedding_scheduler.metrics_text(), media_type="text/plain; version=0.0.4")
+
+@app.get("/jobs/{job_id}/related")
+def related_jobs(job_id: str, limit: int = 10):
+    """Jobs closest to job_id, read from the precomputed neighbour graph (no vector search)."""
+    try:
+        rows = fetch_related_jobs(job_id, limit=max(1, min(limit, 50)))
+    except Exception as e:
+        raise HTTPException(500, str(e))
+    return {"job_id": job_id, "related": rows}
+
+@app.get("/jobs/{job_id}/candidates")
+def candidates_for_job(job_id: str, limit: int = 20, radius_km: float | None = None, taxonomy: bool = False):
+    """Top candidates for a job from the in-memory profile_vector index, optionally within radius_km / the job's occupation group."""
+    if not CANDIDATE_INDEX_ENABLED:
+        raise HTTPException(503, "Candidate index disabled")
+    try:
+        result = find_candidates_for_job(
+            job_id,
+            limit=max(1, min(limit, 200)),
+            radius_km=radius_km if radius_km and radius_km > 0 else None,
+            match_taxonomy=taxonomy,
+        )
+    except Exception as e:
+        raise HTTPException(500, str(e))
+    if result is None:
+        raise HTTPException(404, "Job not found")
+    return {**result, "index": candidate_index.stats}
 
 @app.post("/embed")
 async def generate_embedding(req: EmbedRequest):
@@ -859,99 +973,23 @@ async def categorize_cv(req: CVCategorizationRequest):
 async def extract_job_skills(req: JobSkillExtractionRequest):
     """
     Layer 4: The Auditor - Extract required and preferred skills from job description
-    Uses llama3.2 to extract structured skills data
+    Uses llama3.2 to extract structured skills data (shared engine: granite_skill_extractor)
     """
-    if not req.description or len(req.description.strip()) < 50:
+    skills_data = await skill_extractor.extract(req.description)
+    if not skills_data:
         return {"skills_data": {}}
 
-    # Truncate very long descriptions
-    desc_text = req.description[:3000]
-
-    prompt = f"""Extract two JSON lists from this Swedish job description:
-1. 'required_skills' - Must-have requirements (Krav, Kvalifikationer)
-2. 'preferred_skills' - Nice-to-have requirements (Meriterande)
-
-Include:
-- Technical skills (programming languages, tools, software)
-- Certifications (B-körkort, PLC, etc.)
-- Experience requirements
-- Education requirements
-- Language requirements
-
-Return ONLY valid JSON in this exact format:
-{{
-  "required_skills": ["skill1", "skill2"],
-  "preferred_skills": ["skill3", "skill4"]
-}}
-
-Job Description:
-{desc_text}
-
-Your response (JSON only):"""
-
-    try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                OLLAMA_GENERATE_URL,
-                json={
-                    "model": CATEGORIZATION_MODEL,  # Use llama3.2
-                    "prompt": prompt,
-                    "stream": False,
-                    "temperature": 0.2,
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            generated_text = data.get("response", "")
-
-            # Clean up response
-            cleaned = generated_text.strip()
-            if cleaned.startswith("```json"):
-                cleaned = cleaned[7:]
-            if cleaned.startswith("```"):
-                cleaned = cleaned[3:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
-            cleaned = cleaned.strip()
-
-            # Parse JSON
-            skills_data = json.loads(cleaned)
-
-            # Validate structure
-            if isinstance(skills_data, dict):
-                required = skills_data.get("required_skills", [])
-                preferred = skills_data.get("preferred_skills", [])
-
-                if not isinstance(required, list):
-                    required = []
-                if not isinstance(preferred, list):
-                    preferred = []
-
-                result = {
-                    "required_skills": required[:15],  # Max 15 each
-                    "preferred_skills": preferred[:15]
-                }
-
-                # Optionally save to database
-                if req.job_id:
-                    try:
-                        supabase.table("job_ads").update({
-                            "skills_data": result
-                        }).eq("id", req.job_id).execute()
-                        print(f"✅ [SKILL-EXTRACTION] Saved skills for job {req.job_id}")
-                    except Exception as e:
-                        print(f"⚠️ [SKILL-EXTRACTION] Failed to save: {e}")
-
-                return {"skills_data": result}
-
-    except json.JSONDecodeError as e:
-        print(f"⚠️ [SKILL-EXTRACTION] Failed to parse JSON: {str(e)[:100]}")
-        return {"skills_data": {}}
-    except Exception as e:
-        print(f"❌ [SKILL-EXTRACTION] Error: {e}")
-        return {"skills_data": {}}
+    # Optionally save to database
+    if req.job_id:
+        try:
+            supabase.table("job_ads").update({
+                "skills_data": skills_data
+            }).eq("id", str(req.job_id)).execute()
+            print(f"✅ [SKILL-EXTRACTION] Saved skills for job {req.job_id}")
+        except Exception as e:
+            print(f"⚠️ [SKILL-EXTRACTION] Failed to save: {e}")
 
-    return {"skills_data": {}}
+    return {"skills_data": skills_data}
 
 async def generate_persona_vectors(profile: dict) -> dict:
     """
@@ -962,14 +1000,14 @@ async def generate_persona_vectors(profile: dict) -> dict:
 
     # Generate current persona vector
     if profile.get("persona_current_text"):
-        vec = await build_candidate_vector(profile, profile["persona_current_text"])
+        vec = await build_candidate_vector(profile, profile["persona_current_text"], priority=PRIORITY_PROFILE)
         if vec:
             patch["persona_current_vector"] = vec
             print(f"✅ persona_current_vector generated ({len(vec)} dims)")
 
     # Generate target persona vector
     if profile.get("persona_target_text"):
-        vec = await build_candidate_vector(profile, profile["persona_target_text"])
+        vec = await build_candidate_vector(profile, profile["persona_target_text"], priority=PRIORITY_PROFILE)
         if vec:
             patch["persona_target_vector"] = vec
             print(f"✅ persona_target_vector generated ({len(vec)} dims)")
@@ -979,7 +1017,7 @@ async def generate_persona_vectors(profile: dict) -> dict:
         text_field = f"persona_past_{i}_text"
         vec_field = f"persona_past_{i}_vector"
         if profile.get(text_field):
-            vec = await build_candidate_vector(profile, profile[text_field])
+            vec = await build_candidate_vector(profile, profile[text_field], priority=PRIORITY_PROFILE)
             if vec:
                 patch[vec_field] = vec
                 print(f"✅ {vec_field} generated ({len(vec)} dims)")
@@ -1115,7 +1153,7 @@ async def webhook_update_profile(req: ProfileUpdateWebhook):
 
             if combined_text:
                 combined = "\n".join(combined_text)
-                vector = await build_candidate_vector(profile, combined)
+                vector = await build_candidate_vector(profile, combined, priority=PRIORITY_PROFILE)
                 if vector:
                     update_data["profile_vector"] = vector
                     print(f"✅ profile_vector (combined) generated ({len(vector)} dims)")
@@ -1134,7 +1172,7 @@ async def webhook_update_profile(req: ProfileUpdateWebhook):
         else:
             # CV upload mode - original behavior
             print("🎯 [WEBHOOK] CV upload mode - generating chunked candidate vector...")
-            vector = await build_candidate_vector(profile, cv_text)
+            vector = await build_candidate_vector(profile, cv_text, priority=PRIORITY_PROFILE)
 
             if not vector:
                 # still store has_picture
@@ -1215,6 +1253,16 @@ async def webhook_update_profile(req: ProfileUpdateWebhook):
         update_data["vector_generation_last_error"] = None
         supabase.table("candidate_profiles").update(update_data).eq("user_id", req.user_id).execute()
 
+        if CANDIDATE_INDEX_ENABLED and candidate_index.ready and "profile_vector" in update_data:
+            candidate_index.upsert_profile({
+                "user_id": req.user_id,
+                "profile_vector": update_data["profile_vector"],
+                "location_lat": profile.get("location_lat"),
+                "location_lon": profile.get("location_lon"),
+                "commute_radius_km": profile.get("commute_radius_km"),
+                "category_tags": update_data.get("category_tags") or profile.get("category_tags"),
+            })
+
         try:
             supabase.table("candidate_match_state").upsert(
                 {
@@ -1338,7 +1386,14 @@ async def webhook_precompute_matches(req: MatchPrecomputeWebhook):
 
         Thread(
             target=trigger_precompute_for_user,
-            args=(req.user_id, req.mode, req.scope),
+            args=(
+                req.user_id,
+                req.mode,
+                req.scope,
+                float(req.radius_km)
+                if isinstance(req.radius_km, (int, float)) and math.isfinite(req.radius_km) and req.radius_km > 0
+                else None,
+            ),
             daemon=True,
         ).start()
 
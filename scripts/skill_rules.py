@@ -0,0 +1,256 @@
+# scripts/skill_rules.py
+"""
+Deterministic skill extraction: JobTech's structured must_have / nice_to_have fields plus a
+compiled dictionary of licences, certifications, languages, education and tools, matched
+against the Krav / Kvalifikationer / Meriterande sections of the description.
+
+extract_skills_by_rules() also returns a coverage score (share of requirement lines that
+produced at least one skill). granite_skill_extractor only asks the LLM when the result is
+thin or the coverage is low.
+"""
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from scripts.job_text import clean_text_preserve_newlines, sectionize_text
+except ModuleNotFoundError:
+    from job_text import clean_text_preserve_newlines, sectionize_text
+
+RULE_MIN_SKILLS = int(os.getenv("SKILL_RULES_MIN_SKILLS", "3"))
+RULE_MIN_COVERAGE = float(os.getenv("SKILL_RULES_MIN_COVERAGE", "0.5"))
+MAX_SKILLS = 15
+
+REQUIRED_SECTIONS = ("krav", "kvalifikationer", "kompetens", "profil")
+PREFERRED_SECTIONS = ("meriterande",)
+# Lines outside a Meriterande heading that still describe a nice-to-have.
+PREFERRED_LINE = re.compile(r"meriterande|meriterar|är ett plus|är en fördel|önskvärt|gärna", re.I)
+
+# (label, pattern). Patterns are matched case-insensitively on word boundaries.
+SKILL_DICTIONARY: List[Tuple[str, str]] = [
+    # Driving licences and vehicle permits
+    ("B-körkort", r"b[- ]?körkort|körkort\s*(?:behörighet|klass)?\s*b\b|b[- ]?behörighet"),
+    ("BE-körkort", r"be[- ]?körkort|körkort\s*(?:behörighet|klass)?\s*be\b"),
+    ("C-körkort", r"c[- ]?körkort|körkort\s*(?:behörighet|klass)?\s*c\b"),
+    ("CE-körkort", r"ce[- ]?körkort|körkort\s*(?:behörighet|klass)?\s*ce\b"),
+    ("D-körkort", r"d[- ]?körkort|körkort\s*(?:behörighet|klass)?\s*d\b"),
+    ("Truckkort", r"truckkort|truckkörkort|truckbehörighet|truckutbildning"),
+    ("YKB", r"ykb|yrkeskompetensbevis"),
+    ("ADR-intyg", r"adr[- ]?(?:intyg|utbildning|behörighet)|adr\b"),
+    ("Digitalt färdskrivarkort", r"förarkort|färdskrivarkort"),
+    ("Liftkort", r"liftkort|liftutbildning|skyliftsutbildning"),
+    ("Traverskort", r"traverskort|traversutbildning"),
+    ("Hjullastarbehörighet", r"hjullastar(?:behörighet|kort|utbildning)"),
+    # Safety and trade certificates
+    ("Heta arbeten", r"heta arbeten"),
+    ("Arbete på väg", r"arbete på väg|apv[- ]?(?:utbildning|1|2|3)?"),
+    ("Fallskyddsutbildning", r"fallskydd\w*"),
+    ("Säkra lyft", r"säkra lyft"),
+    ("ID06", r"id ?06"),
+    ("BAM", r"\bbam\b|bättre arbetsmiljö"),
+    ("Elbehörighet", r"elbehörighet|auktoriserad elinstallatör|elinstallatörsbehörighet|\bab[- ]?behörighet"),
+    ("ESA", r"\besa\b[- ]?(?:utbildning|instruerad|14|19)?"),
+    ("Svetscertifikat", r"svetscertifikat|svetslicens|certifierad svetsare"),
+    ("Kylcertifikat", r"kylcertifikat|f[- ]?gas"),
+    ("HLR", r"\bhlr\b|hjärt-?lungräddning"),
+    ("Delegering", r"delegering(?:ar)? (?:för|av) läkemedel|läkemedelsdelegering"),
+    ("Belastningsregisterutdrag", r"belastningsregist\w*"),
+    ("Säkerhetsprövning", r"säkerhetsprövning|säkerhetsklass\w*"),
+    # Legitimations and professional education
+    ("Legitimerad sjuksköterska", r"legitimerad sjuksköterska|sjuksköterskelegitimation"),
+    ("Läkarlegitimation", r"legitimerad läkare|läkarlegitimation"),
+    ("Lärarlegitimation", r"lärarlegitimation|legitimerad lärare"),
+    ("Förskollärarlegitimation", r"förskollärarlegitimation|legitimerad förskollärare"),
+    ("Undersköterskeutbildning", r"undersköterskeutbildning|utbildad undersköterska|undersköterskeexamen|yrkestitel(?:n)? undersköterska"),
+    ("Barnskötarutbildning", r"barnskötarutbildning|utbildad barnskötare"),
+    ("Gymnasieexamen", r"gymnasieexamen|gymnasieutbildning|gymnasiekompetens|fullständig(?:a)? gymnasie\w*"),
+    ("Eftergymnasial utbildning", r"eftergymnasial\w* utbildning"),
+    ("Högskoleutbildning", r"högskoleutbildning|högskoleexamen|universitetsutbildning|universitetsexamen|akademisk examen|kandidatexamen|masterexamen"),
+    ("Civilingenjörsexamen", r"civilingenjör\w*"),
+    ("YH-utbildning", r"\byh[- ]?utbildning|yrkeshögskol\w*"),
+    # Languages
+    ("Svenska", r"svenska (?:i tal och skrift|språket|flytande)|flytande svenska|goda kunskaper i svenska|behärskar svenska|svenska i tal"),
+    ("Engelska", r"engelska (?:i tal och skrift|flytande)|flytande engelska|goda kunskaper i engelska|behärskar engelska|engelska i tal"),
+    ("Tyska", r"tyska i tal|flytande tyska|kunskaper i tyska"),
+    ("Finska", r"finska i tal|flytande finska|kunskaper i finska"),
+    ("Arabiska", r"arabiska i tal|kunskaper i arabiska"),
+    # Software development
+    ("Python", r"python"),
+    ("Java", r"java(?!script)"),
+    ("JavaScript", r"javascript|\bjs\b"),
+    ("TypeScript", r"typescript"),
+    ("C#", r"c#|c sharp"),
+    ("C++", r"c\+\+"),
+    (".NET", r"\.net\b|dotnet|asp\.net"),
+    ("Go", r"golang"),
+    ("Rust", r"rust"),
+    ("PHP", r"\bphp\b"),
+    ("Kotlin", r"kotlin"),
+    ("Swift", r"\bswift\b"),
+    ("SQL", r"\bsql\b|t-sql|pl/sql"),
+    ("PostgreSQL", r"postgres(?:ql)?"),
+    ("React", r"react(?:\.js|js)?\b"),
+    ("Angular", r"angular"),
+    ("Vue", r"vue(?:\.js)?\b"),
+    ("Node.js", r"node(?:\.js|js)\b"),
+    ("Docker", r"docker"),
+    ("Kubernetes", r"kubernetes|\bk8s\b"),
+    ("AWS", r"\baws\b|amazon web services"),
+    ("Azure", r"azure"),
+    ("GCP", r"\bgcp\b|google cloud"),
+    ("Linux", r"linux"),
+    ("Git", r"\bgit\b|github|gitlab"),
+    ("CI/CD", r"ci/cd|continuous integration"),
+    ("Terraform", r"terraform"),
+    # Business systems and office tools
+    ("SAP", r"\bsap\b"),
+    ("Microsoft Dynamics", r"dynamics 365|microsoft dynamics|navision|\bd365\b"),
+    ("Visma", r"visma"),
+    ("Fortnox", r"fortnox"),
+    ("Salesforce", r"salesforce"),
+    ("Excel", r"excel"),
+    ("Office 365", r"office ?365|microsoft 365|ms office|officepaketet"),
+    ("Power BI", r"power ?bi"),
+    ("Jira", r"\bjira\b"),
+    # Engineering, design and production
+    ("AutoCAD", r"autocad"),
+    ("Revit", r"\brevit\b"),
+    ("SolidWorks", r"solidworks"),
+    ("CATIA", r"\bcatia\b"),
+    ("Inventor", r"autodesk inventor|\binventor\b"),
+    ("PLC-programmering", r"\bplc\b|tia portal|siemens step ?7"),
+    ("CNC", r"\bcnc\b"),
+    ("Figma", r"figma"),
+    ("Adobe Photoshop", r"photoshop"),
+    ("Adobe Illustrator", r"illustrator"),
+    ("Adobe InDesign", r"indesign"),
+    # Healthcare and social care systems
+    ("Cosmic", r"\bcosmic\b"),
+    # One word, or two words only next to journal context: "we take care of" is English prose.
+    ("TakeCare", r"takecare|take care(?=[ -]?journal)"),
+    ("Procapita", r"procapita"),
+    ("Lifecare", r"lifecare"),
+]
+
+# Years of experience plus the domain ("av lagerarbete", "inom försäljning"). A bare
+# "2 års erfarenhet" is not reported: without the domain it is useless for gap comparison.
+EXPERIENCE_PATTERN = re.compile(
+    r"(?:minst|minimum|cirka|ca\.?)?\s*(\d{1,2})(?:\s*[-–]\s*\d{1,2})?\s*(?:\+\s*)?års?\s+(?:\w+\s+){0,2}erfarenhet"
+    r"\s+(av|inom|från|som)\s+((?!(?:och|samt|eller)\b)[\w/-]+(?:\s+(?!(?:och|samt|eller)\b)[\w/-]+){0,3})",
+    re.I,
+)
+
+_GROUPS = {f"s{i}": label for i, (label, _) in enumerate(SKILL_DICTIONARY)}
+SKILL_PATTERN = re.compile(
+    "|".join(f"(?P<s{i}>(?<![\\w-])(?:{pattern})(?![\\w]))" for i, (_, pattern) in enumerate(SKILL_DICTIONARY)),
+    re.I,
+)
+
+
+def match_skills(text: str) -> List[str]:
+    """Dictionary labels found in text, in order of first appearance."""
+    found: List[str] = []
+    for match in SKILL_PATTERN.finditer(text or ""):
+        label = _GROUPS[match.lastgroup]
+        if label not in found:
+            found.append(label)
+    for match in EXPERIENCE_PATTERN.finditer(text or ""):
+        label = f"{match.group(1)} års erfarenhet {match.group(2).lower()} {match.group(3).lower()}"
+        if label not in found:
+            found.append(label)
+    return found
+
+
+def _snapshot_labels(snap: dict, key: str) -> List[str]:
+    block = snap.get(key) if isinstance(snap.get(key), dict) else {}
+    labels: List[str] = []
+    for group in ("skills", "languages", "work_experiences", "education"):
+        for item in block.get(group) or []:
+            if isinstance(item, dict) and item.get("label"):
+                labels.append(str(item["label"]).strip())
+    return labels
+
+
+def _driving_licences(snap: dict) -> List[str]:
+    if not snap.get("driving_license_required"):
+        return []
+    licences = [
+        f"{item['label'].strip()}-körkort"
+        for item in snap.get("driving_license") or []
+        if isinstance(item, dict) and item.get("label")
+    ]
+    return licences or ["B-körkort"]
+
+
+def _dedupe(items: List[str], exclude: Optional[List[str]] = None) -> List[str]:
+    seen = {i.casefold() for i in (exclude or [])}
+    out: List[str] = []
+    for item in items:
+        key = item.casefold()
+        if key and key not in seen:
+            seen.add(key)
+            out.append(item)
+    return out
+
+
+def _lines(text: str) -> List[str]:
+    return [ln.strip(" •-*·\t") for ln in (text or "").splitlines() if len(ln.strip(" •-*·\t")) >= 3]
+
+
+def extract_skills_by_rules(description_text: Optional[str], source_snapshot=None) -> Tuple[Dict, Dict]:
+    """
+    Returns ({"required_skills", "preferred_skills"}, {"coverage", "requirement_lines",
+    "structured", "confident"}). confident=False means the LLM should take over.
+    """
+    snap = source_snapshot
+    if isinstance(snap, str):
+        try:
+            snap = json.loads(snap)
+        except Exception:
+            snap = None
+    snap = snap if isinstance(snap, dict) else {}
+
+    required = _snapshot_labels(snap, "must_have") + _driving_licences(snap)
+    preferred = _snapshot_labels(snap, "nice_to_have")
+    structured = len(required) + len(preferred)
+
+    cleaned, _ = clean_text_preserve_newlines(description_text or "")
+    sections, debug = sectionize_text(cleaned)
+
+    if debug.get("had_headings") and any(sections.get(k) for k in REQUIRED_SECTIONS + PREFERRED_SECTIONS):
+        required_lines = [ln for key in REQUIRED_SECTIONS for ln in _lines(sections.get(key, ""))]
+        preferred_lines = [ln for key in PREFERRED_SECTIONS for ln in _lines(sections.get(key, ""))]
+    else:
+        # No usable headings: only lines that read like requirements count.
+        candidates = [ln for ln in _lines(cleaned) if re.search(r"\b(krav|erfarenhet|utbildning|kunskap|körkort|behörighet|meriter)", ln, re.I)]
+        preferred_lines = [ln for ln in candidates if PREFERRED_LINE.search(ln)]
+        required_lines = [ln for ln in candidates if not PREFERRED_LINE.search(ln)]
+
+    covered = 0
+    for line in required_lines:
+        hits = match_skills(line)
+        if hits:
+            covered += 1
+            (preferred if PREFERRED_LINE.search(line) else required).extend(hits)
+    for line in preferred_lines:
+        hits = match_skills(line)
+        if hits:
+            covered += 1
+            preferred.extend(hits)
+
+    required = _dedupe(required)
+    preferred = _dedupe(preferred, exclude=required)
+
+    requirement_lines = len(required_lines) + len(preferred_lines)
+    coverage = covered / requirement_lines if requirement_lines else (1.0 if structured else 0.0)
+    total = len(required) + len(preferred)
+    confident = total >= RULE_MIN_SKILLS and coverage >= RULE_MIN_COVERAGE
+
+    skills_data = {"required_skills": required[:MAX_SKILLS], "preferred_skills": preferred[:MAX_SKILLS]}
+    return skills_data, {
+        "coverage": round(coverage, 2),
+        "requirement_lines": requirement_lines,
+        "structured": structured,
+        "confident": confident,
+    }
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIMS = 768
+
+
+def make_handler(label: str, hits: list, delay: float = 0.0, fail: bool = False):
+    class StubOllama(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            hits.append(label)
+            time.sleep(STATE.get(f"{label}_delay", delay))
+            if STATE.get(f"{label}_fail", fail):
+                self.send_response(503)
+                self.end_headers()
+                return
+            # One-hot per stub so the caller can tell which instance answered
+            vector = [0.0] * DIMS
+            vector[int(label[-1])] = 1.0
+            payload = json.dumps({"embeddings": [vector for _ in body["input"]]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *_args):
+            pass
+
+    return StubOllama
+
+
+STATE: dict = {}
+HITS: list = []
+
+
+def start_stub(label: str) -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(label, HITS))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/api/embed"
+
+
+def answered_by(vectors) -> int:
+    return vectors[0].index(1.0)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("EMBEDDING_POOL_COOLDOWN_SECONDS", "60")
+
+    from embedding_backends import EmbeddingRouter, EmbeddingScheduler, OllamaEmbeddingBackend, ScheduledBackend
+
+    urls = [start_stub("stub0"), start_stub("stub1")]
+
+    async def run_checks():
+        router = EmbeddingRouter(
+            [OllamaEmbeddingBackend(url=u) for u in urls],
+            labels=["stub0", "stub1"],
+            default_hedge_delay=0.1,
+        )
+
+        print("\n[least-loaded: concurrent calls spread over both instances]")
+        STATE.update(stub0_delay=0.2, stub1_delay=0.2)
+        HITS.clear()
+        await asyncio.gather(*(router.embed(["search_document: a"]) for _ in range(4)))
+        print(HITS)
+        assert HITS.count("stub0") == 2 and HITS.count("stub1") == 2
+
+        print("\n[failover: a failing instance is retried elsewhere and then skipped]")
+        STATE.update(stub0_delay=0.0, stub1_delay=0.0, stub0_fail=True)
+        HITS.clear()
+        results = [await router.embed(["search_document: b"]) for _ in range(3)]
+        print(HITS, router.stats())
+        assert all(answered_by(r) == 1 for r in results)
+        assert HITS.count("stub0") == 1
+        assert router.stats()["members"][0]["healthy"] is False
+
+        print("\n[health check: recovered instance is back in rotation]")
+        STATE.update(stub0_fail=False)
+        stats = await router.health_check()
+        print(stats)
+        assert all(m["healthy"] for m in stats["members"])
+
+        print("\n[hedging: an interactive call on a slow instance is raced on the other]")
+        STATE.update(stub0_delay=1.0, stub1_delay=0.0)
+        router.members[1].in_flight = 1  # make stub0 the least-loaded pick
+        started = time.monotonic()
+        vectors = await router.embed(["search_query: c"], priority="interactive")
+        elapsed = time.monotonic() - started
+        router.members[1].in_flight = 0
+        print(f"{elapsed:.2f}s", router.stats())
+        assert answered_by(vectors) == 1 and elapsed < 0.8
+        assert router.hedged_requests == 1 and router.hedge_wins == 1
+
+        print("\n[scheduler: queued interactive and profile calls overtake a batch backlog]")
+        STATE.update(stub0_delay=0.05, stub1_delay=0.05)
+        scheduler = EmbeddingScheduler(slots=1)
+        scheduled = ScheduledBackend(OllamaEmbeddingBackend(url=urls[0]), scheduler)
+        order = []
+
+        async def call(tag: str, priority: str):
+            await scheduled.embed([f"search_document: {tag}"], priority=priority)
+            order.append(tag)
+
+        async def batch_backlog():
+            await asyncio.gather(*(call(f"batch{i}", "batch") for i in range(6)))
+
+        # Nightly enrichment runs on its own asyncio.run() loop in a scheduler thread
+        batch_thread = threading.Thread(target=lambda: asyncio.run(batch_backlog()))
+        batch_thread.start()
+        await asyncio.sleep(0.08)
+        await asyncio.gather(call("profile", "profile"), call("interactive", "interactive"))
+        await asyncio.to_thread(batch_thread.join)
+        stats = scheduler.stats()
+        print(order)
+        print(scheduler.metrics_text())
+        assert order.index("interactive") < order.index("profile") <= 3
+        assert stats["in_use"] == 0 and stats["classes"]["batch"]["count"] == 6
+        assert 'embedding_queue_wait_seconds_count{priority="interactive"} 1' in scheduler.metrics_text()
+
+        await router.close()
+        await scheduled.close()
+
+    asyncio.run(run_checks())
+    print("\n✅ embedding router stub checks passed")
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+
+def make_ad(ad_id: str, headline: str, removed: bool = False) -> dict:
+    if removed:
+        return {"id": ad_id, "removed": True, "removed_date": "2026-10-19T08:00:00"}
+    return {
+        "id": ad_id,
+        "headline": headline,
+        "description": {"text": f"{headline}. Ansök via mail: jobb{ad_id}@example.se"},
+        "webpage_url": None,
+        "publication_date": "2026-10-19T07:00:00",
+        "workplace_address": {"municipality": "Stockholm", "coordinates": [18.06, 59.33]},
+        "occupation": {"label": "Mjukvaruutvecklare"},
+        "occupation_group": {"label": "Mjukvaru- och systemutvecklare m.fl."},
+        "occupation_field": {"label": "Data/IT"},
+    }
+
+
+SNAPSHOT = [make_ad("1", "Backendutvecklare"), make_ad("2", "Kock")]
+STREAM = [make_ad("2", "Kock (uppdaterad)"), make_ad("3", "Lagerarbetare"), make_ad("1", "", removed=True)]
+REQUESTS: list[tuple[str, dict]] = []
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        REQUESTS.append((parsed.path, parse_qs(parsed.query)))
+        if parsed.path == "/snapshot":
+            body = SNAPSHOT
+        elif parsed.path == "/stream":
+            body = STREAM
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *_args):
+        pass
+
+
+class MemorySink:
+    def __init__(self):
+        self.rows: dict[str, dict] = {}
+
+    def upsert(self, rows: list[dict]) -> None:
+        for row in rows:
+            self.rows[row["id"]] = row
+
+    def deactivate(self, job_ids: list[str], inactivated_at: str) -> None:
+        for job_id in job_ids:
+            if job_id in self.rows:
+                self.rows[job_id]["is_active"] = False
+                self.rows[job_id]["source_inactivated_at"] = inactivated_at
+
+    def active_ids(self) -> set[str]:
+        return {job_id for job_id, row in self.rows.items() if row.get("is_active")}
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+    os.environ.setdefault("SUPABASE_SERVICE_KEY", "test")
+    os.environ.setdefault("JOBSTREAM_LAG_SECONDS", "0")
+
+    from jobtech_stream import JobStreamClient, load_checkpoint
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint_path = Path(tmp) / "checkpoint.json"
+        sink = MemorySink()
+        client = JobStreamClient(base_url=base_url, checkpoint_path=checkpoint_path, sink=sink)
+
+        print("\n[first poll without checkpoint takes a snapshot]")
+        print(client.poll_stream())
+        assert REQUESTS[-1][0] == "/snapshot"
+        assert sink.active_ids() == {"1", "2"}
+        assert load_checkpoint(checkpoint_path).get("last_stream_at")
+
+        print("\n[second poll reads the change feed from the checkpoint]")
+        since = load_checkpoint(checkpoint_path)["last_stream_at"]
+        print(client.poll_stream())
+        path, params = REQUESTS[-1]
+        assert path == "/stream" and params["date"] == [since]
+        assert sink.active_ids() == {"2", "3"}
+        assert sink.rows["2"]["headline"] == "Kock (uppdaterad)"
+        assert sink.rows["1"]["is_active"] is False
+        assert sink.rows["3"]["contact_email"] == "jobb3@example.se"
+
+    server.shutdown()
+    print("\n✅ jobtech_stream stand-in checks passed")
@@ -0,0 +1,93 @@
+from skill_rules import extract_skills_by_rules, match_skills
+
+
+def run_case(name: str, text: str, expected: list[str], absent: list[str] | None = None):
+    found = match_skills(text)
+    print(f"\n[{name}]")
+    print(found)
+    for label in expected:
+        assert label in found, f"{name}: missing {label!r}"
+    for label in absent or []:
+        assert label not in found, f"{name}: unexpected {label!r}"
+
+
+if __name__ == "__main__":
+    run_case(
+        "licences_and_tools",
+        "B-körkort, truckkort och goda kunskaper i Excel samt SAP",
+        expected=["B-körkort", "Truckkort", "Excel", "SAP"],
+    )
+
+    run_case(
+        "java_is_not_javascript",
+        "Erfarenhet av JavaScript och TypeScript",
+        expected=[],
+        absent=["Java"],
+    )
+
+    run_case(
+        "takecare_one_word",
+        "Du har arbetat i TakeCare eller Cosmic",
+        expected=["TakeCare", "Cosmic"],
+    )
+
+    run_case(
+        "takecare_journal_context",
+        "Dokumentation sker i Take Care-journalen",
+        expected=["TakeCare"],
+    )
+
+    run_case(
+        "take_care_english_prose",
+        "We take care of our people and take care to grow together",
+        expected=[],
+        absent=["TakeCare"],
+    )
+
+    run_case(
+        "experience_keeps_domain",
+        "Minst 2 års erfarenhet av lagerarbete och truckkörning.",
+        expected=["2 års erfarenhet av lagerarbete"],
+        absent=["2 års erfarenhet"],
+    )
+
+    run_case(
+        "experience_inom",
+        "3-5 års relevant erfarenhet inom försäljning eller kundservice",
+        expected=["3 års erfarenhet inom försäljning"],
+    )
+
+    run_case(
+        "bare_experience_is_not_a_skill",
+        "Du har 2 års erfarenhet.",
+        expected=[],
+        absent=["2 års erfarenhet"],
+    )
+
+    print("\n[bare_experience_does_not_make_rules_confident]")
+    skills, info = extract_skills_by_rules(
+        "Kvalifikationer\n"
+        "Minst 2 års erfarenhet\n"
+        "Du har 3 års erfarenhet\n"
+        "Flytande svenska\n"
+    )
+    print(skills, info)
+    assert info["confident"] is False
+    assert info["coverage"] < 0.5
+
+    print("\n[structured_fields_and_sections]")
+    skills, info = extract_skills_by_rules(
+        "Kvalifikationer\n"
+        "B-körkort\n"
+        "Truckkort\n"
+        "Goda kunskaper i svenska\n"
+        "Meriterande\n"
+        "YKB\n",
+        {"must_have": {"skills": [{"label": "Lagerarbete"}]}},
+    )
+    print(skills, info)
+    assert skills["required_skills"][:4] == ["Lagerarbete", "B-körkort", "Truckkort", "Svenska"]
+    assert skills["preferred_skills"] == ["YKB"]
+    assert info["confident"] is True
+
+    print("\n✅ skill rule checks passed")
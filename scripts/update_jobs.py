@@ -2,7 +2,6 @@
 import os
 import json
 import requests
-import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
@@ -11,23 +10,19 @@ from dotenv import load_dotenv
 
 try:
     from scripts.job_contact_extractor import extract_job_contact_data
+    from scripts.job_ingest import CONTACT_HTML_INLINE, build_job_row, upsert_job_rows
+    from scripts.jobtech_client import get_client
+    from scripts.jobtech_search import SearchPaginator, parse_time
 except ModuleNotFoundError:
     from job_contact_extractor import extract_job_contact_data
+    from job_ingest import CONTACT_HTML_INLINE, build_job_row, upsert_job_rows
+    from jobtech_client import get_client
+    from jobtech_search import SearchPaginator, parse_time
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-JOBTECH_API_KEY = os.getenv("JOBTECH_API_KEY")
-
-# Using the search API to fetch changes/new jobs
-API_BASE_URL = "https://jobsearch.api.jobtechdev.se/search"
-FETCH_TIMEOUT_SECONDS = int(os.getenv("JOB_FETCH_TIMEOUT_SECONDS", "45"))
-MAX_FETCH_RETRIES = int(os.getenv("JOB_FETCH_MAX_RETRIES", "3"))
-RATE_LIMIT_SLEEP_SECONDS = int(os.getenv("JOB_FETCH_RATE_LIMIT_SLEEP_SECONDS", "5"))
-EXPIRED_DEACTIVATION_BATCH_SIZE = int(os.getenv("JOB_EXPIRED_DEACTIVATION_BATCH_SIZE", "200"))
-REMOVED_AD_SCAN_BATCH_SIZE = int(os.getenv("JOB_REMOVED_AD_SCAN_BATCH_SIZE", "500"))
-REMOVED_AD_UPDATE_BATCH_SIZE = int(os.getenv("JOB_REMOVED_AD_UPDATE_BATCH_SIZE", "200"))
 
 REMOVED_AD_MARKERS = [
     "arbetsgivaren har tagit bort annonsen",
@@ -39,46 +34,11 @@ REMOVED_AD_MARKERS = [
 SCRIPT_DIR = Path(__file__).resolve().parent
 TIMESTAMP_FILE = SCRIPT_DIR / "last_run.json"
 
-# config/category_map.json lives at repo root/config/
-REPO_ROOT = SCRIPT_DIR.parent
-CATEGORY_MAP_PATH = REPO_ROOT / "config" / "category_map.json"
-
 if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
     raise SystemExit("❌ Missing SUPABASE_URL or SUPABASE_SERVICE_KEY")
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
-if not CATEGORY_MAP_PATH.exists():
-    raise SystemExit(f"❌ Missing category map file: {CATEGORY_MAP_PATH}")
-
-CATEGORY_MAP = json.loads(CATEGORY_MAP_PATH.read_text(encoding="utf-8"))
-
-
-def compute_category_tags(field: str, group: str, role: str) -> list[str]:
-    field_l = (field or "").lower()
-    group_l = (group or "").lower()
-    role_l = (role or "").lower()
-
-    tags: list[str] = []
-    for tag, rules in CATEGORY_MAP.items():
-        fields = [x.lower() for x in rules.get("fields", [])]
-        groups = [x.lower() for x in rules.get("groups", [])]
-        role_contains = [x.lower() for x in rules.get("roles_contains", [])]
-
-        hit = False
-        if fields and any(f in field_l for f in fields):
-            hit = True
-        if groups and any(g in group_l for g in groups):
-            hit = True
-        if role_contains and any(rc in role_l for rc in role_contains):
-            hit = True
-
-        if hit:
-            tags.append(tag)
-
-    return sorted(set(tags))
-
-
 def load_last_run_date() -> str:
     if TIMESTAMP_FILE.exists():
         try:
@@ -104,37 +64,12 @@ def deactivate_expired_jobs() -> None:
     """
     print("🧹 Marking expired jobs as inactive...")
     try:
-        now_iso = datetime.now(timezone.utc).isoformat()
-        response = (
-            supabase.table("job_ads")
-            .select("id")
-            .lt("application_deadline", now_iso)
-            .eq("is_active", True)
-            .limit(5000)
-            .execute()
-        )
-        rows = response.data or []
-        if not rows:
+        response = supabase.rpc("mark_expired_jobs_inactive", {}).execute()
+        marked = response.data if isinstance(response.data, int) else 0
+        if not marked:
             print("✅ No expired active jobs needed inactivation.")
             return
-
-        expired_ids = [row["id"] for row in rows if row.get("id")]
-        total_updated = 0
-        for i in range(0, len(expired_ids), EXPIRED_DEACTIVATION_BATCH_SIZE):
-            batch = expired_ids[i:i + EXPIRED_DEACTIVATION_BATCH_SIZE]
-            (
-                supabase.table("job_ads")
-                .update({
-                    "is_active": False,
-                    "source_inactivated_at": now_iso,
-                })
-                .in_("id", batch)
-                .eq("is_active", True)
-                .execute()
-            )
-            total_updated += len(batch)
-
-        print(f"✅ Marked {total_updated} expired jobs as inactive.")
+        print(f"✅ Marked {marked} expired jobs as inactive.")
     except Exception as e:
         print(f"❌ Error marking expired jobs inactive: {e}")
 
@@ -142,55 +77,16 @@ def deactivate_expired_jobs() -> None:
 def deactivate_removed_ads() -> None:
     """
     Some ads are explicitly marked as removed in the stored description text before the deadline passes.
-    Scan active jobs in batches and inactivate those rows immediately.
+    The check runs in Postgres and only over rows inserted or re-described since the last sweep.
     """
     print("🧹 Marking ads with removed-ad text as inactive...")
-    now_iso = datetime.now(timezone.utc).isoformat()
-    last_id = None
-    scanned = 0
-    marked = 0
-
     try:
-        while True:
-            query = (
-                supabase.table("job_ads")
-                .select("id,description_text")
-                .eq("is_active", True)
-                .order("id")
-                .limit(REMOVED_AD_SCAN_BATCH_SIZE)
-            )
-            if last_id:
-                query = query.gt("id", last_id)
-
-            response = query.execute()
-            rows = response.data or []
-            if not rows:
-                break
-
-            scanned += len(rows)
-            last_id = rows[-1]["id"]
-
-            stale_ids = []
-            for row in rows:
-                description = (row.get("description_text") or "").lower()
-                if any(marker in description for marker in REMOVED_AD_MARKERS):
-                    stale_ids.append(row["id"])
-
-            for i in range(0, len(stale_ids), REMOVED_AD_UPDATE_BATCH_SIZE):
-                batch = stale_ids[i:i + REMOVED_AD_UPDATE_BATCH_SIZE]
-                (
-                    supabase.table("job_ads")
-                    .update({
-                        "is_active": False,
-                        "source_inactivated_at": now_iso,
-                    })
-                    .in_("id", batch)
-                    .eq("is_active", True)
-                    .execute()
-                )
-                marked += len(batch)
-
-        print(f"✅ Scanned {scanned} active jobs and marked {marked} removed ads inactive.")
+        response = supabase.rpc("mark_removed_ads_inactive", {"p_markers": REMOVED_AD_MARKERS}).execute()
+        result = (response.data or [{}])[0]
+        print(
+            f"✅ Checked {result.get('checked', 0)} new/changed jobs and marked "
+            f"{result.get('marked_inactive', 0)} removed ads inactive."
+        )
     except Exception as e:
         print(f"❌ Error marking removed ads inactive: {e}")
 
@@ -199,151 +95,46 @@ def fetch_and_upsert_new_jobs() -> None:
     last_run = load_last_run_date()
     print(f"📡 Fetching jobs published after: {last_run}")
 
-    offset = 0
     batch_size = 100
     total_upserted = 0
 
-    headers = {"api-key": JOBTECH_API_KEY} if JOBTECH_API_KEY else {}
+    # Open-ended upper bound: JobTech timestamps are Swedish local time, so "now" in UTC would cut off recent ads.
+    window_start = parse_time(last_run)
+    window_end = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=1)
+
+    try:
+        hits = SearchPaginator(base_params={"sort": "pubdate-asc"}).fetch_all(window_start, window_end)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ API request error: {e}")
+        return
+    except Exception as e:
+        print(f"❌ Unexpected API error: {e}")
+        return
+    finally:
+        get_client().log_stats()
 
-    while True:
-        params = {
-            "published-after": last_run,
-            "limit": batch_size,
-            "offset": offset,
-            "sort": "pubdate-asc",  # Oldest first; safer resume
-        }
+    # Oldest first; safer resume
+    hits.sort(key=lambda job: job.get("publication_date") or "")
 
+    totals = {"new": 0, "changed": 0, "content_changed": 0, "unchanged": 0}
+    seen_at = datetime.now(timezone.utc).isoformat()
+    for i in range(0, len(hits), batch_size):
+        batch = hits[i:i + batch_size]
+        print(f"   Processing batch of {len(batch)} jobs...")
         try:
-            response = None
-            for attempt in range(MAX_FETCH_RETRIES):
-                try:
-                    response = requests.get(
-                        API_BASE_URL,
-                        params=params,
-                        headers=headers,
-                        timeout=FETCH_TIMEOUT_SECONDS,
-                    )
-                    break
-                except requests.exceptions.ReadTimeout:
-                    wait_s = 2 * (attempt + 1)
-                    print(
-                        f"⏳ Read timeout while fetching offset={offset} "
-                        f"(attempt {attempt + 1}/{MAX_FETCH_RETRIES}). Sleeping {wait_s}s..."
-                    )
-                    time.sleep(wait_s)
-
-            if response is None:
-                print(f"❌ Giving up on fetch for offset={offset} after {MAX_FETCH_RETRIES} timeouts.")
-                break
-
-            if response.status_code == 429:
-                print(f"⏳ Rate limit (429). Waiting {RATE_LIMIT_SLEEP_SECONDS}s...")
-                time.sleep(RATE_LIMIT_SLEEP_SECONDS)
-                continue
-
-            response.raise_for_status()
-            data = response.json()
-            hits = data.get("hits", [])
-
-            if not hits:
-                break
-
-            print(f"   Processing batch of {len(hits)} jobs...")
-
-            job_batch = []
-            for job in hits:
-                workplace = job.get("workplace_address") or {}
-                occupation = job.get("occupation") or {}
-                occupation_group = job.get("occupation_group") or {}
-                occupation_field = job.get("occupation_field") or {}
-                description = job.get("description") or {}
-
-                # Geo coords are typically [lon, lat]
-                lat = None
-                lon = None
-                coords = workplace.get("coordinates")
-                if isinstance(coords, list) and len(coords) == 2:
-                    lon, lat = coords[0], coords[1]
-
-                field_label = occupation_field.get("label") or ""
-                group_label = occupation_group.get("label") or ""
-                role_label = occupation.get("label") or ""
-
-                category_tags = compute_category_tags(field_label, group_label, role_label)
-
-                job_data = {
-                    "id": str(job.get("id")),
-                    "headline": job.get("headline"),
-                    "description_text": description.get("text"),
-                    "city": workplace.get("municipality"),
-                    "location": workplace.get("municipality"),
-                    "published_date": job.get("publication_date"),
-                    "application_deadline": job.get("application_deadline"),
-                    "webpage_url": job.get("webpage_url"),
-                    "job_category": role_label,  # keep for backwards compat
-
-                    "requires_dl_b": job.get("driving_license_required", False),
-                    "location_lat": lat,
-                    "location_lon": lon,
-
-                    "source_snapshot": job,
-
-                    # Taxonomy fields
-                    "occupation_field_label": occupation_field.get("label"),
-                    "occupation_field_concept_id": occupation_field.get("concept_id"),
-                    "occupation_field_legacy_ams_taxonomy_id": occupation_field.get("legacy_ams_taxonomy_id"),
-
-                    "occupation_group_label": occupation_group.get("label"),
-                    "occupation_group_concept_id": occupation_group.get("concept_id"),
-                    "occupation_group_legacy_ams_taxonomy_id": occupation_group.get("legacy_ams_taxonomy_id"),
-
-                    "occupation_label": occupation.get("label"),
-                    "occupation_concept_id": occupation.get("concept_id"),
-                    "occupation_legacy_ams_taxonomy_id": occupation.get("legacy_ams_taxonomy_id"),
-
-                    # Control layer
-                    "category_tags": category_tags,
-                    "is_active": True,
-                    "last_seen_at": datetime.now(timezone.utc).isoformat(),
-                    "source_inactivated_at": None,
-                }
-
-                contact_data = extract_job_contact_data(
-                    description_text=description.get("text"),
-                    webpage_url=job.get("webpage_url"),
-                    source_snapshot=job,
-                )
-
-                job_data.update({
-                    "contact_email": contact_data["contact_email"],
-                    "has_contact_email": contact_data["has_contact_email"],
-                    "contact_email_source": contact_data["contact_email_source"],
-                    "application_url": contact_data["application_url"],
-                    "application_url_source": contact_data["application_url_source"],
-                    "application_channel": contact_data["application_channel"],
-                    "application_channel_reason": contact_data["application_channel_reason"],
-                })
-
-                job_batch.append(job_data)
-
-            supabase.table("job_ads").upsert(job_batch, on_conflict="id").execute()
+            job_batch = [build_job_row(job, seen_at=seen_at) for job in batch]
+            counts = upsert_job_rows(supabase, job_batch, batch_size=batch_size, seen_at=seen_at)
             total_upserted += len(job_batch)
-
-            offset += batch_size
-
-            # Safety break
-            if offset >= 2000:
-                print("⚠️ Hit offset limit (2000). Only first 2000 new jobs fetched.")
-                break
-
-        except requests.exceptions.RequestException as e:
-            print(f"❌ API request error at offset={offset}: {e}")
-            break
+            for key, value in counts.items():
+                totals[key] += value
         except Exception as e:
-            print(f"❌ Unexpected API error at offset={offset}: {e}")
-            break
+            print(f"❌ Upsert failed for batch starting at {i}: {e}")
+            return
 
-    print(f"✅ Upserted {total_upserted} new jobs.")
+    print(
+        f"✅ Processed {total_upserted} jobs: new={totals['new']} changed={totals['changed']} "
+        f"(re-embed={totals['content_changed']}) unchanged={totals['unchanged']}"
+    )
     save_last_run_date()
 
 
@@ -380,6 +171,7 @@ def refresh_missing_contact_fields() -> None:
             description_text=row.get("description_text"),
             webpage_url=row.get("webpage_url"),
             source_snapshot=row.get("source_snapshot"),
+            fetch_html=CONTACT_HTML_INLINE,
         )
         if contact["has_contact_email"]:
             direct_email_count += 1
@@ -396,6 +188,7 @@ def refresh_missing_contact_fields() -> None:
                 "application_url_source": contact["application_url_source"],
                 "application_channel": contact["application_channel"],
                 "application_channel_reason": contact["application_channel_reason"],
+                "contact_html_status": "pending" if contact["contact_html_pending"] else None,
             }
         )
 
@@ -408,10 +201,14 @@ def refresh_missing_contact_fields() -> None:
         print(f"❌ Failed to save repair-pass updates: {e}")
 
 
-def run_job_update() -> None:
+def run_job_update(fetch_new: bool = True) -> None:
     deactivate_removed_ads()
     deactivate_expired_jobs()
-    fetch_and_upsert_new_jobs()
+    # With the JobStream client enabled, new/updated ads already arrive through the change feed.
+    if fetch_new:
+        fetch_and_upsert_new_jobs()
+    else:
+        save_last_run_date()
     refresh_missing_contact_fields()
 
 
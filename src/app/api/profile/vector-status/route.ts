@@ -26,7 +26,7 @@ export async function GET() {
 
   const { data: matchState, error: matchStateError } = await supabase
     .from("candidate_match_state")
-    .select("status,last_error,last_full_refresh_at,last_incremental_refresh_at,last_pool_size,saved_job_count")
+    .select("status,last_error,last_full_refresh_at,last_incremental_refresh_at,last_pool_size,saved_job_count,time_to_first_match_ms")
     .eq("user_id", user.id)
     .maybeSingle()
 
@@ -47,14 +47,16 @@ export async function GET() {
 
   const progress = {
     step1ProfileReady: hasProfileVector,
-    step2SemanticPoolReady: ["semantic_pool_ready", "saving_matches", "success"].includes(rawMatchStatus || ""),
+    step2SemanticPoolReady: ["partial_ready", "semantic_pool_ready", "saving_matches", "success"].includes(rawMatchStatus || ""),
     step3SavedMatchesReady: rawMatchStatus === "success" && rawSavedCount > 0,
+    partialMatchesReady: rawSavedCount > 0 && ["partial_ready", "semantic_pool_ready", "saving_matches", "success"].includes(rawMatchStatus || ""),
     poolSize: rawPoolSize,
     savedCount: rawSavedCount,
     matchStatus: rawMatchStatus,
     matchLastError: matchState?.last_error || null,
     lastFullRefreshAt: matchState?.last_full_refresh_at || null,
     lastIncrementalRefreshAt: matchState?.last_incremental_refresh_at || null,
+    timeToFirstMatchMs: typeof matchState?.time_to_first_match_ms === "number" ? matchState.time_to_first_match_ms : null,
   }
 
   return NextResponse.json({
@@ -84,12 +84,14 @@ type VectorStatus = {
     step1ProfileReady: boolean;
     step2SemanticPoolReady: boolean;
     step3SavedMatchesReady: boolean;
+    partialMatchesReady?: boolean;
     poolSize: number;
     savedCount: number;
     matchStatus: string | null;
     matchLastError: string | null;
     lastFullRefreshAt: string | null;
     lastIncrementalRefreshAt: string | null;
+    timeToFirstMatchMs?: number | null;
   } | null;
 };
 
@@ -300,6 +302,7 @@ export default function ProfilePage() {
       !vectorStatus.progress.step3SavedMatchesReady &&
       (vectorStatus.progress.step1ProfileReady ||
         vectorStatus.progress.matchStatus === "processing" ||
+        vectorStatus.progress.matchStatus === "partial_ready" ||
         vectorStatus.progress.matchStatus === "semantic_pool_ready" ||
         vectorStatus.progress.matchStatus === "saving_matches");
 
@@ -345,6 +348,9 @@ export default function ProfilePage() {
     }
 
     if (vectorStatus.progress && !vectorStatus.progress.step3SavedMatchesReady) {
+      if (vectorStatus.progress.partialMatchesReady) {
+        return t("de första jobben är klara, resten hämtas", "first jobs ready, fetching the rest");
+      }
       if (vectorStatus.progress.step1ProfileReady && vectorStatus.progress.step2SemanticPoolReady) {
         return t("sparar jobblistan", "saving the job list");
       }
@@ -0,0 +1,120 @@
+-- Distance rings for precomputed local matching.
+-- Strategy:
+-- 1) A local full refresh retrieves at the ring radius (>= the active radius) and stores every
+--    scored, distance-annotated row in candidate_match_pool.
+-- 2) candidate_job_matches keeps only the rows inside the active radius, as before.
+-- 3) A radius change that stays inside pool_radius_km is answered by apply_candidate_match_radius,
+--    a single set-based rewrite from the stored pool (no retrieval, no rescoring).
+-- 4) Larger radii fall back to a normal full refresh in the worker.
+
+CREATE TABLE IF NOT EXISTS public.candidate_match_pool (
+  user_id uuid NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+  job_id text NOT NULL REFERENCES public.job_ads(id) ON DELETE CASCADE,
+  match_source text NOT NULL DEFAULT 'local_full_refresh',
+  vector_similarity real NOT NULL DEFAULT 0,
+  keyword_hits text[] NOT NULL DEFAULT ARRAY[]::text[],
+  keyword_hit_count integer NOT NULL DEFAULT 0,
+  keyword_total_count integer NOT NULL DEFAULT 0,
+  keyword_hit_rate real NOT NULL DEFAULT 0,
+  keyword_miss_rate real NOT NULL DEFAULT 1,
+  taxonomy_hit_count integer NOT NULL DEFAULT 0,
+  taxonomy_bonus real NOT NULL DEFAULT 0,
+  seniority_penalty real NOT NULL DEFAULT 0,
+  base_score real NOT NULL DEFAULT 0,
+  final_score real NOT NULL DEFAULT 0,
+  distance_m real,
+  job_published_at timestamptz,
+  job_last_seen_at timestamptz,
+  matched_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (user_id, job_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_candidate_match_pool_user_distance
+  ON public.candidate_match_pool(user_id, distance_m ASC);
+
+CREATE INDEX IF NOT EXISTS idx_candidate_match_pool_job_id
+  ON public.candidate_match_pool(job_id);
+
+ALTER TABLE public.candidate_match_pool ENABLE ROW LEVEL SECURITY;
+
+ALTER TABLE public.candidate_match_state
+  ADD COLUMN IF NOT EXISTS pool_radius_km numeric,
+  ADD COLUMN IF NOT EXISTS pool_size integer,
+  ADD COLUMN IF NOT EXISTS pool_built_at timestamptz;
+
+CREATE OR REPLACE FUNCTION public.apply_candidate_match_radius(
+  p_user_id uuid,
+  p_radius_km numeric,
+  p_limit integer DEFAULT 500
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  saved_count integer;
+BEGIN
+  DELETE FROM public.candidate_job_matches
+  WHERE user_id = p_user_id
+    AND match_scope = 'local';
+
+  INSERT INTO public.candidate_job_matches (
+    user_id,
+    job_id,
+    match_source,
+    match_scope,
+    vector_similarity,
+    keyword_hits,
+    keyword_hit_count,
+    keyword_total_count,
+    keyword_hit_rate,
+    keyword_miss_rate,
+    taxonomy_hit_count,
+    taxonomy_bonus,
+    seniority_penalty,
+    base_score,
+    final_score,
+    distance_m,
+    job_published_at,
+    job_last_seen_at,
+    matched_at
+  )
+  SELECT
+    p.user_id,
+    p.job_id,
+    'local_radius_refresh',
+    'local',
+    p.vector_similarity,
+    p.keyword_hits,
+    p.keyword_hit_count,
+    p.keyword_total_count,
+    p.keyword_hit_rate,
+    p.keyword_miss_rate,
+    p.taxonomy_hit_count,
+    p.taxonomy_bonus,
+    p.seniority_penalty,
+    p.base_score,
+    p.final_score,
+    p.distance_m,
+    p.job_published_at,
+    p.job_last_seen_at,
+    now()
+  FROM public.candidate_match_pool p
+  JOIN public.job_ads j ON j.id = p.job_id
+  WHERE p.user_id = p_user_id
+    AND p.distance_m IS NOT NULL
+    AND p.distance_m <= p_radius_km * 1000.0
+    AND j.is_active = true
+    AND (j.application_deadline IS NULL OR j.application_deadline >= now())
+  ORDER BY p.final_score DESC, p.vector_similarity DESC, p.distance_m ASC
+  LIMIT GREATEST(p_limit, 1);
+
+  GET DIAGNOSTICS saved_count = ROW_COUNT;
+  RETURN saved_count;
+END;
+$$;
+
+GRANT ALL ON public.candidate_match_pool TO service_role;
+GRANT EXECUTE ON FUNCTION public.apply_candidate_match_radius(uuid, numeric, integer) TO service_role;
+
+COMMENT ON FUNCTION public.apply_candidate_match_radius(uuid, numeric, integer) IS
+  'Rewrites local candidate_job_matches for one user from the stored distance-annotated pool.';
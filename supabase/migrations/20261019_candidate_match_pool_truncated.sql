@@ -0,0 +1,7 @@
+-- Ring pools are capped at PRECOMPUTE_MATCH_RING_POOL_LIMIT rows. A capped pool (pool_truncated)
+-- still holds the exact top jobs for any radius r in which it has at least
+-- PRECOMPUTE_MATCH_RETRIEVAL_LIMIT rows; the worker counts those (idx_candidate_match_pool_user_distance)
+-- before answering a radius change from the pool, and runs a normal full refresh otherwise.
+
+ALTER TABLE public.candidate_match_state
+  ADD COLUMN IF NOT EXISTS pool_truncated boolean;
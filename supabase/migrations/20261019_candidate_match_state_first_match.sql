@@ -0,0 +1,6 @@
+-- Progressive first build: the worker publishes a small first page of matches with
+-- status 'partial_ready' before the full pool is saved. Track how long that took.
+ALTER TABLE public.candidate_match_state
+  ADD COLUMN IF NOT EXISTS precompute_started_at timestamptz,
+  ADD COLUMN IF NOT EXISTS first_match_ready_at timestamptz,
+  ADD COLUMN IF NOT EXISTS time_to_first_match_ms integer;
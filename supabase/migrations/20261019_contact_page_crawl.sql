@@ -0,0 +1,34 @@
+-- Contact-page crawl stage.
+-- Ingest no longer fetches employer pages inline. Ads whose text has no email but which
+-- link to a page are marked contact_html_status = 'pending' and picked up by
+-- scripts/contact_page_crawler.py, which writes the result back to the ad.
+--
+-- contact_page_cache is keyed by URL so one careers page shared by many ads is fetched
+-- once per TTL. Only the extracted result and the validators (ETag / Last-Modified) are
+-- stored, not the HTML, so an expired entry is revalidated with a conditional request.
+
+ALTER TABLE public.job_ads
+  ADD COLUMN IF NOT EXISTS contact_html_status text,
+  ADD COLUMN IF NOT EXISTS contact_html_checked_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS idx_job_ads_contact_html_pending
+  ON public.job_ads(id)
+  WHERE contact_html_status = 'pending' AND is_active = true;
+
+CREATE TABLE IF NOT EXISTS public.contact_page_cache (
+  url text PRIMARY KEY,
+  host text NOT NULL,
+  status_code integer,
+  etag text,
+  last_modified text,
+  contact_email text,
+  contact_email_context text,
+  error text,
+  fetched_at timestamptz NOT NULL DEFAULT now(),
+  expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_contact_page_cache_expires_at
+  ON public.contact_page_cache(expires_at);
+
+ALTER TABLE public.contact_page_cache ENABLE ROW LEVEL SECURITY;
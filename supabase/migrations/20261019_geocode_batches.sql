@@ -0,0 +1,105 @@
+-- Batched geocoding: claim a large batch of pending ads, resolve them in the worker and
+-- write every result back in one statement. Addresses that fail go to geocode_quarantine
+-- with a retry-after; ads that could not be placed wait in 'quarantined' until then.
+--
+-- job_ads.geocode_status:
+--   NULL          pending
+--   'ok'          coordinates written (geocode_source says from where)
+--   'quarantined' nothing resolved yet; retried after geocode_retry_at
+--   'failed'      gave up after GEOCODE_MAX_ATTEMPTS
+
+ALTER TABLE public.job_ads
+  ADD COLUMN IF NOT EXISTS geocode_attempts integer NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS geocode_retry_at timestamptz,
+  ADD COLUMN IF NOT EXISTS geocode_claimed_until timestamptz;
+
+CREATE TABLE IF NOT EXISTS public.geocode_quarantine (
+  address_key text PRIMARY KEY,
+  query text NOT NULL,
+  attempts integer NOT NULL DEFAULT 1,
+  last_error text,
+  retry_after timestamptz NOT NULL,
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_geocode_quarantine_retry_after
+  ON public.geocode_quarantine(retry_after);
+
+ALTER TABLE public.geocode_quarantine ENABLE ROW LEVEL SECURITY;
+
+-- Negative answers now live in the quarantine (with a retry-after) instead of the cache.
+DELETE FROM public.geocode_cache WHERE found = false;
+
+-- Permanent failures from the previous geocoder get one more pass under the new rules.
+UPDATE public.job_ads
+SET geocode_status = NULL
+WHERE geocode_status = 'failed';
+
+DROP INDEX IF EXISTS public.idx_job_ads_geocode_pending;
+CREATE INDEX IF NOT EXISTS idx_job_ads_geocode_pending
+  ON public.job_ads(id)
+  WHERE location_lat IS NULL AND (geocode_status IS NULL OR geocode_status = 'quarantined');
+
+CREATE OR REPLACE FUNCTION public.claim_geocode_jobs(
+  p_limit integer DEFAULT 500,
+  p_lease_seconds integer DEFAULT 900
+)
+RETURNS TABLE (
+  id text,
+  city text,
+  description_text text,
+  geocode_attempts integer
+)
+LANGUAGE sql
+AS $$
+  WITH picked AS (
+    SELECT j.id
+    FROM public.job_ads j
+    WHERE j.location_lat IS NULL
+      AND j.city IS NOT NULL
+      AND (j.geocode_status IS NULL OR (j.geocode_status = 'quarantined' AND j.geocode_retry_at <= now()))
+      AND (j.geocode_claimed_until IS NULL OR j.geocode_claimed_until < now())
+    ORDER BY j.id
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE public.job_ads j
+  SET geocode_claimed_until = now() + make_interval(secs => p_lease_seconds)
+  FROM picked
+  WHERE j.id = picked.id
+  RETURNING j.id, j.city, j.description_text, j.geocode_attempts;
+$$;
+
+CREATE OR REPLACE FUNCTION public.apply_geocode_results(
+  p_results jsonb
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_updated integer := 0;
+BEGIN
+  UPDATE public.job_ads j
+  SET location_lat = r.location_lat,
+      location_lon = r.location_lon,
+      location = coalesce(r.location, j.location),
+      geocode_status = r.geocode_status,
+      geocode_source = r.geocode_source,
+      geocode_attempts = coalesce(r.geocode_attempts, j.geocode_attempts),
+      geocode_retry_at = r.geocode_retry_at,
+      geocode_claimed_until = NULL
+  FROM jsonb_to_recordset(p_results) AS r(
+    id text,
+    location_lat double precision,
+    location_lon double precision,
+    location text,
+    geocode_status text,
+    geocode_source text,
+    geocode_attempts integer,
+    geocode_retry_at timestamptz
+  )
+  WHERE j.id = r.id;
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
@@ -0,0 +1,36 @@
+-- Geocoding without per-job network calls.
+-- City-level coordinates come from the bundled gazetteer (scripts/se_gazetteer.json); only
+-- street addresses that have never been seen before go to Nominatim, and every answer
+-- (including "not found") is kept in geocode_cache so it is asked once.
+--
+-- Failed lookups no longer write 0,0: coordinates stay NULL and geocode_status = 'failed',
+-- which keeps them out of the pending scan and out of every radius filter.
+
+CREATE TABLE IF NOT EXISTS public.geocode_cache (
+  address_key text PRIMARY KEY,
+  query text NOT NULL,
+  found boolean NOT NULL,
+  lat double precision,
+  lon double precision,
+  display_name text,
+  source text NOT NULL DEFAULT 'nominatim',
+  created_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.geocode_cache ENABLE ROW LEVEL SECURITY;
+
+ALTER TABLE public.job_ads
+  ADD COLUMN IF NOT EXISTS geocode_status text,
+  ADD COLUMN IF NOT EXISTS geocode_source text;
+
+-- Earlier failures were stored as 0,0 (the Gulf of Guinea). Send them back through the
+-- pending scan; nearly all of them resolve from the gazetteer.
+UPDATE public.job_ads
+SET location_lat = NULL,
+    location_lon = NULL
+WHERE location_lat = 0
+  AND location_lon = 0;
+
+CREATE INDEX IF NOT EXISTS idx_job_ads_geocode_pending
+  ON public.job_ads(id)
+  WHERE location_lat IS NULL AND geocode_status IS NULL;
@@ -0,0 +1,134 @@
+-- Hot/cold split for job_ads.
+-- Ads inactive for longer than N days move to job_ads_archive as one jsonb document per
+-- row (embedding dropped; TOAST compresses the rest). Match rows go with the delete via the
+-- existing ON DELETE CASCADE foreign keys; job_neighbors likewise.
+--
+-- Ads a candidate applied to or prepared an interview for are never archived: those tables
+-- cascade on delete too and are user data.
+--
+-- restore_archived_jobs() puts rows back (still inactive, embedding NULL so enrichment
+-- re-embeds them if they are reactivated).
+
+CREATE TABLE IF NOT EXISTS public.job_ads_archive (
+  id text PRIMARY KEY,
+  inactive_since timestamptz,
+  archived_at timestamptz NOT NULL DEFAULT now(),
+  row_data jsonb NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_ads_archive_archived_at
+  ON public.job_ads_archive(archived_at);
+
+ALTER TABLE public.job_ads_archive ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_job_ads_inactive_since
+  ON public.job_ads(source_inactivated_at)
+  WHERE is_active = false;
+
+CREATE OR REPLACE FUNCTION public.archive_inactive_jobs(
+  p_inactive_days integer DEFAULT 30,
+  p_limit integer DEFAULT 2000
+)
+RETURNS TABLE (
+  archived integer,
+  match_rows_removed integer
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_ids text[];
+  v_matches integer := 0;
+  v_pool integer := 0;
+  v_archived integer := 0;
+BEGIN
+  SELECT coalesce(array_agg(j.id), ARRAY[]::text[])
+  INTO v_ids
+  FROM (
+    SELECT j.id
+    FROM public.job_ads j
+    WHERE j.is_active = false
+      AND coalesce(j.source_inactivated_at, j.last_seen_at, j.published_date::timestamptz)
+          < now() - make_interval(days => p_inactive_days)
+      AND NOT EXISTS (SELECT 1 FROM public.candidate_job_applications a WHERE a.job_id = j.id)
+      AND NOT EXISTS (SELECT 1 FROM public.candidate_interview_preparations p WHERE p.job_id = j.id)
+    ORDER BY j.source_inactivated_at NULLS FIRST
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  ) j;
+
+  IF coalesce(array_length(v_ids, 1), 0) = 0 THEN
+    RETURN QUERY SELECT 0, 0;
+    RETURN;
+  END IF;
+
+  INSERT INTO public.job_ads_archive (id, inactive_since, archived_at, row_data)
+  SELECT j.id, j.source_inactivated_at, now(), to_jsonb(j) - 'embedding'
+  FROM public.job_ads j
+  WHERE j.id = ANY(v_ids)
+  ON CONFLICT (id) DO UPDATE
+    SET inactive_since = EXCLUDED.inactive_since,
+        archived_at = EXCLUDED.archived_at,
+        row_data = EXCLUDED.row_data;
+
+  -- Deleted explicitly (not left to the cascade) so the count can be reported.
+  DELETE FROM public.candidate_job_matches m WHERE m.job_id = ANY(v_ids);
+  GET DIAGNOSTICS v_matches = ROW_COUNT;
+  DELETE FROM public.candidate_match_pool m WHERE m.job_id = ANY(v_ids);
+  GET DIAGNOSTICS v_pool = ROW_COUNT;
+
+  DELETE FROM public.job_ads j WHERE j.id = ANY(v_ids);
+  GET DIAGNOSTICS v_archived = ROW_COUNT;
+
+  RETURN QUERY SELECT v_archived, v_matches + v_pool;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.restore_archived_jobs(
+  p_job_ids text[]
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_restored integer := 0;
+BEGIN
+  INSERT INTO public.job_ads
+  SELECT (jsonb_populate_record(NULL::public.job_ads, a.row_data)).*
+  FROM public.job_ads_archive a
+  WHERE a.id = ANY(p_job_ids)
+  ON CONFLICT (id) DO NOTHING;
+  GET DIAGNOSTICS v_restored = ROW_COUNT;
+
+  DELETE FROM public.job_ads_archive a
+  WHERE a.id = ANY(p_job_ids)
+    AND EXISTS (SELECT 1 FROM public.job_ads j WHERE j.id = a.id);
+
+  RETURN v_restored;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.job_table_size_report()
+RETURNS TABLE (
+  table_name text,
+  row_estimate bigint,
+  total_bytes bigint,
+  heap_bytes bigint,
+  toast_bytes bigint,
+  index_bytes bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    c.relname::text,
+    c.reltuples::bigint,
+    pg_total_relation_size(c.oid),
+    pg_relation_size(c.oid),
+    coalesce(pg_total_relation_size(nullif(c.reltoastrelid, 0)), 0),
+    pg_indexes_size(c.oid)
+  FROM pg_class c
+  JOIN pg_namespace n ON n.oid = c.relnamespace
+  WHERE n.nspname = 'public'
+    AND c.relname IN ('job_ads', 'job_ads_archive', 'candidate_job_matches', 'candidate_match_pool', 'job_neighbors')
+  ORDER BY pg_total_relation_size(c.oid) DESC;
+$$;
@@ -0,0 +1,67 @@
+-- Keep admin-referenced ads out of the archive.
+-- admin_saved_jobs.job_id and employer_intro_links.job_id point at job_ads by text id without a
+-- foreign key; the saved-job and employer-intro flows look the ad up there, so archiving it
+-- would break them silently. archive_inactive_jobs() now skips those ads as it does applied ones.
+
+CREATE INDEX IF NOT EXISTS idx_employer_intro_links_job_id
+  ON public.employer_intro_links(job_id);
+
+CREATE OR REPLACE FUNCTION public.archive_inactive_jobs(
+  p_inactive_days integer DEFAULT 30,
+  p_limit integer DEFAULT 2000
+)
+RETURNS TABLE (
+  archived integer,
+  match_rows_removed integer
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_ids text[];
+  v_matches integer := 0;
+  v_pool integer := 0;
+  v_archived integer := 0;
+BEGIN
+  SELECT coalesce(array_agg(j.id), ARRAY[]::text[])
+  INTO v_ids
+  FROM (
+    SELECT j.id
+    FROM public.job_ads j
+    WHERE j.is_active = false
+      AND coalesce(j.source_inactivated_at, j.last_seen_at, j.published_date::timestamptz)
+          < now() - make_interval(days => p_inactive_days)
+      AND NOT EXISTS (SELECT 1 FROM public.candidate_job_applications a WHERE a.job_id = j.id)
+      AND NOT EXISTS (SELECT 1 FROM public.candidate_interview_preparations p WHERE p.job_id = j.id)
+      AND NOT EXISTS (SELECT 1 FROM public.admin_saved_jobs s WHERE s.job_id = j.id)
+      AND NOT EXISTS (SELECT 1 FROM public.employer_intro_links l WHERE l.job_id = j.id)
+    ORDER BY j.source_inactivated_at NULLS FIRST
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  ) j;
+
+  IF coalesce(array_length(v_ids, 1), 0) = 0 THEN
+    RETURN QUERY SELECT 0, 0;
+    RETURN;
+  END IF;
+
+  INSERT INTO public.job_ads_archive (id, inactive_since, archived_at, row_data)
+  SELECT j.id, j.source_inactivated_at, now(), to_jsonb(j) - 'embedding'
+  FROM public.job_ads j
+  WHERE j.id = ANY(v_ids)
+  ON CONFLICT (id) DO UPDATE
+    SET inactive_since = EXCLUDED.inactive_since,
+        archived_at = EXCLUDED.archived_at,
+        row_data = EXCLUDED.row_data;
+
+  -- Deleted explicitly (not left to the cascade) so the count can be reported.
+  DELETE FROM public.candidate_job_matches m WHERE m.job_id = ANY(v_ids);
+  GET DIAGNOSTICS v_matches = ROW_COUNT;
+  DELETE FROM public.candidate_match_pool m WHERE m.job_id = ANY(v_ids);
+  GET DIAGNOSTICS v_pool = ROW_COUNT;
+
+  DELETE FROM public.job_ads j WHERE j.id = ANY(v_ids);
+  GET DIAGNOSTICS v_archived = ROW_COUNT;
+
+  RETURN QUERY SELECT v_archived, v_matches + v_pool;
+END;
+$$;
@@ -0,0 +1,8 @@
+-- Change detection for ingest (see scripts/job_ingest.py).
+-- snapshot_fingerprint: hash of the whole JobTech ad; unchanged ads only get last_seen_at touched.
+-- content_fingerprint: hash of the fields that feed the embedding document; embeddings are
+-- only reset when it changes.
+
+ALTER TABLE public.job_ads
+  ADD COLUMN IF NOT EXISTS snapshot_fingerprint text,
+  ADD COLUMN IF NOT EXISTS content_fingerprint text;
@@ -0,0 +1,91 @@
+-- Set-based lifecycle maintenance called from scripts/update_jobs.py.
+--
+-- Removed-ad markers: instead of downloading every active description each run, rows carry
+-- removed_marker_pending. New rows start pending (column default) and an update trigger
+-- re-flags a row only when its description_text actually changes. The sweep reads just the
+-- pending rows through a partial index and clears the flag, which is its checkpoint.
+--
+-- Expired ads: one UPDATE over the partial deadline index.
+
+ALTER TABLE public.job_ads
+  ADD COLUMN IF NOT EXISTS removed_marker_pending boolean NOT NULL DEFAULT true;
+
+CREATE INDEX IF NOT EXISTS idx_job_ads_removed_marker_pending
+  ON public.job_ads(id)
+  WHERE removed_marker_pending;
+
+CREATE INDEX IF NOT EXISTS idx_job_ads_active_deadline
+  ON public.job_ads(application_deadline)
+  WHERE is_active = true AND application_deadline IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.flag_job_ads_removed_marker_check()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  NEW.removed_marker_pending := true;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_job_ads_removed_marker_check ON public.job_ads;
+CREATE TRIGGER trg_job_ads_removed_marker_check
+  BEFORE UPDATE OF description_text ON public.job_ads
+  FOR EACH ROW
+  WHEN (OLD.description_text IS DISTINCT FROM NEW.description_text)
+  EXECUTE FUNCTION public.flag_job_ads_removed_marker_check();
+
+CREATE OR REPLACE FUNCTION public.mark_removed_ads_inactive(
+  p_markers text[]
+)
+RETURNS TABLE (
+  checked integer,
+  marked_inactive integer
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_patterns text[];
+  v_marked integer := 0;
+  v_cleared integer := 0;
+BEGIN
+  SELECT coalesce(array_agg('%' || lower(m) || '%'), ARRAY[]::text[])
+  INTO v_patterns
+  FROM unnest(p_markers) AS m
+  WHERE coalesce(m, '') <> '';
+
+  UPDATE public.job_ads j
+  SET is_active = false,
+      source_inactivated_at = now(),
+      removed_marker_pending = false
+  WHERE j.removed_marker_pending
+    AND j.is_active = true
+    AND lower(coalesce(j.description_text, '')) LIKE ANY (v_patterns);
+  GET DIAGNOSTICS v_marked = ROW_COUNT;
+
+  UPDATE public.job_ads j
+  SET removed_marker_pending = false
+  WHERE j.removed_marker_pending;
+  GET DIAGNOSTICS v_cleared = ROW_COUNT;
+
+  RETURN QUERY SELECT v_marked + v_cleared, v_marked;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.mark_expired_jobs_inactive()
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_marked integer := 0;
+BEGIN
+  UPDATE public.job_ads j
+  SET is_active = false,
+      source_inactivated_at = now()
+  WHERE j.is_active = true
+    AND j.application_deadline IS NOT NULL
+    AND j.application_deadline < now();
+  GET DIAGNOSTICS v_marked = ROW_COUNT;
+  RETURN v_marked;
+END;
+$$;
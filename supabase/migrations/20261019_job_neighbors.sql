@@ -0,0 +1,264 @@
+-- Job-to-job k-nearest-neighbour graph.
+-- Strategy:
+-- 1) enrich_jobs calls refresh_job_neighbors for the jobs it just embedded. Each new job runs
+--    ONE ANN query to find its k neighbours among active jobs.
+-- 2) The new job is also inserted into its neighbours' lists when it beats their weakest entry,
+--    so the graph stays symmetric-ish without rebuilding older rows.
+-- 3) Lists are stored compactly as parallel arrays (ids + similarities, best first).
+-- 4) Related-jobs lookups and incremental candidate seeding read the arrays only; neither
+--    touches the vector index.
+
+CREATE TABLE IF NOT EXISTS public.job_neighbors (
+  job_id text PRIMARY KEY REFERENCES public.job_ads(id) ON DELETE CASCADE,
+  neighbor_ids text[] NOT NULL DEFAULT ARRAY[]::text[],
+  neighbor_sims real[] NOT NULL DEFAULT ARRAY[]::real[],
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_neighbors_neighbor_ids
+  ON public.job_neighbors USING gin (neighbor_ids);
+
+ALTER TABLE public.job_neighbors ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.refresh_job_neighbors(
+  p_job_ids text[],
+  k integer DEFAULT 20
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  src record;
+  refreshed integer := 0;
+BEGIN
+  FOR src IN
+    SELECT j.id, j.embedding
+    FROM public.job_ads j
+    WHERE j.id = ANY(p_job_ids)
+      AND j.embedding IS NOT NULL
+  LOOP
+    WITH nearest AS (
+      SELECT n.id, (1 - (n.embedding <=> src.embedding))::real AS sim
+      FROM public.job_ads n
+      WHERE n.is_active = true
+        AND n.embedding IS NOT NULL
+        AND n.id <> src.id
+      ORDER BY n.embedding <=> src.embedding ASC
+      LIMIT GREATEST(k, 1)
+    ),
+    upserted AS (
+      INSERT INTO public.job_neighbors (job_id, neighbor_ids, neighbor_sims, updated_at)
+      SELECT
+        src.id,
+        COALESCE(array_agg(nearest.id ORDER BY nearest.sim DESC), ARRAY[]::text[]),
+        COALESCE(array_agg(nearest.sim ORDER BY nearest.sim DESC), ARRAY[]::real[]),
+        now()
+      FROM nearest
+      ON CONFLICT (job_id) DO UPDATE
+        SET neighbor_ids = EXCLUDED.neighbor_ids,
+            neighbor_sims = EXCLUDED.neighbor_sims,
+            updated_at = now()
+      RETURNING 1
+    )
+    UPDATE public.job_neighbors jn
+    SET
+      neighbor_ids = merged.ids,
+      neighbor_sims = merged.sims,
+      updated_at = now()
+    FROM nearest
+    CROSS JOIN LATERAL (
+      SELECT
+        array_agg(t.id ORDER BY t.sim DESC) AS ids,
+        array_agg(t.sim ORDER BY t.sim DESC) AS sims
+      FROM (
+        SELECT u.id, u.sim
+        FROM (
+          SELECT x.id, x.sim
+          FROM public.job_neighbors cur
+          CROSS JOIN LATERAL unnest(cur.neighbor_ids, cur.neighbor_sims) AS x(id, sim)
+          WHERE cur.job_id = nearest.id
+            AND x.id <> src.id
+          UNION ALL
+          SELECT src.id, nearest.sim
+        ) u
+        ORDER BY u.sim DESC
+        LIMIT GREATEST(k, 1)
+      ) t
+    ) merged
+    WHERE jn.job_id = nearest.id
+      AND (
+        cardinality(jn.neighbor_sims) < GREATEST(k, 1)
+        OR jn.neighbor_sims[cardinality(jn.neighbor_sims)] < nearest.sim
+        OR src.id = ANY(jn.neighbor_ids)
+      );
+
+    refreshed := refreshed + 1;
+  END LOOP;
+
+  RETURN refreshed;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.fetch_related_jobs(
+  p_job_id text,
+  limit_count integer DEFAULT 10
+)
+RETURNS TABLE (
+  id text,
+  title text,
+  company text,
+  city text,
+  job_url text,
+  webpage_url text,
+  occupation_group_label text,
+  similarity real
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    j.id,
+    j.headline AS title,
+    j.company,
+    COALESCE(j.city, j.location) AS city,
+    j.job_url,
+    j.webpage_url,
+    j.occupation_group_label,
+    nb.sim AS similarity
+  FROM public.job_neighbors jn
+  CROSS JOIN LATERAL unnest(jn.neighbor_ids, jn.neighbor_sims) WITH ORDINALITY AS nb(id, sim, ord)
+  JOIN public.job_ads j ON j.id = nb.id
+  WHERE jn.job_id = p_job_id
+    AND j.is_active = true
+    AND (j.application_deadline IS NULL OR j.application_deadline >= now())
+  ORDER BY nb.ord
+  LIMIT GREATEST(limit_count, 1);
+$$;
+
+-- Incremental candidate pool seeded from the neighbours of the user's current top matches.
+-- Only the few hundred neighbour rows are scored against the candidate vector (exact distance,
+-- no index scan). Same row shape as fetch_candidate_semantic_pool.
+CREATE OR REPLACE FUNCTION public.fetch_candidate_neighbor_pool(
+  p_user_id uuid,
+  candidate_vector vector(768),
+  p_match_scope text DEFAULT 'local',
+  seen_after timestamptz DEFAULT NULL,
+  candidate_lat double precision DEFAULT NULL,
+  candidate_lon double precision DEFAULT NULL,
+  radius_km numeric DEFAULT NULL,
+  seed_limit integer DEFAULT 50,
+  limit_count integer DEFAULT 300
+)
+RETURNS TABLE (
+  id text,
+  title text,
+  company text,
+  city text,
+  description text,
+  job_url text,
+  webpage_url text,
+  occupation_field_label text,
+  occupation_group_label text,
+  occupation_label text,
+  vector_similarity real,
+  skills_data jsonb,
+  contact_email text,
+  has_contact_email boolean,
+  application_url text,
+  application_channel text,
+  location_lat double precision,
+  location_lon double precision,
+  lat double precision,
+  lon double precision,
+  published_date timestamptz,
+  last_seen_at timestamptz
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH seeds AS (
+    SELECT m.job_id
+    FROM public.candidate_job_matches m
+    WHERE m.user_id = p_user_id
+      AND m.match_scope = p_match_scope
+    ORDER BY m.final_score DESC
+    LIMIT GREATEST(seed_limit, 1)
+  ),
+  neighbor_ids AS (
+    SELECT DISTINCT nb.id
+    FROM seeds s
+    JOIN public.job_neighbors jn ON jn.job_id = s.job_id
+    CROSS JOIN LATERAL unnest(jn.neighbor_ids) AS nb(id)
+    WHERE NOT EXISTS (
+      SELECT 1
+      FROM public.candidate_job_matches existing
+      WHERE existing.user_id = p_user_id
+        AND existing.match_scope = p_match_scope
+        AND existing.job_id = nb.id
+    )
+  )
+  SELECT
+    j.id,
+    j.headline AS title,
+    j.company,
+    COALESCE(j.city, j.location) AS city,
+    j.description_text AS description,
+    j.job_url,
+    j.webpage_url,
+    j.occupation_field_label,
+    j.occupation_group_label,
+    j.occupation_label,
+    (1 - (j.embedding <=> candidate_vector))::real AS vector_similarity,
+    j.skills_data,
+    j.contact_email,
+    j.has_contact_email,
+    j.application_url,
+    j.application_channel,
+    j.location_lat,
+    j.location_lon,
+    j.lat,
+    j.lon,
+    j.published_date,
+    j.last_seen_at
+  FROM neighbor_ids n
+  JOIN public.job_ads j ON j.id = n.id
+  WHERE
+    j.is_active = true
+    AND (j.application_deadline IS NULL OR j.application_deadline >= now())
+    AND j.embedding IS NOT NULL
+    AND (
+      seen_after IS NULL
+      OR (j.last_seen_at IS NOT NULL AND j.last_seen_at > seen_after)
+    )
+    AND (
+      candidate_lat IS NULL
+      OR candidate_lon IS NULL
+      OR radius_km IS NULL
+      OR (
+        j.location_lat IS NOT NULL
+        AND j.location_lon IS NOT NULL
+        AND (
+          6371.0 * ACOS(
+            LEAST(
+              1.0,
+              GREATEST(
+                -1.0,
+                COS(RADIANS(candidate_lat))
+                * COS(RADIANS(j.location_lat))
+                * COS(RADIANS(j.location_lon) - RADIANS(candidate_lon))
+                + SIN(RADIANS(candidate_lat))
+                * SIN(RADIANS(j.location_lat))
+              )
+            )
+          )
+        ) <= radius_km
+      )
+    )
+  ORDER BY 11 DESC
+  LIMIT GREATEST(limit_count, 1);
+$$;
+
+GRANT ALL ON public.job_neighbors TO service_role;
+GRANT EXECUTE ON FUNCTION public.refresh_job_neighbors(text[], integer) TO service_role;
+GRANT EXECUTE ON FUNCTION public.fetch_related_jobs(text, integer) TO service_role;
+GRANT EXECUTE ON FUNCTION public.fetch_candidate_neighbor_pool(uuid, vector, text, timestamptz, double precision, double precision, numeric, integer, integer) TO service_role;
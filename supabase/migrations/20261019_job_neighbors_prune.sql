@@ -0,0 +1,310 @@
+-- Keep job_neighbors free of dead ids and seed neighbour pools with every candidate vector.
+-- 1) prune_job_neighbors() removes ids from every list that holds them (GIN on neighbor_ids).
+--    Statement triggers call it for ads that are deactivated or deleted (archived), so lists
+--    do not silt up with dead entries that only the readers' is_active filter hides.
+-- 2) refresh_job_neighbors() drops inactive ids while merging a new job into older lists.
+-- 3) fetch_candidate_neighbor_pool() takes the same weighted vectors as
+--    fetch_candidate_semantic_pool_multi (weighted max-sim); candidate_vector alone still works.
+
+CREATE OR REPLACE FUNCTION public.prune_job_neighbors(
+  p_job_ids text[]
+)
+RETURNS integer
+LANGUAGE sql
+AS $$
+  WITH pruned AS (
+    UPDATE public.job_neighbors jn
+    SET
+      (neighbor_ids, neighbor_sims) = (
+        SELECT
+          COALESCE(array_agg(x.id ORDER BY x.ord), ARRAY[]::text[]),
+          COALESCE(array_agg(x.sim ORDER BY x.ord), ARRAY[]::real[])
+        FROM unnest(jn.neighbor_ids, jn.neighbor_sims) WITH ORDINALITY AS x(id, sim, ord)
+        WHERE x.id <> ALL(p_job_ids)
+      ),
+      updated_at = now()
+    WHERE jn.neighbor_ids && p_job_ids
+    RETURNING 1
+  )
+  SELECT count(*)::integer FROM pruned;
+$$;
+
+CREATE OR REPLACE FUNCTION public.job_ads_prune_neighbors_on_deactivate()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_ids text[];
+BEGIN
+  SELECT coalesce(array_agg(n.id), ARRAY[]::text[])
+  INTO v_ids
+  FROM new_rows n
+  JOIN old_rows o ON o.id = n.id
+  WHERE o.is_active = true
+    AND n.is_active = false;
+
+  IF cardinality(v_ids) > 0 THEN
+    PERFORM public.prune_job_neighbors(v_ids);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.job_ads_prune_neighbors_on_delete()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_ids text[];
+BEGIN
+  SELECT coalesce(array_agg(o.id), ARRAY[]::text[]) INTO v_ids FROM old_rows o;
+  IF cardinality(v_ids) > 0 THEN
+    PERFORM public.prune_job_neighbors(v_ids);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_job_ads_prune_neighbors_on_deactivate ON public.job_ads;
+CREATE TRIGGER trg_job_ads_prune_neighbors_on_deactivate
+  AFTER UPDATE ON public.job_ads
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION public.job_ads_prune_neighbors_on_deactivate();
+
+DROP TRIGGER IF EXISTS trg_job_ads_prune_neighbors_on_delete ON public.job_ads;
+CREATE TRIGGER trg_job_ads_prune_neighbors_on_delete
+  AFTER DELETE ON public.job_ads
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION public.job_ads_prune_neighbors_on_delete();
+
+CREATE OR REPLACE FUNCTION public.refresh_job_neighbors(
+  p_job_ids text[],
+  k integer DEFAULT 20
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  src record;
+  refreshed integer := 0;
+BEGIN
+  FOR src IN
+    SELECT j.id, j.embedding
+    FROM public.job_ads j
+    WHERE j.id = ANY(p_job_ids)
+      AND j.embedding IS NOT NULL
+  LOOP
+    WITH nearest AS (
+      SELECT n.id, (1 - (n.embedding <=> src.embedding))::real AS sim
+      FROM public.job_ads n
+      WHERE n.is_active = true
+        AND n.embedding IS NOT NULL
+        AND n.id <> src.id
+      ORDER BY n.embedding <=> src.embedding ASC
+      LIMIT GREATEST(k, 1)
+    ),
+    upserted AS (
+      INSERT INTO public.job_neighbors (job_id, neighbor_ids, neighbor_sims, updated_at)
+      SELECT
+        src.id,
+        COALESCE(array_agg(nearest.id ORDER BY nearest.sim DESC), ARRAY[]::text[]),
+        COALESCE(array_agg(nearest.sim ORDER BY nearest.sim DESC), ARRAY[]::real[]),
+        now()
+      FROM nearest
+      ON CONFLICT (job_id) DO UPDATE
+        SET neighbor_ids = EXCLUDED.neighbor_ids,
+            neighbor_sims = EXCLUDED.neighbor_sims,
+            updated_at = now()
+      RETURNING 1
+    )
+    UPDATE public.job_neighbors jn
+    SET
+      neighbor_ids = merged.ids,
+      neighbor_sims = merged.sims,
+      updated_at = now()
+    FROM nearest
+    CROSS JOIN LATERAL (
+      SELECT
+        array_agg(t.id ORDER BY t.sim DESC) AS ids,
+        array_agg(t.sim ORDER BY t.sim DESC) AS sims
+      FROM (
+        SELECT u.id, u.sim
+        FROM (
+          SELECT x.id, x.sim
+          FROM public.job_neighbors cur
+          CROSS JOIN LATERAL unnest(cur.neighbor_ids, cur.neighbor_sims) AS x(id, sim)
+          JOIN public.job_ads live ON live.id = x.id AND live.is_active = true
+          WHERE cur.job_id = nearest.id
+            AND x.id <> src.id
+          UNION ALL
+          SELECT src.id, nearest.sim
+        ) u
+        ORDER BY u.sim DESC
+        LIMIT GREATEST(k, 1)
+      ) t
+    ) merged
+    WHERE jn.job_id = nearest.id
+      AND (
+        cardinality(jn.neighbor_sims) < GREATEST(k, 1)
+        OR jn.neighbor_sims[cardinality(jn.neighbor_sims)] < nearest.sim
+        OR src.id = ANY(jn.neighbor_ids)
+      );
+
+    refreshed := refreshed + 1;
+  END LOOP;
+
+  RETURN refreshed;
+END;
+$$;
+
+DROP FUNCTION IF EXISTS public.fetch_candidate_neighbor_pool(uuid, vector, text, timestamptz, double precision, double precision, numeric, integer, integer);
+
+CREATE OR REPLACE FUNCTION public.fetch_candidate_neighbor_pool(
+  p_user_id uuid,
+  candidate_vector vector(768),
+  p_match_scope text DEFAULT 'local',
+  seen_after timestamptz DEFAULT NULL,
+  candidate_lat double precision DEFAULT NULL,
+  candidate_lon double precision DEFAULT NULL,
+  radius_km numeric DEFAULT NULL,
+  seed_limit integer DEFAULT 50,
+  limit_count integer DEFAULT 300,
+  candidate_vectors jsonb DEFAULT NULL
+)
+RETURNS TABLE (
+  id text,
+  title text,
+  company text,
+  city text,
+  description text,
+  job_url text,
+  webpage_url text,
+  occupation_field_label text,
+  occupation_group_label text,
+  occupation_label text,
+  vector_similarity real,
+  skills_data jsonb,
+  contact_email text,
+  has_contact_email boolean,
+  application_url text,
+  application_channel text,
+  location_lat double precision,
+  location_lon double precision,
+  lat double precision,
+  lon double precision,
+  published_date timestamptz,
+  last_seen_at timestamptz
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH query_vectors AS (
+    SELECT
+      (v.elem->>'vector')::vector(768) AS query_vector,
+      COALESCE((v.elem->>'weight')::real, 1.0) AS weight
+    FROM jsonb_array_elements(COALESCE(candidate_vectors, '[]'::jsonb)) AS v(elem)
+    WHERE NULLIF(v.elem->>'vector', '') IS NOT NULL
+      AND COALESCE((v.elem->>'weight')::real, 1.0) > 0
+    UNION ALL
+    SELECT candidate_vector, 1.0::real
+    WHERE COALESCE(jsonb_array_length(candidate_vectors), 0) = 0
+  ),
+  seeds AS (
+    SELECT m.job_id
+    FROM public.candidate_job_matches m
+    WHERE m.user_id = p_user_id
+      AND m.match_scope = p_match_scope
+    ORDER BY m.final_score DESC
+    LIMIT GREATEST(seed_limit, 1)
+  ),
+  neighbor_ids AS (
+    SELECT DISTINCT nb.id
+    FROM seeds s
+    JOIN public.job_neighbors jn ON jn.job_id = s.job_id
+    CROSS JOIN LATERAL unnest(jn.neighbor_ids) AS nb(id)
+    WHERE NOT EXISTS (
+      SELECT 1
+      FROM public.candidate_job_matches existing
+      WHERE existing.user_id = p_user_id
+        AND existing.match_scope = p_match_scope
+        AND existing.job_id = nb.id
+    )
+  )
+  SELECT
+    j.id,
+    j.headline AS title,
+    j.company,
+    COALESCE(j.city, j.location) AS city,
+    j.description_text AS description,
+    j.job_url,
+    j.webpage_url,
+    j.occupation_field_label,
+    j.occupation_group_label,
+    j.occupation_label,
+    (
+      SELECT max(q.weight * (1 - (j.embedding <=> q.query_vector)))::real
+      FROM query_vectors q
+    ) AS vector_similarity,
+    j.skills_data,
+    j.contact_email,
+    j.has_contact_email,
+    j.application_url,
+    j.application_channel,
+    j.location_lat,
+    j.location_lon,
+    j.lat,
+    j.lon,
+    j.published_date,
+    j.last_seen_at
+  FROM neighbor_ids n
+  JOIN public.job_ads j ON j.id = n.id
+  WHERE
+    j.is_active = true
+    AND (j.application_deadline IS NULL OR j.application_deadline >= now())
+    AND j.embedding IS NOT NULL
+    AND (
+      seen_after IS NULL
+      OR (j.last_seen_at IS NOT NULL AND j.last_seen_at > seen_after)
+    )
+    AND (
+      candidate_lat IS NULL
+      OR candidate_lon IS NULL
+      OR radius_km IS NULL
+      OR (
+        j.location_lat IS NOT NULL
+        AND j.location_lon IS NOT NULL
+        AND (
+          6371.0 * ACOS(
+            LEAST(
+              1.0,
+              GREATEST(
+                -1.0,
+                COS(RADIANS(candidate_lat))
+                * COS(RADIANS(j.location_lat))
+                * COS(RADIANS(j.location_lon) - RADIANS(candidate_lon))
+                + SIN(RADIANS(candidate_lat))
+                * SIN(RADIANS(j.location_lat))
+              )
+            )
+          )
+        ) <= radius_km
+      )
+    )
+  ORDER BY 11 DESC
+  LIMIT GREATEST(limit_count, 1);
+$$;
+
+-- One-time cleanup of ids that went inactive or were archived before the triggers existed.
+SELECT public.prune_job_neighbors(ARRAY(
+  SELECT DISTINCT x.id
+  FROM public.job_neighbors jn
+  CROSS JOIN LATERAL unnest(jn.neighbor_ids) AS x(id)
+  WHERE NOT EXISTS (
+    SELECT 1 FROM public.job_ads j WHERE j.id = x.id AND j.is_active = true
+  )
+));
+
+GRANT EXECUTE ON FUNCTION public.prune_job_neighbors(text[]) TO service_role;
+GRANT EXECUTE ON FUNCTION public.fetch_candidate_neighbor_pool(uuid, vector, text, timestamptz, double precision, double precision, numeric, integer, integer, jsonb) TO service_role;
@@ -0,0 +1,33 @@
+-- Layer 4 skill extraction: cache LLM results by description hash so reposted ads (same
+-- text, new id) cost nothing, and write a whole page of results in one statement.
+
+CREATE TABLE IF NOT EXISTS public.job_skill_cache (
+  description_hash text PRIMARY KEY,
+  model text NOT NULL,
+  skills_data jsonb NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.job_skill_cache ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_job_ads_skills_pending
+  ON public.job_ads(id)
+  WHERE is_active = true AND (skills_data IS NULL OR skills_data = '{}'::jsonb);
+
+CREATE OR REPLACE FUNCTION public.apply_job_skills(
+  p_rows jsonb
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_updated integer := 0;
+BEGIN
+  UPDATE public.job_ads j
+  SET skills_data = r.skills_data
+  FROM jsonb_to_recordset(p_rows) AS r(id text, skills_data jsonb)
+  WHERE j.id = r.id;
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
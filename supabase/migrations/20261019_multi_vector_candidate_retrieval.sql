@@ -0,0 +1,152 @@
+-- Multi-vector semantic retrieval for precomputed candidate matching.
+-- Strategy:
+-- 1) Take every candidate vector (profile, persona current/target, wish) with a weight.
+-- 2) Gather the nearest jobs per vector inside ONE statement (one RPC round trip per user).
+-- 3) Score each gathered job against all vectors and keep the weighted max-sim.
+-- 4) Return the same row shape as fetch_candidate_semantic_pool so the worker scorer is unchanged.
+--
+-- candidate_vectors is a jsonb array: [{"name": "profile_vector", "vector": "[...]", "weight": 1.0}, ...]
+-- Leave candidate_lat/candidate_lon/radius_km NULL for the national scope and seen_after NULL
+-- for a full refresh.
+
+CREATE OR REPLACE FUNCTION public.fetch_candidate_semantic_pool_multi(
+  candidate_vectors jsonb,
+  candidate_lat double precision DEFAULT NULL,
+  candidate_lon double precision DEFAULT NULL,
+  radius_km numeric DEFAULT NULL,
+  seen_after timestamptz DEFAULT NULL,
+  limit_count integer DEFAULT 500
+)
+RETURNS TABLE (
+  id text,
+  title text,
+  company text,
+  city text,
+  description text,
+  job_url text,
+  webpage_url text,
+  occupation_field_label text,
+  occupation_group_label text,
+  occupation_label text,
+  vector_similarity real,
+  matched_vector text,
+  skills_data jsonb,
+  contact_email text,
+  has_contact_email boolean,
+  application_url text,
+  application_channel text,
+  location_lat double precision,
+  location_lon double precision,
+  lat double precision,
+  lon double precision,
+  published_date timestamptz,
+  last_seen_at timestamptz
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH query_vectors AS (
+    SELECT
+      COALESCE(NULLIF(v.elem->>'name', ''), 'vector_' || v.ord) AS vector_name,
+      (v.elem->>'vector')::vector(768) AS query_vector,
+      COALESCE((v.elem->>'weight')::real, 1.0) AS weight
+    FROM jsonb_array_elements(candidate_vectors) WITH ORDINALITY AS v(elem, ord)
+    WHERE NULLIF(v.elem->>'vector', '') IS NOT NULL
+      AND COALESCE((v.elem->>'weight')::real, 1.0) > 0
+  ),
+  gathered AS (
+    SELECT DISTINCT hit.id
+    FROM query_vectors q
+    CROSS JOIN LATERAL (
+      SELECT j.id
+      FROM public.job_ads j
+      WHERE
+        j.is_active = true
+        AND (j.application_deadline IS NULL OR j.application_deadline >= now())
+        AND j.embedding IS NOT NULL
+        AND (
+          seen_after IS NULL
+          OR (j.last_seen_at IS NOT NULL AND j.last_seen_at > seen_after)
+        )
+        AND (
+          candidate_lat IS NULL
+          OR candidate_lon IS NULL
+          OR radius_km IS NULL
+          OR (
+            j.location_lat IS NOT NULL
+            AND j.location_lon IS NOT NULL
+            AND j.location_lat BETWEEN candidate_lat - (radius_km / 111.0) AND candidate_lat + (radius_km / 111.0)
+            AND j.location_lon BETWEEN
+              candidate_lon - (radius_km / (111.0 * GREATEST(ABS(COS(RADIANS(candidate_lat))), 0.1)))
+              AND candidate_lon + (radius_km / (111.0 * GREATEST(ABS(COS(RADIANS(candidate_lat))), 0.1)))
+            AND (
+              6371.0 * ACOS(
+                LEAST(
+                  1.0,
+                  GREATEST(
+                    -1.0,
+                    COS(RADIANS(candidate_lat))
+                    * COS(RADIANS(j.location_lat))
+                    * COS(RADIANS(j.location_lon) - RADIANS(candidate_lon))
+                    + SIN(RADIANS(candidate_lat))
+                    * SIN(RADIANS(j.location_lat))
+                  )
+                )
+              )
+            ) <= radius_km
+          )
+        )
+      ORDER BY j.embedding <=> q.query_vector ASC
+      LIMIT GREATEST(limit_count, 1)
+    ) hit
+  ),
+  scored AS (
+    SELECT
+      g.id,
+      best.vector_similarity,
+      best.vector_name
+    FROM gathered g
+    JOIN public.job_ads j ON j.id = g.id
+    CROSS JOIN LATERAL (
+      SELECT
+        (q.weight * (1 - (j.embedding <=> q.query_vector)))::real AS vector_similarity,
+        q.vector_name
+      FROM query_vectors q
+      ORDER BY 1 DESC
+      LIMIT 1
+    ) best
+  )
+  SELECT
+    j.id,
+    j.headline AS title,
+    j.company,
+    COALESCE(j.city, j.location) AS city,
+    j.description_text AS description,
+    j.job_url,
+    j.webpage_url,
+    j.occupation_field_label,
+    j.occupation_group_label,
+    j.occupation_label,
+    s.vector_similarity,
+    s.vector_name AS matched_vector,
+    j.skills_data,
+    j.contact_email,
+    j.has_contact_email,
+    j.application_url,
+    j.application_channel,
+    j.location_lat,
+    j.location_lon,
+    j.lat,
+    j.lon,
+    j.published_date,
+    j.last_seen_at
+  FROM scored s
+  JOIN public.job_ads j ON j.id = s.id
+  ORDER BY s.vector_similarity DESC
+  LIMIT GREATEST(limit_count, 1);
+$$;
+
+GRANT EXECUTE ON FUNCTION public.fetch_candidate_semantic_pool_multi(jsonb, double precision, double precision, numeric, timestamptz, integer) TO service_role;
+
+COMMENT ON FUNCTION public.fetch_candidate_semantic_pool_multi(jsonb, double precision, double precision, numeric, timestamptz, integer) IS
+  'Single-pass weighted max-sim retrieval over all candidate vectors (profile, persona, wish) for precomputed matching.';
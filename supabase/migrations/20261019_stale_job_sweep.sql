@@ -0,0 +1,63 @@
+-- Server-side stale-job detection.
+-- sync_active_jobs.py streams the ids JobTech currently lists into job_ads_live_ids under a
+-- per-run id, then calls mark_stale_jobs_inactive() which deactivates the anti-join in one
+-- statement. The worker never loads job_ads ids.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS public.job_ads_live_ids (
+  run_id uuid NOT NULL,
+  job_id text NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (run_id, job_id)
+);
+
+ALTER TABLE public.job_ads_live_ids ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.mark_stale_jobs_inactive(
+  p_run_id uuid,
+  p_min_live_ids integer DEFAULT 10000
+)
+RETURNS TABLE (
+  live_ids integer,
+  marked_inactive integer,
+  active_remaining integer,
+  skipped boolean
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_live integer;
+  v_marked integer := 0;
+BEGIN
+  SELECT count(*) INTO v_live
+  FROM public.job_ads_live_ids l
+  WHERE l.run_id = p_run_id;
+
+  -- Same safety halt as before: a short list means the API scan failed, not mass expiry.
+  IF v_live < p_min_live_ids THEN
+    DELETE FROM public.job_ads_live_ids WHERE run_id = p_run_id;
+    RETURN QUERY
+      SELECT v_live, 0, (SELECT count(*)::integer FROM public.job_ads WHERE is_active = true), true;
+    RETURN;
+  END IF;
+
+  UPDATE public.job_ads j
+  SET is_active = false,
+      source_inactivated_at = now()
+  WHERE j.is_active = true
+    AND NOT EXISTS (
+      SELECT 1
+      FROM public.job_ads_live_ids l
+      WHERE l.run_id = p_run_id
+        AND l.job_id = j.id
+    );
+  GET DIAGNOSTICS v_marked = ROW_COUNT;
+
+  -- Drop this run's ids and anything left behind by runs that died before this call.
+  DELETE FROM public.job_ads_live_ids
+  WHERE run_id = p_run_id
+     OR created_at < now() - interval '1 day';
+
+  RETURN QUERY
+    SELECT v_live, v_marked, (SELECT count(*)::integer FROM public.job_ads WHERE is_active = true), false;
+END;
+$$;